@@ -1,13 +1,60 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from routers.split import router as split_router
 from routers.bookmarks import router as bookmarks_router
+from routers.documents import router as documents_router
+from routers.jobs import router as jobs_router
+from routers.batch import router as batch_router
+from routers.health import router as health_router
+from routers.metrics import router as metrics_router, MetricsMiddleware
+from routers.admission import AdmissionMiddleware
+from routers.uploads import UploadLimitMiddleware
+from routers.utils import overloaded_response
+from services.exceptions import OverloadedError, JobTimeoutError
+from services.executor import shutdown_executor
+from services.jobs import start_job_runners, stop_job_runners
+from services.engine import get_engine
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on an unknown PDF_ENGINE or one whose library is missing
+    get_engine()
+    start_job_runners()
+    yield
+    await stop_job_runners()
+    await asyncio.to_thread(shutdown_executor)
 
 app = FastAPI(
     title="PDF Splitter by CSV Bookmarks Ranges",
     version="1.0.0",
-    description="Split a PDF using CSV‐defined bookmarks page ranges."
+    description="Split a PDF using CSV‐defined bookmarks page ranges.",
+    lifespan=lifespan
 )
 
 # Mount routers
 app.include_router(split_router)
 app.include_router(bookmarks_router)
+app.include_router(documents_router)
+app.include_router(jobs_router)
+app.include_router(batch_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+
+# Per-field upload limits, checked as the body arrives
+app.add_middleware(UploadLimitMiddleware)
+# Early refusal of uploads that would not be admitted; inside the
+# metrics middleware, so refusals are counted too
+app.add_middleware(AdmissionMiddleware)
+# Request counters, byte totals and the Server-Timing header
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError) -> JSONResponse:
+    return overloaded_response(exc)
+
+@app.exception_handler(JobTimeoutError)
+async def job_timeout_handler(request: Request, exc: JobTimeoutError) -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
@@ -0,0 +1,28 @@
+from services.exceptions import OverloadedError
+from services.executor import check_admission, estimate_memory
+
+from .utils import overloaded_response
+
+# Endpoints that run their job while the request waits. Jobs and
+# batches queue their documents instead, so they are not refused here.
+ADMITTED_PATHS = ("/api/split", "/api/bookmarks", "/api/documents")
+
+class AdmissionMiddleware:
+    """
+    Refuses an upload to a synchronous endpoint as soon as its headers
+    arrive if its declared size alone would not be admitted, so a burst
+    of large uploads is turned away before any of it is read.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith(ADMITTED_PATHS):
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit():
+                try:
+                    check_admission(estimate_memory(int(length)))
+                except OverloadedError as exc:
+                    await overloaded_response(exc)(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
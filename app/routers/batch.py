@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
+
+from .utils import create_zip_response
+from services.batch import split_batch as split_batch_service
+
+router = APIRouter(
+    prefix="/api/batch",
+    tags=["batch"],
+    responses={400: {"description": "Bad Request"}}
+)
+
+@router.post(
+    "/split",
+    summary="Split many PDFs, each by its own CSV, into one ZIP",
+    response_class=StreamingResponse
+)
+async def split_batch(
+    pdfs: List[UploadFile] = File(..., description="PDFs to split"),
+    csvfiles: List[UploadFile] = File(..., description="One CSV per PDF, in the same order"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
+) -> StreamingResponse:
+    """
+    Splits the n-th PDF by the n-th CSV, a few documents at a time,
+    and returns one ZIP with a directory per PDF (named after it)
+    and a manifest.json with each document's state, fragment and
+    page counts, and error if it failed.
+    """
+    try:
+        zip_stream = await split_batch_service(pdfs, csvfiles, compression)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "batch.zip")
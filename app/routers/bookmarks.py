@@ -8,7 +8,11 @@ from services.exceptions import NotFoundError
 router = APIRouter(
     prefix="/api",
     tags=["bookmarks"],
-    responses={404: {"description": "Not Found"}, 400: {"description": "Bad Request"}}
+    responses={
+        404: {"description": "Not Found"},
+        400: {"description": "Bad Request"},
+        503: {"description": "Service Busy"}
+    }
 )
 
 @router.post(
@@ -24,10 +28,10 @@ async def export_bookmarks_zip(
     generate one CSV per depth level, and return them all in a ZIP archive.
     """
     try:
-        zip_bytes = await build_bookmarks_zip_service(pdf)
+        zip_stream = await build_bookmarks_zip_service(pdf)
     except NotFoundError as exc:
         raise HTTPException(status_code=404, detail=str(exc))
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    return create_zip_response(zip_bytes, "bookmarks_by_depth.zip")
+    return create_zip_response(zip_stream, "bookmarks_by_depth.zip")
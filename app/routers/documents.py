@@ -0,0 +1,164 @@
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, Header, Query, Request, UploadFile, HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from .utils import create_zip_response, create_pdf_response, not_modified_response, parse_etags
+from services.documents import (
+    store_document as store_document_service,
+    describe_document as describe_document_service,
+    open_document
+)
+from services.bookmarks import build_source_bookmarks_zip
+from services.split import (
+    split_source_by_csv,
+    split_source_by_bookmarks,
+    extract_source_range,
+    parse_levels
+)
+from services.exceptions import NotFoundError
+
+router = APIRouter(
+    prefix="/api/documents",
+    tags=["documents"],
+    responses={
+        404: {"description": "Not Found"},
+        400: {"description": "Bad Request"},
+        503: {"description": "Service Busy"}
+    }
+)
+
+@router.post(
+    "",
+    status_code=201,
+    summary="Upload a PDF once and get a reusable document ID"
+)
+async def upload_document(
+    pdf: UploadFile = File(..., description="PDF to store")
+) -> dict:
+    """
+    Store the PDF under its SHA-256 and return its ID, size and page count.
+    The ID can then be used with the bookmarks and split endpoints below.
+    """
+    try:
+        return await store_document_service(pdf)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@router.get(
+    "/{doc_id}",
+    summary="Describe a stored document"
+)
+async def describe_document(doc_id: str) -> dict:
+    """
+    Return the document's ID, size, page count and lifetime.
+    """
+    try:
+        return await describe_document_service(doc_id)
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+@router.get(
+    "/{doc_id}/bookmarks",
+    summary="Export a stored document's bookmarks as per-depth CSVs inside a ZIP",
+    response_class=StreamingResponse
+)
+async def export_document_bookmarks(doc_id: str) -> StreamingResponse:
+    """
+    Same as /api/bookmarks/zip, for a previously uploaded document.
+    """
+    try:
+        zip_stream = await build_source_bookmarks_zip(open_document(doc_id))
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "bookmarks_by_depth.zip")
+
+@router.get(
+    "/{doc_id}/range",
+    summary="Get one page range of a stored document as a PDF",
+    response_class=Response,
+    responses={
+        200: {"content": {"application/pdf": {}}},
+        206: {"description": "Partial Content"},
+        304: {"description": "Not Modified"},
+        416: {"description": "Range Not Satisfiable"}
+    }
+)
+async def get_document_range(
+    request: Request,
+    doc_id: str,
+    start_page: int = Query(..., alias="from", description="First page, 1-based"),
+    end_page: int = Query(..., alias="to", description="Last page, inclusive"),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """
+    Same as /api/split/range, for a previously uploaded document. A
+    matching If-None-Match is answered with 304 without opening the PDF,
+    so viewers and caches can revalidate a chapter for free.
+    """
+    try:
+        result = await extract_source_range(
+            open_document(doc_id), start_page, end_page, parse_etags(if_none_match)
+        )
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if result.data is None:
+        return not_modified_response(result.etag)
+    return create_pdf_response(request, result.data, result.etag, f"pages_{start_page}-{end_page}.pdf")
+
+@router.post(
+    "/{doc_id}/split",
+    summary="Split a stored document based on a CSV of bookmarks page ranges",
+    response_class=StreamingResponse
+)
+async def split_document(
+    doc_id: str,
+    csvfile: UploadFile = File(..., description="CSV with columns: split,name,from,to"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
+) -> StreamingResponse:
+    """
+    Same as /api/split, for a previously uploaded document.
+    """
+    try:
+        zip_stream = await split_source_by_csv(open_document(doc_id), csvfile, compression)
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "chapters.zip")
+
+@router.post(
+    "/{doc_id}/split/bookmarks",
+    summary="Split a stored document at its bookmarks of the given depth levels",
+    response_class=StreamingResponse
+)
+async def split_document_by_bookmarks(
+    doc_id: str,
+    levels: str = Form(..., description="Comma-separated bookmark depth levels, e.g. 0 or 0,1"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
+) -> StreamingResponse:
+    """
+    Same as /api/split/bookmarks, for a previously uploaded document.
+    """
+    try:
+        selected   = parse_levels(levels)
+        zip_stream = await split_source_by_bookmarks(open_document(doc_id), selected, compression)
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "chapters.zip")
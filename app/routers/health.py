@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+
+from services.executor import in_flight
+from services.cache import cache_enabled, cache_stats
+
+router = APIRouter(tags=["health"])
+
+@router.get("/health", summary="Liveness probe")
+async def health() -> dict:
+    """
+    Answer immediately, even while heavy jobs run in the worker pool.
+    """
+    return {
+        "status": "ok",
+        "jobs_in_flight": in_flight(),
+        "cache": {"enabled": cache_enabled(), **cache_stats()}
+    }
@@ -0,0 +1,93 @@
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from fastapi.responses import FileResponse
+
+from services.jobs import (
+    submit_split_job,
+    get_job as get_job_service,
+    job_result_path,
+    cancel_job as cancel_job_service
+)
+from services.exceptions import NotFoundError, NotReadyError
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["jobs"],
+    responses={
+        404: {"description": "Not Found"},
+        400: {"description": "Bad Request"},
+        503: {"description": "Service Busy"}
+    }
+)
+
+@router.post(
+    "/split",
+    status_code=202,
+    summary="Queue a split job and return its ID immediately"
+)
+async def submit_split(
+    pdf: UploadFile = File(..., description="Original PDF to split"),
+    csvfile: UploadFile = File(..., description="CSV with columns: split,name,from,to"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
+) -> dict:
+    """
+    Accept the same form as /api/split, queue the work and return the
+    job's status. Poll GET /api/jobs/{id}, then download its result.
+    """
+    try:
+        status = await submit_split_job(pdf, csvfile, compression)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return asdict(status)
+
+@router.get(
+    "/{job_id}",
+    summary="Job state and progress"
+)
+async def get_job(job_id: str) -> dict:
+    """
+    Return state (queued, running, cancelling, done, failed, cancelled)
+    and progress: fragments and pages done out of the totals.
+    """
+    try:
+        return asdict(get_job_service(job_id))
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+
+@router.get(
+    "/{job_id}/result",
+    summary="Download a finished job's ZIP",
+    response_class=FileResponse,
+    responses={409: {"description": "Job Not Finished"}}
+)
+async def get_job_result(job_id: str) -> FileResponse:
+    """
+    Return the ZIP of PDF fragments once the job is done.
+    """
+    try:
+        path = job_result_path(job_id)
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except NotReadyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    return FileResponse(path, media_type="application/zip", filename="chapters.zip")
+
+@router.delete(
+    "/{job_id}",
+    summary="Cancel a job, or delete a finished job and its result"
+)
+async def cancel_job(job_id: str) -> dict:
+    """
+    Cancel a queued or running job; for finished jobs, remove the
+    stored status and result.
+    """
+    try:
+        return asdict(cancel_job_service(job_id))
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
@@ -0,0 +1,94 @@
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from services.executor import (
+    in_flight,
+    queued_calls,
+    memory_reserved,
+    heavy_jobs,
+    MEMORY_BUDGET_BYTES,
+    MAX_HEAVY_JOBS
+)
+from services.cache import cache_stats
+from services.metrics import (
+    Sampled,
+    register,
+    render_metrics,
+    begin_request,
+    server_timing,
+    REQUESTS,
+    REQUEST_SECONDS,
+    BYTES_IN,
+    BYTES_OUT,
+    CONTENT_TYPE
+)
+
+router = APIRouter(tags=["metrics"])
+
+register(Sampled("split_pdf_jobs_in_flight", "Admitted jobs, running or queued", in_flight))
+register(Sampled("split_pdf_executor_queue_depth", "Pool calls waiting for a worker", queued_calls))
+register(Sampled("split_pdf_memory_reserved_bytes", "Estimated memory of admitted jobs", memory_reserved))
+register(Sampled("split_pdf_memory_budget_bytes", "Memory budget for admitted jobs", lambda: MEMORY_BUDGET_BYTES))
+register(Sampled("split_pdf_heavy_jobs", "Admitted jobs estimated at HEAVY_JOB_BYTES or more", heavy_jobs))
+register(Sampled("split_pdf_heavy_jobs_limit", "Heavy jobs allowed at once", lambda: MAX_HEAVY_JOBS))
+for _name in ("hits", "misses", "stores", "evictions"):
+    register(Sampled(
+        f"split_pdf_result_cache_{_name}_total",
+        f"Result cache {_name}",
+        lambda name=_name: cache_stats()[name],
+        kind="counter"
+    ))
+
+@router.get("/metrics", summary="Prometheus metrics")
+async def metrics() -> Response:
+    """
+    Per-stage duration histograms, request, byte, page and fragment
+    counters, job and queue gauges and result cache counters, in the
+    Prometheus text format.
+    """
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+class MetricsMiddleware:
+    """
+    Counts each request's bytes and duration under its route template,
+    and adds a Server-Timing header with the stages it went through
+    before the response started.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages  = begin_request()
+        start   = time.perf_counter()
+        counted = {"in": 0, "out": 0, "status": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                counted["in"] += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message) -> None:
+            if message["type"] == "http.response.start":
+                counted["status"] = message["status"]
+                timing  = server_timing(stages, time.perf_counter() - start)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+            elif message["type"] == "http.response.body":
+                counted["out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            route  = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUESTS.inc(method=method, route=route, status=str(counted["status"]))
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route)
+            BYTES_IN.inc(counted["in"], route=route)
+            BYTES_OUT.inc(counted["out"], route=route)
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+from typing import Optional
 
-from .utils import create_zip_response
-from services.split import split_pdf_by_csv as split_pdf_by_csv_service
+from fastapi import APIRouter, File, Form, Header, Request, UploadFile, HTTPException
+from fastapi.responses import Response, StreamingResponse
+
+from .utils import create_zip_response, create_pdf_response, not_modified_response, parse_etags
+from services.split import (
+    split_pdf_by_csv as split_pdf_by_csv_service,
+    split_pdf_by_bookmarks as split_pdf_by_bookmarks_service,
+    split_pdf_range as split_pdf_range_service
+)
+from services.exceptions import NotFoundError
 
 router = APIRouter(
     prefix="/api",
     tags=["split"],
-    responses={400: {"description": "Bad Request"}}
+    responses={400: {"description": "Bad Request"}, 503: {"description": "Service Busy"}}
 )
 
 @router.post(
@@ -17,7 +24,11 @@ router = APIRouter(
 )
 async def split_pdf_by_csv(
     pdf: UploadFile = File(..., description="Original PDF to split"),
-    csvfile: UploadFile = File(..., description="CSV with columns: split,name,from,to")
+    csvfile: UploadFile = File(..., description="CSV with columns: split,name,from,to"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
 ) -> StreamingResponse:
     """
     Reads the CSV file, each row defining a [split,name,from,to] range,
@@ -26,8 +37,70 @@ async def split_pdf_by_csv(
     and returns the ZIP archive.
     """
     try:
-        zip_bytes = await split_pdf_by_csv_service(pdf, csvfile)
+        zip_stream = await split_pdf_by_csv_service(pdf, csvfile, compression)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "chapters.zip")
+
+@router.post(
+    "/split/bookmarks",
+    summary="Split a PDF into chapters at its bookmarks of the given depth levels",
+    response_class=StreamingResponse,
+    responses={404: {"description": "Not Found"}}
+)
+async def split_pdf_by_bookmarks(
+    pdf: UploadFile = File(..., description="Original PDF to split"),
+    levels: str = Form(..., description="Comma-separated bookmark depth levels, e.g. 0 or 0,1"),
+    compression: Optional[str] = Form(
+        None,
+        description="ZIP entry compression: auto (default), store or deflate"
+    )
+) -> StreamingResponse:
+    """
+    Reads the PDF's outline and splits it at every bookmark of the given
+    levels (numbered as in bookmarks_level_<n>.csv), each fragment running
+    until the next bookmark at the same or a shallower level,
+    zips the result,
+    and returns the ZIP archive. No CSV round-trip needed.
+    """
+    try:
+        zip_stream = await split_pdf_by_bookmarks_service(pdf, levels, compression)
+    except NotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return create_zip_response(zip_stream, "chapters.zip")
+
+@router.post(
+    "/split/range",
+    summary="Extract one page range of a PDF as a PDF",
+    response_class=Response,
+    responses={
+        200: {"content": {"application/pdf": {}}},
+        206: {"description": "Partial Content"},
+        304: {"description": "Not Modified"},
+        416: {"description": "Range Not Satisfiable"}
+    }
+)
+async def split_pdf_range(
+    request: Request,
+    pdf: UploadFile = File(..., description="Original PDF"),
+    start_page: int = Form(..., alias="from", description="First page, 1-based"),
+    end_page: int = Form(..., alias="to", description="Last page, inclusive"),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """
+    Writes the pages from..to into a PDF of their own and returns it
+    directly, with a strong ETag derived from the PDF's SHA-256 and the
+    range. Honours If-None-Match (304) and single byte Range requests.
+    """
+    try:
+        result = await split_pdf_range_service(pdf, start_page, end_page, parse_etags(if_none_match))
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    return create_zip_response(zip_bytes, "chapters.zip")
+    if result.data is None:
+        return not_modified_response(result.etag)
+    return create_pdf_response(request, result.data, result.etag, f"pages_{start_page}-{end_page}.pdf")
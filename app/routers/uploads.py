@@ -0,0 +1,109 @@
+import re
+from typing import Optional
+
+from fastapi import HTTPException
+
+from services.utils import upload_limit
+
+# The boundary parameter of a multipart Content-Type, quoted or not
+BOUNDARY = re.compile(rb'boundary=(?:"([^"]+)"|([^\s;]+))', re.IGNORECASE)
+# The field name in a part's Content-Disposition (not its filename)
+FIELD_NAME = re.compile(rb'[;\s]name="([^"]*)"', re.IGNORECASE)
+# Headers of one part, beyond which the request is refused
+MAX_PART_HEADER_BYTES = 16 * 1024
+
+class _PartSizes:
+    """
+    Follows a multipart body chunk by chunk, finding only the part
+    boundaries and each part's field name, and counts the bytes of the
+    part being received.
+    """
+    def __init__(self, boundary: bytes):
+        self.delimiter  = b"\r\n--" + boundary
+        # The first delimiter is not preceded by a line break
+        self.pending    = b"\r\n"
+        self.closed     = False
+        self.in_headers = False
+        self.field      = ""
+        self.size       = 0
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """
+        Take the next chunk of the body. Returns why the request is
+        refused once a part runs past its field's limit, else None.
+        """
+        if self.closed:
+            return None
+        data = self.pending + chunk
+        self.pending = b""
+        while True:
+            if self.in_headers:
+                if len(data) < 2:
+                    self.pending = data
+                    return None
+                if data.startswith(b"--"):
+                    # Closing delimiter: whatever follows is epilogue
+                    self.closed = True
+                    return None
+                end = data.find(b"\r\n\r\n")
+                if end < 0:
+                    if len(data) > MAX_PART_HEADER_BYTES:
+                        return "Multipart part headers are too large"
+                    self.pending = data
+                    return None
+                match = FIELD_NAME.search(data[:end])
+                self.field      = match.group(1).decode("latin-1") if match else ""
+                self.size       = 0
+                self.in_headers = False
+                data = data[end + 4:]
+                continue
+
+            idx = data.find(self.delimiter)
+            if idx < 0:
+                # Keep what could be the start of a delimiter
+                keep = min(len(data), len(self.delimiter) - 1)
+                self.size   += len(data) - keep
+                self.pending = data[len(data) - keep:]
+                return self._check()
+            self.size += idx
+            error = self._check()
+            if error is not None:
+                return error
+            self.in_headers = True
+            data = data[idx + len(self.delimiter):]
+
+    def _check(self) -> Optional[str]:
+        limit = upload_limit(self.field)
+        if limit and self.size > limit:
+            name = f"Field '{self.field}'" if self.field else "Form data"
+            return f"{name} exceeds the upload limit of {limit} bytes"
+        return None
+
+class UploadLimitMiddleware:
+    """
+    Enforces the per-field upload limits while a multipart body streams
+    in: the part that runs past its limit fails the read of the body
+    with 413, so the rest of the request is neither received nor parsed.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        match = BOUNDARY.search(content_type)
+        if not content_type.lower().startswith(b"multipart/form-data") or match is None:
+            return await self.app(scope, receive, send)
+
+        parts = _PartSizes(match.group(1) or match.group(2))
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                error = parts.feed(message.get("body", b""))
+                if error is not None:
+                    raise HTTPException(status_code=413, detail=error)
+            return message
+
+        await self.app(scope, limited_receive, send)
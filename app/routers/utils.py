@@ -1,19 +1,116 @@
-from typing import Any, AsyncIterator
-from fastapi.responses import StreamingResponse
+import re
+from typing import AsyncIterable, Optional, Set, Tuple
 
-async def iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+import anyio
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from services.exceptions import OverloadedError, TooManyJobsError
+from services.executor import RETRY_AFTER_SECONDS
+from services.metrics import ADMISSION_REJECTED
+
+# A single byte range: "bytes=first-last", "bytes=first-" or "bytes=-suffix"
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class ClosingStreamingResponse(StreamingResponse):
     """
-    Wraps bytes in an async iterator so StreamingResponse can stream it.
+    StreamingResponse that closes its body iterator when the response
+    ends, also when the client disconnects mid-stream, so that slots and
+    spooled files are released at once rather than whenever the
+    suspended generator is garbage-collected.
     """
-    yield data
+    async def stream_response(self, send) -> None:
+        try:
+            await super().stream_response(send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                with anyio.CancelScope(shield=True):
+                    await aclose()
 
-def create_zip_response(content: bytes, filename: str) -> StreamingResponse:
+def create_zip_response(content: AsyncIterable[bytes], filename: str) -> StreamingResponse:
     """
-    Return a StreamingResponse for a ZIP file.
+    Return a StreamingResponse that sends ZIP chunks as they are produced.
     """
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-    return StreamingResponse(
-        iter_bytes(content),
+    return ClosingStreamingResponse(
+        content,
         media_type="application/zip",
         headers=headers
     )
+
+def overloaded_response(exc: OverloadedError) -> JSONResponse:
+    """
+    429 if as many large jobs as allowed are running, else 503, both
+    with Retry-After; counted by reason.
+    """
+    ADMISSION_REJECTED.inc(reason=exc.reason)
+    return JSONResponse(
+        status_code=429 if isinstance(exc, TooManyJobsError) else 503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+def parse_etags(header: Optional[str]) -> Set[str]:
+    """
+    The entity tags listed in an If-None-Match header, weak ones
+    compared as strong, as that header's weak comparison requires.
+    """
+    return {
+        tag.strip().removeprefix("W/")
+        for tag in (header or "").split(",")
+        if tag.strip()
+    }
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+def create_pdf_response(request: Request, data: bytes, etag: str, filename: str) -> Response:
+    """
+    Return the PDF whole, or the single byte range the request asks for
+    (206, or 416 if it lies past the end). A Range is ignored if it is
+    malformed, lists several ranges, or comes with an If-Range that no
+    longer matches the ETag.
+    """
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'inline; filename="{filename}"'
+    }
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return Response(data, media_type="application/pdf", headers=headers)
+
+    try:
+        byte_range = _byte_range(request.headers.get("range"), len(data))
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{len(data)}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        return Response(data, media_type="application/pdf", headers=headers)
+
+    first, last = byte_range
+    headers["Content-Range"] = f"bytes {first}-{last}/{len(data)}"
+    return Response(data[first:last + 1], status_code=206, media_type="application/pdf", headers=headers)
+
+def _byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    First and last byte of a single Range, clipped to the content, or
+    None if there is no usable one. Raises ValueError if it is not
+    satisfiable.
+    """
+    match = BYTE_RANGE.match((header or "").strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(size - suffix, 0), size - 1
+    if last != "" and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise ValueError("range starts past the end")
+    end = min(int(last), size - 1) if last != "" else size - 1
+    return int(first), end
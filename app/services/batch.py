@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Split many PDF/CSV pairs in one request: the documents run a few at a
+time under the usual job slots, and their fragments are streamed back
+as one ZIP with a directory per document and a manifest.json listing
+each document's outcome.
+"""
+
+import os
+import json
+import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Iterator, List, Optional, Set, Tuple
+
+from fastapi import UploadFile
+
+from .utils import PdfSource, spool_upload, stream_zip, check_compression, sanitize_filename
+from .split import SplitProgress, split_fragments
+from .executor import wait_for_slot, estimate_memory
+from .exceptions import ValidationError
+
+# Batch configuration (overridable with environment variables)
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "500"))
+BATCH_PARALLELISM   = int(os.getenv("BATCH_PARALLELISM", "2"))
+
+MANIFEST_NAME = "manifest.json"
+
+@dataclass
+class DocumentStatus:
+    """
+    Outcome of one document of a batch, as listed in the manifest.
+    """
+    directory: str
+    pdf:       str
+    csv:       str
+    state:     str = "queued"
+    fragments: int = 0
+    pages:     int = 0
+    error:     Optional[str] = None
+
+@dataclass
+class _BatchDocument:
+    status:     DocumentStatus
+    source:     PdfSource
+    csv_source: PdfSource
+
+    def close(self) -> None:
+        self.source.close()
+        self.csv_source.close()
+
+async def split_batch(
+    pdf_files: List[UploadFile],
+    csv_files: List[UploadFile],
+    compression: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Spool every upload, pairing the n-th PDF with the n-th CSV, and
+    return the batch's ZIP stream. A document that fails is reported
+    in the manifest and does not stop the others.
+    """
+    compression = check_compression(compression)
+    if not pdf_files:
+        raise ValidationError("No PDF files in the batch")
+    if len(pdf_files) != len(csv_files):
+        raise ValidationError(
+            f"Got {len(pdf_files)} PDF files and {len(csv_files)} CSV files; "
+            "send one CSV per PDF, in the same order"
+        )
+    if len(pdf_files) > BATCH_MAX_DOCUMENTS:
+        raise ValidationError(f"Too many documents in the batch (limit {BATCH_MAX_DOCUMENTS})")
+
+    docs: List[_BatchDocument] = []
+    used: Set[str] = set()
+    try:
+        for pdf_file, csv_file in zip(pdf_files, csv_files):
+            status = DocumentStatus(
+                directory=_directory_name(pdf_file.filename, len(docs) + 1, used),
+                pdf=pdf_file.filename or "",
+                csv=csv_file.filename or ""
+            )
+            doc = _BatchDocument(status, await spool_upload(pdf_file), PdfSource())
+            docs.append(doc)
+            doc.csv_source = await spool_upload(csv_file, suffix=".csv")
+    except BaseException:
+        for doc in docs:
+            doc.close()
+        raise
+
+    return stream_zip(_iter_batch_entries(docs), compression)
+
+def _directory_name(filename: Optional[str], number: int, used: Set[str]) -> str:
+    """
+    Archive directory for a document: its sanitized file name without
+    .pdf, suffixed with its position in the batch if already taken.
+    """
+    stem = os.path.basename(filename or "")
+    if stem.lower().endswith(".pdf"):
+        stem = stem[:-len(".pdf")]
+    name = sanitize_filename(stem, number, number)
+    if name in used:
+        name = f"{name}_{number}"
+    used.add(name)
+    return name
+
+async def _iter_batch_entries(docs: List[_BatchDocument]) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    Run BATCH_PARALLELISM documents at a time and yield their fragments,
+    as <directory>/<fragment>.pdf, in the order they are written, then
+    the manifest. Cancels the runners and closes every source when done
+    or abandoned.
+    """
+    queue: "asyncio.Queue[Optional[Tuple[str, bytes]]]" = asyncio.Queue(maxsize=BATCH_PARALLELISM)
+    todo    = iter(docs)
+    runners = [
+        asyncio.create_task(_run_documents(todo, queue))
+        for _ in range(min(BATCH_PARALLELISM, len(docs)))
+    ]
+    try:
+        running = len(runners)
+        while running:
+            entry = await queue.get()
+            if entry is None:
+                running -= 1
+            else:
+                yield entry
+    finally:
+        for task in runners:
+            task.cancel()
+        try:
+            await asyncio.gather(*runners, return_exceptions=True)
+        finally:
+            # Reached even if the response's cancel scope interrupts the wait.
+            for doc in docs:
+                doc.close()
+
+    yield MANIFEST_NAME, _manifest(docs)
+
+async def _run_documents(
+    todo: Iterator[_BatchDocument],
+    queue: "asyncio.Queue[Optional[Tuple[str, bytes]]]"
+) -> None:
+    """
+    Runner loop: split documents off the shared iterator one at a time,
+    then signal the end with None.
+    """
+    for doc in todo:
+        await _split_document(doc, queue)
+    await queue.put(None)
+
+async def _split_document(
+    doc: _BatchDocument,
+    queue: "asyncio.Queue[Optional[Tuple[str, bytes]]]"
+) -> None:
+    """
+    Split one document into the queue, recording its outcome.
+    """
+    status   = doc.status
+    progress = SplitProgress()
+    try:
+        slot = await wait_for_slot(estimate_memory(doc.source.size))
+        status.state = "running"
+        fragments = await split_fragments(doc.source, doc.csv_source, slot, progress)
+        async with aclosing(fragments):
+            async for fname, data in fragments:
+                await queue.put((f"{status.directory}/{fname}", data))
+        status.state = "done"
+    except Exception as exc:
+        status.state = "failed"
+        status.error = str(exc) or type(exc).__name__
+    finally:
+        doc.close()
+        status.fragments = progress.fragments_done
+        status.pages     = progress.pages_done
+
+def _manifest(docs: List[_BatchDocument]) -> bytes:
+    statuses = [doc.status for doc in docs]
+    manifest = {
+        "documents": len(statuses),
+        "done":      sum(status.state == "done" for status in statuses),
+        "failed":    sum(status.state == "failed" for status in statuses),
+        "results":   [asdict(status) for status in statuses],
+    }
+    return json.dumps(manifest, indent=2).encode("utf-8")
@@ -1,109 +1,140 @@
 #!/usr/bin/env python3
 """
 Extract PDF bookmarks/outlines, render per-depth CSVs,
-and return them zipped as bytes.
+and return them as a streamed ZIP.
 """
 
 import csv
 from io import StringIO
-from collections import defaultdict
-from typing import List, Dict, Union
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Set
 
-from PyPDF2 import PdfReader
-from PyPDF2.generic import Destination
 from fastapi import UploadFile
 
-from .utils import load_pdf_reader, package_zip, FALLBACK_PAGE
+from .utils import PdfSource, spool_upload, iter_entries, stream_zip
+from .engine import page_count, outline, PDF_ENGINE
 from .exceptions import NotFoundError
+from .executor import acquire_slot, estimate_memory
+from .cache import result_key, open_cached, store_result
+from .metrics import timed_stage
 
 class Bookmark:
     """
     Represents a PDF outline entry with hierarchy level
-    and start/end page indices.
+    and start/end page indices. Slotted: no per-instance __dict__.
     """
+    __slots__ = ("level", "title", "start_page", "end_page")
+
     def __init__(self, level: int, title: str, start_page: int, end_page: int = -1):
         self.level      = level
         self.title      = title.strip()
         self.start_page = start_page
         self.end_page   = end_page
 
-async def build_bookmarks_zip(pdf_file: UploadFile) -> bytes:
+async def build_bookmarks_zip(pdf_file: UploadFile) -> AsyncIterator[bytes]:
     """
-    1. Load PDF and read its outline.
-    2. Flatten nested outline into Bookmark objects.
-    3. Compute end pages.
-    4. Group by level and render CSVs.
-    5. ZIP and return CSV files as bytes.
+    Spool the upload and export its bookmarks as a ZIP stream.
     """
-    reader  = await load_pdf_reader(pdf_file)
-    outline = getattr(reader, "outline", None)
-    if not outline:
-        raise NotFoundError("No bookmarks found in the PDF")
+    source = await spool_upload(pdf_file)
+    return await build_source_bookmarks_zip(source)
 
-    flat = _extract_flat_bookmarks(outline, reader)
-    if not flat:
-        raise NotFoundError("No bookmarks found in the PDF")
+async def build_source_bookmarks_zip(source: PdfSource) -> AsyncIterator[bytes]:
+    """
+    Serve a cached result if there is one. Otherwise render the CSVs
+    off the event loop and return them as a ZIP stream.
+    Takes ownership of the source and closes it.
+    """
+    try:
+        key    = result_key("bookmarks", source.digest, PDF_ENGINE)
+        cached = open_cached(key)
+        if cached is not None:
+            return cached
+        with acquire_slot(estimate_memory(source.size)) as slot:
+            with timed_stage("bookmarks"):
+                csv_files = await slot.run(_render_bookmark_csvs, source)
+    finally:
+        source.close()
+
+    return store_result(key, stream_zip(iter_entries(csv_files), compression="deflate"))
 
-    _assign_end_pages(flat, total_pages=len(reader.pages))
-    grouped = _group_by_level(flat)
+def _render_bookmark_csvs(source: PdfSource) -> Dict[str, bytes]:
+    """
+    1. Read the outline through the configured engine.
+    2. Walk the outline tree, yielding Bookmark objects.
+    3. Close each bookmark with its end page.
+    4. Write each one straight into its level's CSV.
+    5. Return CSV filename-->bytes.
+    """
+    bookmarks = (Bookmark(*item) for item in outline(source))
+    closed    = _iter_closed_bookmarks(bookmarks, total_pages=page_count(source))
 
     csv_files: Dict[str, bytes] = {}
-    for level, bms in sorted(grouped.items()):
-        csv_text = _render_csv(bms)
+    for level, csv_text in sorted(_render_csvs_by_level(closed).items()):
         csv_files[f"bookmarks_level_{level}.csv"] = csv_text.encode("utf-8")
 
-    return package_zip(csv_files)
+    if not csv_files:
+        raise NotFoundError("No bookmarks found in the PDF")
+    return csv_files
 
-def _extract_flat_bookmarks(
-    outline: List[Union[Destination, list]],
-    reader: PdfReader,
-    level: int = 0
-) -> List[Bookmark]:
+def bookmark_ranges(source: PdfSource, levels: Set[int]) -> List[Bookmark]:
     """
-    Recursively flatten the PDF outline into a list of Bookmark objects.
+    The bookmarks at the given depth levels with their page ranges, in
+    outline order, for splitting without a CSV round-trip. Bookmarks
+    that lead to no page of the document (URI actions and the like) are
+    left out before the ranges are closed, so they do not cut short the
+    one before them; one that shares its start page with the next keeps
+    that single page.
     """
-    entries: List[Bookmark] = []
-    for entry in outline:
-        if isinstance(entry, list):
-            entries.extend(_extract_flat_bookmarks(entry, reader, level + 1))
-        elif isinstance(entry, Destination):
-            try:
-                page = reader.get_destination_page_number(entry) + 1
-            except Exception:
-                page = FALLBACK_PAGE
-            entries.append(Bookmark(level, entry.title, page))
-    return entries
+    total_pages = page_count(source)
+    flat        = [Bookmark(*item) for item in outline(source)]
+    if not flat:
+        raise NotFoundError("No bookmarks found in the PDF")
+    flat = [bm for bm in flat if 1 <= bm.start_page <= total_pages]
+    _assign_end_pages(flat, total_pages)
 
-def _assign_end_pages(bookmarks: List[Bookmark], total_pages: int) -> None:
+    selected = [bm for bm in flat if bm.level in levels]
+    for bm in selected:
+        bm.end_page = min(max(bm.end_page, bm.start_page), total_pages)
+    return selected
+
+def _iter_closed_bookmarks(bookmarks: Iterable[Bookmark], total_pages: int) -> Iterator[Bookmark]:
     """
-    For each bookmark, set end_page to one less than the next sibling's start
-    or to the document's last page.
+    Set each bookmark's end_page to one less than the start of the next
+    bookmark at the same or a shallower level, or to the document's
+    last page, and yield it as soon as that is known. A stack holds the
+    still-open bookmarks, with strictly increasing levels from bottom
+    to top; within a level, bookmarks come out in document order.
     """
-    for idx, bm in enumerate(bookmarks):
-        bm.end_page = total_pages
-        for next_bm in bookmarks[idx + 1:]:
-            if next_bm.level <= bm.level:
-                bm.end_page = next_bm.start_page - 1
-                break
+    open_bms: List[Bookmark] = []
+    for bm in bookmarks:
+        while open_bms and open_bms[-1].level >= bm.level:
+            closed = open_bms.pop()
+            closed.end_page = bm.start_page - 1
+            yield closed
+        open_bms.append(bm)
+    while open_bms:
+        closed = open_bms.pop()
+        closed.end_page = total_pages
+        yield closed
 
-def _group_by_level(bookmarks: List[Bookmark]) -> Dict[int, List[Bookmark]]:
+def _assign_end_pages(bookmarks: List[Bookmark], total_pages: int) -> None:
     """
-    Group bookmarks into a dict keyed by depth level.
+    Set end_page on every bookmark of a list, in place.
     """
-    by_level: Dict[int, List[Bookmark]] = defaultdict(list)
-    for bm in bookmarks:
-        by_level[bm.level].append(bm)
-    return by_level
+    for _ in _iter_closed_bookmarks(bookmarks, total_pages):
+        pass
 
-def _render_csv(bookmarks: List[Bookmark]) -> str:
+def _render_csvs_by_level(bookmarks: Iterable[Bookmark]) -> Dict[int, str]:
     """
-    Serialize a list of Bookmark objects to CSV:
+    Serialize bookmarks to one CSV per depth level, row by row:
     columns: split, name, from, to
     """
-    buf = StringIO()
-    writer = csv.writer(buf, quoting=csv.QUOTE_NONNUMERIC)
-    writer.writerow(["split", "name", "from", "to"])
+    buffers: Dict[int, StringIO] = {}
+    writers: Dict[int, Any] = {}
     for bm in bookmarks:
+        writer = writers.get(bm.level)
+        if writer is None:
+            buffers[bm.level] = StringIO()
+            writer = writers[bm.level] = csv.writer(buffers[bm.level], quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(["split", "name", "from", "to"])
         writer.writerow(["n", bm.title, bm.start_page, bm.end_page])
-    return buf.getvalue()
-
+    return {level: buf.getvalue() for level, buf in buffers.items()}
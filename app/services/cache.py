@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Content-addressed, on-disk cache of finished ZIP results.
+
+Entries are keyed by a hash of the endpoint, its options and the
+uploaded bytes. Each entry's mtime records when it was stored (for
+the TTL) and its atime when it was last served (for LRU eviction),
+so every Uvicorn worker can share one cache directory.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+from collections import Counter
+from contextlib import aclosing
+from typing import AsyncIterator, Container, Dict, Optional
+
+# Cache configuration (overridable with environment variables)
+RESULT_CACHE_DIR       = os.getenv(
+    "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "split-pdf-cache")
+)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESULT_CACHE_TTL       = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+CACHE_CHUNK_SIZE       = 1024 * 1024
+CACHE_SUFFIX           = ".zip"
+
+_stats: Counter = Counter()
+
+def cache_enabled() -> bool:
+    return RESULT_CACHE_MAX_BYTES > 0
+
+def cache_stats() -> Dict[str, int]:
+    """
+    Hit, miss, store and eviction counts for this process.
+    """
+    return {name: _stats[name] for name in ("hits", "misses", "stores", "evictions")}
+
+def result_key(endpoint: str, *parts: object) -> str:
+    """
+    Hash an endpoint name and its inputs (bytes, digests or options)
+    into a cache key.
+    """
+    digest = hashlib.sha256(endpoint.encode("utf-8"))
+    for part in parts:
+        data = part if isinstance(part, bytes) else repr(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+def _entry_path(key: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, key + CACHE_SUFFIX)
+
+def touch_entry(path: str, ttl: float) -> bool:
+    """
+    Mark a stored file as just used. Returns False (removing the file)
+    if it is older than ttl, or if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+        if time.time() - stat.st_mtime > ttl:
+            os.unlink(path)
+            return False
+    except FileNotFoundError:
+        return False
+    os.utime(path, (time.time(), stat.st_mtime))
+    return True
+
+def open_cached(key: str) -> Optional[AsyncIterator[bytes]]:
+    """
+    Return a stream over the stored result for key, or None on a miss.
+    """
+    if not cache_enabled():
+        return None
+    path = _entry_path(key)
+    try:
+        if not touch_entry(path, RESULT_CACHE_TTL):
+            raise FileNotFoundError(path)
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        _stats["misses"] += 1
+        return None
+
+    _stats["hits"] += 1
+    return _iter_file(fh)
+
+async def _iter_file(fh) -> AsyncIterator[bytes]:
+    with fh:
+        while chunk := await asyncio.to_thread(fh.read, CACHE_CHUNK_SIZE):
+            yield chunk
+
+async def store_result(key: str, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Pass the stream through unchanged while copying it into the cache.
+    The entry is only published if the stream completes. Closing the
+    result closes the stream.
+    """
+    async with aclosing(stream):
+        if not cache_enabled():
+            async for chunk in stream:
+                yield chunk
+            return
+
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".partial-", dir=RESULT_CACHE_DIR)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in stream:
+                    await asyncio.to_thread(out.write, chunk)
+                    yield chunk
+            os.replace(tmp_path, _entry_path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    _stats["stores"] += 1
+    _stats["evictions"] += await asyncio.to_thread(
+        evict_directory, RESULT_CACHE_DIR, CACHE_SUFFIX,
+        RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL
+    )
+
+def evict_directory(
+    directory: str,
+    suffix: str,
+    max_bytes: int,
+    ttl: float,
+    keep: Container[str] = ()
+) -> int:
+    """
+    Drop files ending in suffix that are older than ttl, then the least
+    recently used ones until the rest fit within max_bytes. Paths in
+    keep are in use and never dropped, though they count towards
+    max_bytes. Returns the number of files removed.
+    """
+    now     = time.time()
+    removed = 0
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith(suffix):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.path in keep:
+                # Sorted after every other entry
+                entries.append((float("inf"), stat.st_size, entry.path))
+            elif now - stat.st_mtime > ttl:
+                removed += _remove(entry.path)
+            else:
+                entries.append((stat.st_atime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes or path in keep:
+            break
+        removed += _remove(path)
+        total   -= size
+    return removed
+
+def _remove(path: str) -> int:
+    try:
+        os.unlink(path)
+        return 1
+    except FileNotFoundError:
+        return 0
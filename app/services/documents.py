@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Upload-once document store: keep a PDF on disk under its SHA-256,
+so bookmark export and splitting can reuse it without re-uploading.
+"""
+
+import os
+import re
+import shutil
+import asyncio
+import tempfile
+from typing import BinaryIO, Dict, Union
+
+from fastapi import UploadFile
+
+from .utils import PdfSource, spool_upload
+from .engine import page_count
+from .exceptions import NotFoundError
+from .executor import run_job, estimate_memory
+from .cache import touch_entry, evict_directory
+
+# Document store configuration (overridable with environment variables)
+DOCUMENT_DIR       = os.getenv(
+    "DOCUMENT_DIR", os.path.join(tempfile.gettempdir(), "split-pdf-documents")
+)
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+DOCUMENT_TTL       = float(os.getenv("DOCUMENT_TTL", "3600"))
+DOCUMENT_SUFFIX    = ".pdf"
+
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+# Paths of the documents in use in this process, with how many users
+_in_use: Dict[str, int] = {}
+
+class StoredDocument(PdfSource):
+    """
+    A stored document in use. Until it is closed, eviction by this
+    process passes it over. If it is removed anyway, by another worker
+    process, opening it raises NotFoundError rather than an OSError.
+    """
+    def __init__(self, doc_id: str, path: str):
+        super().__init__(path=path, digest=doc_id)
+        self._held = True
+        _in_use[path] = _in_use.get(path, 0) + 1
+
+    def __getstate__(self) -> dict:
+        # Copies sent to pool workers hold no reference of their own
+        return {**self.__dict__, "_held": False}
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            raise NotFoundError("Document not found")
+
+    def open_stream(self) -> BinaryIO:
+        try:
+            return super().open_stream()
+        except FileNotFoundError:
+            raise NotFoundError("Document not found")
+
+    def close(self) -> None:
+        """
+        Release the document, marking it as just used.
+        """
+        if not self._held:
+            return
+        self._held = False
+        count = _in_use.pop(self.path, 1) - 1
+        if count > 0:
+            _in_use[self.path] = count
+        touch_entry(self.path, DOCUMENT_TTL)
+
+async def store_document(pdf_file: UploadFile) -> Dict[str, Union[str, int]]:
+    """
+    1. Spool and hash the upload.
+    2. Check it opens as a PDF and count its pages.
+    3. Move it into the store under its digest.
+    4. Evict expired and least recently used documents.
+    """
+    source = await spool_upload(pdf_file)
+    size   = source.size
+    try:
+        pages = await run_job(page_count, source, cost=estimate_memory(size))
+        path  = _document_path(source.digest)
+        os.makedirs(DOCUMENT_DIR, exist_ok=True)
+        await asyncio.to_thread(_persist, source, path)
+    finally:
+        source.close()
+
+    await asyncio.to_thread(
+        evict_directory, DOCUMENT_DIR, DOCUMENT_SUFFIX, DOCUMENT_MAX_BYTES, DOCUMENT_TTL, set(_in_use)
+    )
+    return _describe(source.digest, size, pages)
+
+def open_document(doc_id: str) -> StoredDocument:
+    """
+    Return the stored document as a PdfSource, marking it as used and
+    keeping it from eviction until the source is closed.
+    Raises NotFoundError if it is unknown or has expired.
+    """
+    if not _DOCUMENT_ID.match(doc_id or ""):
+        raise NotFoundError("Document not found")
+    path = _document_path(doc_id)
+    if not touch_entry(path, DOCUMENT_TTL):
+        raise NotFoundError("Document not found")
+    return StoredDocument(doc_id, path)
+
+async def describe_document(doc_id: str) -> Dict[str, Union[str, int]]:
+    """
+    Return id, size, page count and remaining lifetime of a stored document.
+    """
+    source = open_document(doc_id)
+    try:
+        size  = source.size
+        pages = await run_job(page_count, source, cost=estimate_memory(size))
+    finally:
+        source.close()
+    return _describe(doc_id, size, pages)
+
+def _describe(doc_id: str, size: int, pages: int) -> Dict[str, Union[str, int]]:
+    return {
+        "id":         doc_id,
+        "size":       size,
+        "pages":      pages,
+        "expires_in": int(DOCUMENT_TTL)
+    }
+
+def _document_path(doc_id: str) -> str:
+    return os.path.join(DOCUMENT_DIR, doc_id + DOCUMENT_SUFFIX)
+
+def _persist(source: PdfSource, path: str) -> None:
+    """
+    Write the source to path atomically, moving spooled files in place.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=".partial-", dir=DOCUMENT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if source.path is None:
+                out.write(source.data or b"")
+        if source.path is not None:
+            # A rename on the same filesystem, a copy otherwise.
+            shutil.move(source.path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
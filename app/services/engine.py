@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+PDF engines: the few operations the services need from a PDF library
+(open, page count, outline, extract and write a page range), with
+PyPDF2 as the reference backend and pikepdf (qpdf) as an optional
+compiled one. PDF_ENGINE picks the backend when the app starts; every
+backend must give the same outline and the same page content, which
+tests/test_engines.py checks.
+"""
+
+import os
+from io import BytesIO
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, Destination, DictionaryObject, IndirectObject, NullObject
+
+from .utils import PdfSource, load_pdf_reader, FALLBACK_PAGE
+from .pages import PageTree
+from .fragments import write_fragment
+from .exceptions import ValidationError
+
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# Backend used for parsing and writing: "pypdf2" or "pikepdf"
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pypdf2").lower()
+
+# Documents with more pages or outline entries are refused (0: no limit)
+MAX_PAGES         = int(os.getenv("MAX_PAGES", "100000"))
+MAX_OUTLINE_ITEMS = int(os.getenv("MAX_OUTLINE_ITEMS", "100000"))
+
+class OutlineItem(NamedTuple):
+    """
+    An outline entry: its depth (0 for top level), its title, and the
+    1-based page it leads to, 0 if it leads to no page of the document.
+    """
+    level:      int
+    title:      str
+    start_page: int
+
+class PdfEngine:
+    """
+    Operations on a PdfSource. Each call opens the source itself, so an
+    engine holds no state and can be pickled to pool workers.
+    """
+    name = ""
+
+    def page_count(self, source: PdfSource) -> int:
+        raise NotImplementedError
+
+    def outline(self, source: PdfSource) -> Iterator[OutlineItem]:
+        """
+        The outline's entries in document order, depth-first.
+        """
+        raise NotImplementedError
+
+    def write_range(self, source: PdfSource, start_page: int, end_page: int) -> bytes:
+        """
+        The 1-based inclusive page range as a new PDF.
+        """
+        raise NotImplementedError
+
+class PyPDF2Engine(PdfEngine):
+    name = "pypdf2"
+
+    def page_count(self, source: PdfSource) -> int:
+        return len(PageTree(load_pdf_reader(source)))
+
+    def outline(self, source: PdfSource) -> Iterator[OutlineItem]:
+        reader = load_pdf_reader(source)
+        return _iter_bookmarks(reader, _build_page_index(reader))
+
+    def write_range(self, source: PdfSource, start_page: int, end_page: int) -> bytes:
+        return write_fragment(source, start_page, end_page)
+
+class PikepdfEngine(PdfEngine):
+    """
+    qpdf through pikepdf: parsing and serialization in C++. Fragments
+    are written by qpdf's page copying, without the per-worker object
+    cache of the PyPDF2 fragment writer.
+    """
+    name = "pikepdf"
+
+    def __init__(self):
+        if pikepdf is None:
+            raise RuntimeError("PDF_ENGINE=pikepdf needs the pikepdf package installed")
+
+    def page_count(self, source: PdfSource) -> int:
+        with _open_pikepdf(source) as pdf:
+            return len(pdf.pages)
+
+    def outline(self, source: PdfSource) -> Iterator[OutlineItem]:
+        with _open_pikepdf(source) as pdf:
+            # Collected before the document is closed
+            return iter(list(_iter_pikepdf_outline(pdf)))
+
+    def write_range(self, source: PdfSource, start_page: int, end_page: int) -> bytes:
+        with _open_pikepdf(source) as pdf:
+            out = pikepdf.new()
+            out.pages.extend(pdf.pages[start_page - 1:end_page])
+            buf = BytesIO()
+            out.save(buf)
+            return buf.getvalue()
+
+ENGINES = {engine.name: engine for engine in (PyPDF2Engine, PikepdfEngine)}
+
+_engines: Dict[str, PdfEngine] = {}
+
+def get_engine(name: Optional[str] = None) -> PdfEngine:
+    """
+    The named engine, PDF_ENGINE by default. Raises ValueError for an
+    unknown name and RuntimeError if its library is not installed.
+    """
+    name = (name or PDF_ENGINE).lower()
+    engine = _engines.get(name)
+    if engine is None:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown PDF_ENGINE: {name!r} (expected one of {', '.join(ENGINES)})")
+        engine = _engines[name] = ENGINES[name]()
+    return engine
+
+def page_count(source: PdfSource) -> int:
+    """
+    Page count with the configured engine, for running on the pool.
+    Raises ValidationError above MAX_PAGES.
+    """
+    total = get_engine().page_count(source)
+    if MAX_PAGES and total > MAX_PAGES:
+        raise ValidationError(f"PDF has {total} pages, more than the limit of {MAX_PAGES}")
+    return total
+
+def outline(source: PdfSource) -> Iterator[OutlineItem]:
+    """
+    The outline with the configured engine. Raises ValidationError as
+    soon as it runs past MAX_OUTLINE_ITEMS entries, before the rest of
+    it is read.
+    """
+    for count, item in enumerate(get_engine().outline(source), 1):
+        if MAX_OUTLINE_ITEMS and count > MAX_OUTLINE_ITEMS:
+            raise ValidationError(f"PDF outline has more than the limit of {MAX_OUTLINE_ITEMS} entries")
+        yield item
+
+def _build_page_index(reader: PdfReader) -> Dict[int, int]:
+    """
+    Map each page object's id number to its 0-based page index,
+    in one walk of the page tree, for resolving every destination.
+    """
+    page_ids = PageTree(reader).page_ids()
+    return {page_id: idx for idx, page_id in enumerate(page_ids) if page_id >= 0}
+
+def _resolve_page(target: Any, page_index: Dict[int, int]) -> int:
+    """
+    1-based page number of a destination's page entry, matching
+    reader.get_destination_page_number(entry) + 1 without its lookups:
+    0 for entries that lead to no page (URI and other actions, missing
+    or unknown destinations).
+    """
+    if isinstance(target, IndirectObject):
+        return page_index.get(target.idnum, -1) + 1
+    if isinstance(target, int):
+        return target + 1
+    if target is None or isinstance(target, NullObject):
+        return 0
+    return FALLBACK_PAGE
+
+def _iter_bookmarks(reader: PdfReader, page_index: Dict[int, int]) -> Iterator[OutlineItem]:
+    """
+    Yield the outline's entries in document order, depth-first, by
+    following the /First and /Next links with an explicit stack.
+    Nesting depth costs no recursion, and nodes already visited are
+    skipped so that cyclic /Next or /First links cannot loop forever.
+    """
+    outlines = _lookup(reader.trailer["/Root"], "/Outlines")
+    if not isinstance(outlines, DictionaryObject) or "/First" not in outlines:
+        return
+
+    named: Optional[Dict[str, Any]] = None
+    seen:  set = set()
+    stack = [(outlines.raw_get("/First"), 0)]
+    while stack:
+        ref, level = stack.pop()
+        key = (ref.idnum, ref.generation) if isinstance(ref, IndirectObject) else id(ref)
+        if key in seen:
+            continue
+        seen.add(key)
+        node = ref.get_object()
+        if not isinstance(node, DictionaryObject):
+            continue
+
+        dest = _outline_dest(node)
+        if isinstance(dest, str):
+            # Named destination: look it up once the first one shows up.
+            if named is None:
+                named = reader.named_destinations
+            dest = named.get(dest)
+            target = dest.page if isinstance(dest, Destination) else None
+        elif isinstance(dest, ArrayObject) and len(dest) > 0:
+            target = dest[0]
+        else:
+            target = None
+        yield OutlineItem(level, str(_lookup(node, "/Title") or ""), _resolve_page(target, page_index))
+
+        # Pushed in reverse: children are visited before the next sibling.
+        if "/Next" in node:
+            stack.append((node.raw_get("/Next"), level))
+        if "/First" in node:
+            stack.append((node.raw_get("/First"), level + 1))
+
+def _outline_dest(node: DictionaryObject) -> Any:
+    """
+    An outline item's destination: a GoTo action's /D, else its /Dest.
+    """
+    if "/A" in node:
+        action = _lookup(node, "/A")
+        if isinstance(action, DictionaryObject) and _lookup(action, "/S") == "/GoTo":
+            return _lookup(action, "/D")
+        return None
+    dest = _lookup(node, "/Dest")
+    if isinstance(dest, DictionaryObject):
+        return _lookup(dest, "/D")
+    return dest
+
+def _lookup(obj: DictionaryObject, key: str) -> Any:
+    """
+    obj[key] with indirect references resolved, or None if missing.
+    """
+    value = obj.raw_get(key) if key in obj else None
+    return value.get_object() if value is not None else None
+
+def _open_pikepdf(source: PdfSource) -> "pikepdf.Pdf":
+    """
+    Open a PdfSource with pikepdf, raising ValidationError as
+    load_pdf_reader does for files that are not PDFs or are encrypted.
+    """
+    try:
+        pdf = pikepdf.open(source.path if source.path is not None else BytesIO(source.data or b""))
+    except pikepdf.PasswordError:
+        raise ValidationError("PDF is password-protected")
+    except pikepdf.PdfError as exc:
+        raise ValidationError(f"Invalid PDF file: {exc}")
+    if pdf.is_encrypted:
+        pdf.close()
+        raise ValidationError("PDF is password-protected")
+    return pdf
+
+def _iter_pikepdf_outline(pdf: "pikepdf.Pdf") -> Iterator[OutlineItem]:
+    """
+    The outline walk of _iter_bookmarks over pikepdf objects, which
+    resolve indirect references on access.
+    """
+    outlines = pdf.Root.get("/Outlines")
+    if not isinstance(outlines, pikepdf.Dictionary) or "/First" not in outlines:
+        return
+    page_index = {page.obj.objgen: idx for idx, page in enumerate(pdf.pages)}
+
+    seen:  set = set()
+    stack = [(outlines.First, 0)]
+    while stack:
+        node, level = stack.pop()
+        key = node.objgen if node.is_indirect else id(node)
+        if key in seen:
+            continue
+        seen.add(key)
+        if not isinstance(node, pikepdf.Dictionary):
+            continue
+
+        dest = _pikepdf_outline_dest(node)
+        if isinstance(dest, (pikepdf.Name, pikepdf.String)):
+            dest = _pikepdf_named_dest(pdf, dest)
+        if isinstance(dest, pikepdf.Dictionary):
+            dest = dest.get("/D")
+        target = dest[0] if isinstance(dest, pikepdf.Array) and len(dest) > 0 else None
+
+        if isinstance(target, pikepdf.Dictionary):
+            page = page_index.get(target.objgen, -1) + 1 if target.is_indirect else 0
+        elif isinstance(target, int) and not isinstance(target, bool):
+            page = target + 1
+        elif target is None:
+            page = 0
+        else:
+            page = FALLBACK_PAGE
+        yield OutlineItem(level, str(node.get("/Title", "")), page)
+
+        if "/Next" in node:
+            stack.append((node.Next, level))
+        if "/First" in node:
+            stack.append((node.First, level + 1))
+
+def _pikepdf_outline_dest(node: "pikepdf.Dictionary") -> Any:
+    if "/A" in node:
+        action = node.A
+        if isinstance(action, pikepdf.Dictionary) and action.get("/S") == pikepdf.Name.GoTo:
+            return action.get("/D")
+        return None
+    dest = node.get("/Dest")
+    if isinstance(dest, pikepdf.Dictionary):
+        return dest.get("/D")
+    return dest
+
+def _pikepdf_named_dest(pdf: "pikepdf.Pdf", name: Any) -> Any:
+    """
+    A named destination from the /Dests name tree (by string) or the
+    catalog's /Dests dictionary (by name).
+    """
+    if isinstance(name, pikepdf.Name):
+        dests = pdf.Root.get("/Dests")
+        return dests.get(str(name)) if isinstance(dests, pikepdf.Dictionary) else None
+    names = pdf.Root.get("/Names")
+    if isinstance(names, pikepdf.Dictionary) and "/Dests" in names:
+        return pikepdf.NameTree(names.Dests).get(str(name))
+    return None
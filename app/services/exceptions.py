@@ -11,3 +11,23 @@ class NotFoundError(ServiceError):
 class ValidationError(ValueError):
     """Raised on any invalid input or state."""
     pass
+
+class OverloadedError(ServiceError):
+    """Raised when the job queue is full and new work is refused."""
+    reason = "queue"
+
+class MemoryBudgetError(OverloadedError):
+    """Raised when a job's estimated memory does not fit the budget left."""
+    reason = "memory"
+
+class TooManyJobsError(OverloadedError):
+    """Raised when as many large jobs as allowed are already running."""
+    reason = "heavy_jobs"
+
+class JobTimeoutError(ServiceError):
+    """Raised when a job runs longer than its time limit."""
+    pass
+
+class NotReadyError(ServiceError):
+    """Raised when a requested result is not available yet."""
+    pass
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Run CPU-bound service stages off the event loop, in a bounded
+process pool (default) or thread pool.
+"""
+
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    BrokenExecutor
+)
+from typing import Any, Callable, List, Optional, Set, TypeVar
+
+from .exceptions import ServiceError, OverloadedError, MemoryBudgetError, TooManyJobsError, JobTimeoutError
+
+T = TypeVar("T")
+
+def _default_memory_budget() -> int:
+    """
+    Half the container's memory limit, or of physical memory if there
+    is none, shared between the Uvicorn workers.
+    """
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as fh:
+                limits.append(int(fh.read().strip()))
+        except (OSError, ValueError):
+            pass
+    try:
+        limits.append(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+    except (OSError, ValueError):
+        limits.append(4 * 1024 ** 3)
+    workers = max(int(os.getenv("UVICORN_WORKERS", "1")), 1)
+    return min(limits) // 2 // workers
+
+# Executor configuration (overridable with environment variables)
+EXECUTOR_KIND        = os.getenv("EXECUTOR_KIND", "process")
+EXECUTOR_WORKERS     = int(os.getenv("EXECUTOR_WORKERS", "0")) or (os.cpu_count() or 1)
+EXECUTOR_QUEUE_DEPTH = int(os.getenv("EXECUTOR_QUEUE_DEPTH", "8"))
+EXECUTOR_JOB_TIMEOUT = float(os.getenv("EXECUTOR_JOB_TIMEOUT", "300"))
+RETRY_AFTER_SECONDS  = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+JOB_PARALLELISM      = int(os.getenv("JOB_PARALLELISM", "0")) or EXECUTOR_WORKERS
+SLOT_POLL_INTERVAL   = 0.25
+
+# Memory admission, per Uvicorn worker: a job's cost is estimated from
+# its upload size and page count, and jobs are admitted while their
+# estimates fit the budget (a job alone is always admitted).
+MEMORY_BUDGET_BYTES    = int(os.getenv("MEMORY_BUDGET_BYTES", "0")) or _default_memory_budget()
+MEMORY_PER_UPLOAD_BYTE = float(os.getenv("MEMORY_PER_UPLOAD_BYTE", "3"))
+MEMORY_PER_PAGE        = int(os.getenv("MEMORY_PER_PAGE", str(64 * 1024)))
+HEAVY_JOB_BYTES        = int(os.getenv("HEAVY_JOB_BYTES", str(256 * 1024 * 1024)))
+MAX_HEAVY_JOBS         = int(os.getenv("MAX_HEAVY_JOBS", "2"))
+
+_pool: Optional[Executor] = None
+_in_flight = 0
+_pool_calls: Set[Future] = set()
+_memory_reserved = 0
+_heavy_jobs = 0
+
+def get_executor() -> Executor:
+    """
+    Return the shared pool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        if EXECUTOR_KIND == "thread":
+            _pool = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS)
+        elif EXECUTOR_KIND == "process":
+            # Workers start from a clean forkserver rather than a fork of
+            # the server, so they hold neither its socket nor its loop.
+            _pool = ProcessPoolExecutor(
+                max_workers=EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+        else:
+            raise ValueError(f"Unknown EXECUTOR_KIND: {EXECUTOR_KIND!r}")
+    return _pool
+
+def shutdown_executor(wait: bool = True) -> None:
+    """
+    Stop the shared pool, cancelling queued work and, unless told not
+    to, waiting for running work to finish.
+    """
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+def in_flight() -> int:
+    """
+    Number of admitted jobs, running or queued.
+    """
+    return _in_flight
+
+def queued_calls() -> int:
+    """
+    Number of calls submitted to the pool that no worker has started.
+    """
+    return sum(1 for future in list(_pool_calls) if not future.running() and not future.done())
+
+def memory_reserved() -> int:
+    """
+    Estimated memory of the admitted jobs, in bytes.
+    """
+    return _memory_reserved
+
+def heavy_jobs() -> int:
+    """
+    Number of admitted jobs estimated at HEAVY_JOB_BYTES or more.
+    """
+    return _heavy_jobs
+
+def estimate_memory(upload_bytes: int, pages: int = 0) -> int:
+    """
+    Memory a job is expected to need for an upload of this size and,
+    once known, this many pages.
+    """
+    return int(upload_bytes * MEMORY_PER_UPLOAD_BYTE) + pages * MEMORY_PER_PAGE
+
+def check_admission(cost: int, held: int = 0, heavy: bool = False) -> None:
+    """
+    Raise unless a job estimated at cost, of which held is already
+    reserved, would be admitted now: TooManyJobsError if it would be one
+    heavy job too many, MemoryBudgetError if it would overrun the budget
+    alongside other jobs. Also used to refuse requests before their
+    upload is read.
+    """
+    if cost >= HEAVY_JOB_BYTES and not heavy and _heavy_jobs >= MAX_HEAVY_JOBS:
+        raise TooManyJobsError("Too many large jobs in progress, please retry later")
+    others = _memory_reserved - held
+    if others > 0 and others + cost > MEMORY_BUDGET_BYTES:
+        raise MemoryBudgetError("Not enough memory for this job right now, please retry later")
+
+class JobSlot:
+    """
+    One admitted job. Holds a place in the bounded queue and its
+    estimated memory until released, and runs the job's CPU-bound
+    stages on the pool, all within EXECUTOR_JOB_TIMEOUT of its
+    admission.
+    """
+    def __init__(self):
+        self._released = False
+        self._cost     = 0
+        self._heavy    = False
+        self._cleanups: List[Callable[[], None]] = []
+        self._running:  Set[Future] = set()
+        self._deadline = time.monotonic() + EXECUTOR_JOB_TIMEOUT
+        self._loop:     Optional[asyncio.AbstractEventLoop] = None
+
+    def on_release(self, callback: Callable[[], None]) -> None:
+        """
+        Register a cleanup (e.g. removing a spooled upload) to run
+        when the job's slot is released.
+        """
+        self._cleanups.append(callback)
+
+    def charge(self, cost: int) -> None:
+        """
+        Raise the job's memory estimate to cost, e.g. once its page
+        count is known. Raises as check_admission does if the larger
+        job no longer fits, leaving the estimate as it was.
+        """
+        global _memory_reserved, _heavy_jobs
+        if cost <= self._cost:
+            return
+        check_admission(cost, self._cost, self._heavy)
+        _memory_reserved += cost - self._cost
+        self._cost = cost
+        if cost >= HEAVY_JOB_BYTES and not self._heavy:
+            self._heavy = True
+            _heavy_jobs += 1
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run func(*args) on the pool, bounded by what is left of the
+        job's time limit.
+        """
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise JobTimeoutError(f"Job exceeded the {EXECUTOR_JOB_TIMEOUT:g}s time limit")
+        self._loop = asyncio.get_running_loop()
+        try:
+            future = get_executor().submit(func, *args)
+            self._running.add(future)
+            _pool_calls.add(future)
+            future.add_done_callback(self._running.discard)
+            future.add_done_callback(_pool_calls.discard)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise JobTimeoutError(f"Job exceeded the {EXECUTOR_JOB_TIMEOUT:g}s time limit")
+        except BrokenExecutor:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time.
+            shutdown_executor(wait=False)
+            raise ServiceError("Worker pool crashed while processing the job")
+
+    def release(self) -> None:
+        """
+        Give up the job's place and run its cleanups. Pool work that
+        cannot be stopped (timed out or abandoned while running) keeps
+        the place until it actually ends, so admission sees the worker
+        as busy.
+        """
+        if self._released:
+            return
+        self._released = True
+        running = [future for future in self._running if not future.done()]
+        if not running:
+            self._finish()
+            return
+
+        loop = self._loop
+        left = [len(running)]
+
+        def finished(_: Future) -> None:
+            left[0] -= 1
+            if left[0] == 0:
+                self._finish()
+
+        for future in running:
+            future.add_done_callback(lambda f: loop.call_soon_threadsafe(finished, f))
+
+    def _finish(self) -> None:
+        global _in_flight, _memory_reserved, _heavy_jobs
+        _in_flight       -= 1
+        _memory_reserved -= self._cost
+        _heavy_jobs      -= self._heavy
+        for callback in self._cleanups:
+            callback()
+
+    # Safety net for streams that are dropped before they start.
+    __del__ = release
+
+    def __enter__(self) -> "JobSlot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+def acquire_slot(cost: int = 0) -> JobSlot:
+    """
+    Admit a new job with its estimated memory cost, or raise
+    OverloadedError if every worker is busy and the queue is full (or a
+    subclass if the memory budget or heavy job limit would be exceeded).
+    """
+    global _in_flight
+    if _in_flight >= EXECUTOR_WORKERS + EXECUTOR_QUEUE_DEPTH:
+        raise OverloadedError("Server is busy, please retry later")
+    check_admission(cost)
+    _in_flight += 1
+    slot = JobSlot()
+    slot.charge(cost)
+    return slot
+
+async def wait_for_slot(cost: int = 0) -> JobSlot:
+    """
+    Admit a new job, waiting for room instead of refusing it.
+    For background work that has already been accepted.
+    """
+    while True:
+        try:
+            return acquire_slot(cost)
+        except OverloadedError:
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+async def run_job(func: Callable[..., T], *args: Any, cost: int = 0) -> T:
+    """
+    Admit and run a single CPU-bound call off the event loop.
+    """
+    with acquire_slot(cost) as slot:
+        return await slot.run(func, *args)
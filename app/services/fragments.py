@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Write a page range of a PDF as a standalone fragment, copying only the
+objects the selected pages use.
+
+Each object of the source is serialized once per worker, with the
+positions of its references recorded, and each page remembers the
+objects reachable from it. A fragment is then put together from those
+bytes with its references renumbered, so pages that several fragments
+share (a chapter row plus one row per section) are resolved and
+serialized once rather than once per fragment. Along the way:
+- references to pages outside the range (link destinations, annotation
+  /P entries) become null, and those within it point at the fragment's
+  pages, instead of pulling in copies of the pages they name;
+- byte-identical streams stored more than once in the source (fonts,
+  images, ICC profiles embedded per chapter) are written a single time;
+- uncompressed content streams are Flate-compressed if enabled.
+As with PdfWriter.add_page, /Parent and /StructParents entries below
+the page are dropped.
+"""
+
+import os
+import zlib
+import hashlib
+import threading
+from io import BytesIO
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    PdfObject,
+    StreamObject
+)
+
+from .utils import PdfSource, load_pdf_reader
+from .pages import PageTree
+
+# Flate-compress content streams stored without a filter
+COMPRESS_CONTENT_STREAMS = os.getenv("COMPRESS_CONTENT_STREAMS", "0").lower() in ("1", "true", "yes")
+# Serialized objects kept per worker process, across the sources it has seen
+PAGE_CACHE_MAX_BYTES     = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+SKIPPED_KEYS = ("/Parent", "/StructParents")
+PARENT_REF   = 0     # placeholder id for a page's new /Parent
+
+# (body bytes, ((offset, referenced id, generation), ...)) of one object
+Serialized = Tuple[bytes, Tuple[Tuple[int, int, int], ...]]
+
+class _SourceObjects:
+    """
+    What has been resolved and serialized so far for one source. Pages
+    are looked up as fragments ask for them: page_ids maps the 0-based
+    indexes seen so far to their ids, and pages holds every id known to
+    be a page, including those only found as references.
+    """
+    def __init__(self, reader: PdfReader):
+        self.header     = reader.pdf_header.encode("latin-1")
+        self.page_ids:  Dict[int, int] = {}
+        self.pages:     Set[int] = set()
+        self.objects:   Dict[int, Optional[Serialized]] = {}
+        self.closures:  Dict[int, Tuple[int, ...]] = {}
+        self.streams:   Dict[Tuple[bytes, str], int] = {}
+        self.aliases:   Dict[int, int] = {}
+        self.size       = 0
+
+_sources: "OrderedDict[Tuple[str, bool], _SourceObjects]" = OrderedDict()
+_lock   = threading.Lock()
+_stats  = Counter()
+
+def write_fragment(
+    source: PdfSource,
+    start_page: int,
+    end_page: int,
+    compress_streams: bool = COMPRESS_CONTENT_STREAMS
+) -> bytes:
+    """
+    Write the 1-based inclusive page range into a new PDF in memory,
+    reusing this worker's serialized objects of the source.
+    """
+    key    = (source.digest, compress_streams)
+    reader: List[PdfReader] = []
+    tree:   List[PageTree] = []
+
+    def get_reader() -> PdfReader:
+        if not reader:
+            reader.append(load_pdf_reader(source))
+        return reader[0]
+
+    def get_tree() -> PageTree:
+        if not tree:
+            tree.append(PageTree(get_reader()))
+        return tree[0]
+
+    with _lock:
+        known = _sources.get(key) if source.digest else None
+        if known is not None:
+            _sources.move_to_end(key)
+    known = known or _SourceObjects(get_reader())
+
+    indexes = range(start_page - 1, end_page)
+    for idx in indexes:
+        if idx not in known.page_ids:
+            page_id = known.page_ids[idx] = get_tree().page(idx)[0]
+            known.pages.add(page_id)
+    page_ids = [known.page_ids[idx] for idx in indexes]
+    order: Dict[int, None] = dict.fromkeys(page_ids)
+    for idx in indexes:
+        order.update(dict.fromkeys(_closure(known, idx, get_tree, compress_streams)))
+    data = _assemble(known, page_ids, list(order))
+
+    if source.digest:
+        _remember(key, known)
+    return data
+
+def fragment_cache_stats() -> Dict[str, int]:
+    """
+    Objects serialized and reused by this worker so far.
+    """
+    return {name: _stats[name] for name in ("serialized", "reused")}
+
+def _closure(known: _SourceObjects, idx: int, get_tree, compress: bool) -> Tuple[int, ...]:
+    """
+    Ids of the objects reachable from the page at idx, other pages
+    excluded, serializing whatever has not been serialized yet.
+    """
+    page_id = known.page_ids[idx]
+    closure = known.closures.get(page_id)
+    if closure is not None:
+        _stats["reused"] += len(closure) + 1
+        return closure
+
+    tree   = get_tree()
+    reader = tree.reader
+    page   = tree.page(idx)[1]
+    contents = _content_ids(page) if compress else set()
+    _store(known, page_id, _serialize(page, is_page=True))
+
+    found: Dict[int, None] = {}
+    stack = [ref[1:] for ref in known.objects[page_id][1]]
+    while stack:
+        obj_id, generation = stack.pop()
+        if obj_id == PARENT_REF or obj_id in known.pages or obj_id in found:
+            continue
+        obj_id = known.aliases.get(obj_id, obj_id)
+        if obj_id not in known.objects:
+            target = reader.get_object(IndirectObject(obj_id, generation, reader))
+            if _is_page(target):
+                known.pages.add(obj_id)
+                continue
+            if isinstance(target, StreamObject):
+                first = known.streams.setdefault(_stream_key(target), obj_id)
+                if first != obj_id:
+                    known.aliases[obj_id] = obj_id = first
+            if obj_id not in known.objects:
+                _store(known, obj_id, None if target is None else _serialize(
+                    target, compress=obj_id in contents
+                ))
+        if obj_id in found:
+            continue
+        found[obj_id] = None
+        serialized = known.objects[obj_id]
+        if serialized is not None:
+            stack.extend(ref[1:] for ref in serialized[1])
+
+    closure = known.closures[page_id] = tuple(found)
+    return closure
+
+def _store(known: _SourceObjects, obj_id: int, serialized: Optional[Serialized]) -> None:
+    known.objects[obj_id] = serialized
+    known.size += len(serialized[0]) if serialized is not None else 0
+    _stats["serialized"] += 1
+
+def _assemble(known: _SourceObjects, page_ids: List[int], order: List[int]) -> bytes:
+    """
+    Link the serialized objects into a PDF: catalog 1, page tree 2,
+    then the pages and their objects.
+    """
+    numbers = {obj_id: num for num, obj_id in enumerate(order, start=3)}
+    numbers[PARENT_REF] = 2
+
+    def ref(obj_id: int) -> bytes:
+        num = numbers.get(known.aliases.get(obj_id, obj_id))
+        return b"%d 0 R" % num if num is not None else b"null"
+
+    out     = BytesIO()
+    offsets = []
+    out.write(known.header + b"\n%\xe2\xe3\xcf\xd3\n")
+
+    kids = b" ".join(b"%d 0 R" % numbers[page_id] for page_id in page_ids)
+    for body in (b"<<\n/Type /Catalog\n/Pages 2 0 R\n>>",
+                 b"<<\n/Type /Pages\n/Count %d\n/Kids [ %s ]\n>>" % (len(page_ids), kids)):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (len(offsets), body))
+
+    for obj_id in order:
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % len(offsets))
+        serialized = known.objects[obj_id]
+        if serialized is None:
+            out.write(b"null")
+        else:
+            body, refs = serialized
+            pos = 0
+            for offset, target, _ in refs:
+                out.write(body[pos:offset])
+                out.write(ref(target))
+                pos = offset
+            out.write(body[pos:])
+        out.write(b"\nendobj\n")
+
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+    out.writelines(b"%010d 00000 n \n" % offset for offset in offsets)
+    out.write(b"trailer\n<<\n/Size %d\n/Root 1 0 R\n>>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(offsets) + 1, xref))
+    return out.getvalue()
+
+def _remember(key: Tuple[str, bool], known: _SourceObjects) -> None:
+    """
+    Keep the source's objects, evicting the least recently used
+    sources beyond PAGE_CACHE_MAX_BYTES, this one last.
+    """
+    with _lock:
+        _sources[key] = known
+        _sources.move_to_end(key)
+        total = sum(entry.size for entry in _sources.values())
+        while _sources and total > PAGE_CACHE_MAX_BYTES:
+            _, evicted = _sources.popitem(last=False)
+            total -= evicted.size
+
+def _serialize(obj: PdfObject, is_page: bool = False, compress: bool = False) -> Serialized:
+    """
+    Serialize an object as PdfWriter would, recording where each
+    reference goes instead of writing its source object number.
+    """
+    buf  = BytesIO()
+    refs: List[Tuple[int, int, int]] = []
+    if isinstance(obj, StreamObject):
+        data, extra = obj._data, b""
+        if compress and isinstance(obj, DecodedStreamObject) and "/Filter" not in obj:
+            data, extra = zlib.compress(data), b"/Filter /FlateDecode\n"
+        _write_dict(obj, buf, refs, skip=SKIPPED_KEYS + ("/Length",), close=False)
+        buf.write(extra + b"/Length %d\n>>\nstream\n" % len(data))
+        buf.write(data)
+        buf.write(b"\nendstream")
+    elif is_page:
+        _write_dict(obj, buf, refs, skip=SKIPPED_KEYS, close=False)
+        buf.write(b"/Parent ")
+        refs.append((buf.tell(), PARENT_REF, 0))
+        buf.write(b"\n>>")
+    else:
+        _write(obj, buf, refs)
+    return buf.getvalue(), tuple(refs)
+
+def _write(obj: PdfObject, buf: BytesIO, refs: List[Tuple[int, int, int]]) -> None:
+    if isinstance(obj, IndirectObject):
+        refs.append((buf.tell(), obj.idnum, obj.generation))
+    elif isinstance(obj, DictionaryObject) and not isinstance(obj, StreamObject):
+        _write_dict(obj, buf, refs, skip=SKIPPED_KEYS)
+    elif isinstance(obj, ArrayObject):
+        buf.write(b"[")
+        for item in obj:
+            buf.write(b" ")
+            _write(item, buf, refs)
+        buf.write(b" ]")
+    else:
+        obj.write_to_stream(buf, None)
+
+def _write_dict(
+    obj: DictionaryObject,
+    buf: BytesIO,
+    refs: List[Tuple[int, int, int]],
+    skip: Tuple[str, ...],
+    close: bool = True
+) -> None:
+    buf.write(b"<<\n")
+    for key, value in obj.items():
+        if key in skip:
+            continue
+        NameObject(key).write_to_stream(buf, None)
+        buf.write(b" ")
+        _write(value, buf, refs)
+        buf.write(b"\n")
+    if close:
+        buf.write(b">>")
+
+def _content_ids(page: DictionaryObject) -> Set[int]:
+    """
+    Object ids of the page's content streams.
+    """
+    contents = page.raw_get("/Contents") if "/Contents" in page else None
+    if isinstance(contents, IndirectObject) and isinstance(contents.get_object(), ArrayObject):
+        contents = contents.get_object()
+    if isinstance(contents, ArrayObject):
+        return {item.idnum for item in contents if isinstance(item, IndirectObject)}
+    return {contents.idnum} if isinstance(contents, IndirectObject) else set()
+
+def _is_page(obj: Optional[PdfObject]) -> bool:
+    return (
+        isinstance(obj, DictionaryObject)
+        and not isinstance(obj, StreamObject)
+        and obj.get("/Type") == "/Page"
+    )
+
+def _stream_key(stream: StreamObject) -> Tuple[bytes, str]:
+    """
+    Identity of a stream's stored bytes and dictionary.
+    """
+    entries = sorted((name, repr(value)) for name, value in stream.items() if name != "/Length")
+    return hashlib.sha256(stream._data).digest(), repr(entries)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Background split jobs: submit returns at once, the split runs from a
+bounded queue, and the finished ZIP is kept on disk for download.
+
+Each job's state lives in <JOBS_DIR>/<id>.json so that any Uvicorn
+worker can report status, serve the result or request cancellation;
+only the worker that accepted the job runs it.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import tempfile
+from contextlib import aclosing
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional
+
+from fastapi import UploadFile
+
+from .utils import PdfSource, spool_upload, check_compression
+from .split import SplitProgress, split_source
+from .executor import wait_for_slot, estimate_memory
+from .exceptions import NotFoundError, NotReadyError, OverloadedError
+
+# Job queue configuration (overridable with environment variables)
+JOBS_DIR         = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "split-pdf-jobs"))
+JOBS_WORKERS     = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_QUEUE_DEPTH = int(os.getenv("JOBS_QUEUE_DEPTH", "32"))
+JOBS_RETENTION   = float(os.getenv("JOBS_RETENTION", "3600"))
+
+ACTIVE_STATES   = ("queued", "running")
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+@dataclass
+class JobStatus:
+    """
+    Persisted state and progress of one job.
+    """
+    id:              str
+    state:           str = "queued"
+    created:         float = field(default_factory=time.time)
+    finished:        Optional[float] = None
+    fragments_total: int = 0
+    fragments_done:  int = 0
+    pages_total:     int = 0
+    pages_done:      int = 0
+    from_cache:      bool = False
+    result_size:     Optional[int] = None
+    error:           Optional[str] = None
+
+@dataclass
+class _Job:
+    status:      JobStatus
+    source:      PdfSource
+    csv_source:  PdfSource
+    compression: str
+
+_queue:   Optional["asyncio.Queue[_Job]"] = None
+_runners: List["asyncio.Task[None]"] = []
+_tasks:   Dict[str, "asyncio.Task[None]"] = {}
+
+def start_job_runners() -> None:
+    """
+    Create the job queue and its runner tasks on the running loop.
+    """
+    global _queue
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _queue = asyncio.Queue(maxsize=JOBS_QUEUE_DEPTH)
+    for _ in range(JOBS_WORKERS):
+        _runners.append(asyncio.create_task(_run_jobs(_queue)))
+
+async def stop_job_runners() -> None:
+    """
+    Cancel the runners; running jobs end as cancelled and queued ones
+    are marked as failed.
+    """
+    for task in _runners:
+        task.cancel()
+    await asyncio.gather(*_runners, return_exceptions=True)
+    _runners.clear()
+
+    while _queue is not None and not _queue.empty():
+        job = _queue.get_nowait()
+        job.source.close()
+        job.csv_source.close()
+        job.status.state    = "failed"
+        job.status.error    = "Server shut down before the job ran"
+        job.status.finished = time.time()
+        _save(job.status)
+
+async def submit_split_job(
+    pdf_file: UploadFile,
+    csv_file: UploadFile,
+    compression: Optional[str] = None
+) -> JobStatus:
+    """
+    Spool both uploads and queue a split job.
+    Raises OverloadedError if the queue is full.
+    """
+    if _queue is None:
+        raise RuntimeError("Job runners are not started")
+    compression = check_compression(compression)
+    if _queue.full():
+        raise OverloadedError("Job queue is full, please retry later")
+
+    await asyncio.to_thread(_purge_expired)
+    source     = await spool_upload(pdf_file)
+    csv_source = PdfSource()
+    try:
+        csv_source = await spool_upload(csv_file, suffix=".csv")
+        job = _Job(JobStatus(id=uuid.uuid4().hex), source, csv_source, compression)
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        source.close()
+        csv_source.close()
+        raise OverloadedError("Job queue is full, please retry later")
+    except BaseException:
+        source.close()
+        csv_source.close()
+        raise
+    _save(job.status)
+    return job.status
+
+def get_job(job_id: str) -> JobStatus:
+    """
+    Load a job's status. Raises NotFoundError for unknown jobs.
+    """
+    try:
+        with open(_path(job_id, ".json"), encoding="utf-8") as fh:
+            status = JobStatus(**json.load(fh))
+    except (FileNotFoundError, ValueError, TypeError):
+        raise NotFoundError("Job not found")
+    if status.state in ACTIVE_STATES and os.path.exists(_path(job_id, ".cancel")):
+        status.state = "cancelling"
+    return status
+
+def job_result_path(job_id: str) -> str:
+    """
+    Path of a finished job's ZIP. Raises NotFoundError for unknown
+    jobs and NotReadyError if the job has not completed.
+    """
+    status = get_job(job_id)
+    if status.state != "done":
+        raise NotReadyError(f"Job is {status.state}, no result available")
+    return _path(job_id, ".zip")
+
+def cancel_job(job_id: str) -> JobStatus:
+    """
+    Cancel a queued or running job, or delete a finished one's files.
+    """
+    status = get_job(job_id)
+    if status.state in ACTIVE_STATES + ("cancelling",):
+        # The owning worker notices the marker between fragments.
+        open(_path(job_id, ".cancel"), "w").close()
+        task = _tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        status.state = "cancelling"
+        return status
+
+    for suffix in (".zip", ".json", ".cancel"):
+        _unlink(_path(job_id, suffix))
+    return status
+
+async def _run_jobs(queue: "asyncio.Queue[_Job]") -> None:
+    """
+    Runner loop: take jobs off the queue one at a time.
+    """
+    while True:
+        job = await queue.get()
+        task = asyncio.create_task(_run_job(job))
+        _tasks[job.status.id] = task
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+        finally:
+            _tasks.pop(job.status.id, None)
+            queue.task_done()
+
+async def _run_job(job: _Job) -> None:
+    """
+    Split one job's source into its result file, saving progress after
+    every fragment and honouring cancellation requests.
+    """
+    status      = job.status
+    progress    = SplitProgress()
+    cancel_path = _path(status.id, ".cancel")
+    zip_path    = _path(status.id, ".zip")
+    tmp_path    = zip_path + ".partial"
+    try:
+        if os.path.exists(cancel_path):
+            raise asyncio.CancelledError
+        slot = await wait_for_slot(estimate_memory(job.source.size))
+        status.state = "running"
+        _save(status)
+
+        stream = await split_source(
+            job.source, job.csv_source, job.compression, slot=slot, progress=progress
+        )
+        async with aclosing(stream):
+            with open(tmp_path, "wb") as out:
+                async for chunk in stream:
+                    await asyncio.to_thread(out.write, chunk)
+                    if os.path.exists(cancel_path):
+                        raise asyncio.CancelledError
+                    _update(status, progress)
+                    _save(status)
+        os.replace(tmp_path, zip_path)
+
+        status.state       = "done"
+        status.result_size = os.path.getsize(zip_path)
+        _update(status, progress)
+    except asyncio.CancelledError:
+        status.state = "cancelled"
+    except Exception as exc:
+        status.state = "failed"
+        status.error = str(exc) or type(exc).__name__
+    finally:
+        job.source.close()
+        job.csv_source.close()
+        _unlink(tmp_path)
+        _unlink(cancel_path)
+        status.finished = time.time()
+        _save(status)
+
+def _update(status: JobStatus, progress: SplitProgress) -> None:
+    status.fragments_total = progress.fragments_total
+    status.fragments_done  = progress.fragments_done
+    status.pages_total     = progress.pages_total
+    status.pages_done      = progress.pages_done
+    status.from_cache      = progress.from_cache
+
+def _save(status: JobStatus) -> None:
+    """
+    Write the status file atomically.
+    """
+    path = _path(status.id, ".json")
+    tmp  = path + ".partial"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(asdict(status), fh)
+    os.replace(tmp, path)
+
+def _purge_expired() -> None:
+    """
+    Remove jobs whose state has not changed for JOBS_RETENTION seconds.
+    """
+    now = time.time()
+    with os.scandir(JOBS_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".json") and now - entry.stat().st_mtime > JOBS_RETENTION:
+                job_id = entry.name[:-len(".json")]
+                for suffix in (".zip", ".json", ".cancel"):
+                    _unlink(_path(job_id, suffix))
+
+def _path(job_id: str, suffix: str) -> str:
+    if not _JOB_ID.match(job_id or ""):
+        raise NotFoundError("Job not found")
+    return os.path.join(JOBS_DIR, job_id + suffix)
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Counters, histograms and per-stage timings for the /metrics endpoint
+(Prometheus text format) and the Server-Timing header. Values are kept
+per Uvicorn worker process.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+class _Metric:
+    """
+    A named metric with one series per combination of label values.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._lock  = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _series(self, key: LabelValues, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._series(key)} {_number(value)}" for key, value in values]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: a count per bucket (and +Inf), then the sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._series(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._series(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._series(key)} {cumulative}")
+        return lines
+
+class Sampled(_Metric):
+    """
+    Gauge or counter kept elsewhere, read from a callback at scrape time.
+    """
+    def __init__(self, name: str, help: str, read: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, help)
+        self.read = read
+        self.kind = kind
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_number(self.read())}"]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+_registry: List[_Metric] = []
+
+def register(metric: _Metric) -> _Metric:
+    _registry.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text format.
+    """
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = register(Histogram(
+    "split_pdf_stage_duration_seconds",
+    "Time spent in each processing stage, per call",
+    labels=("stage",)
+))
+REQUESTS = register(Counter(
+    "split_pdf_http_requests_total",
+    "HTTP requests by route and status",
+    labels=("method", "route", "status")
+))
+REQUEST_SECONDS = register(Histogram(
+    "split_pdf_http_request_duration_seconds",
+    "Time from request start until the response body was sent",
+    labels=("method", "route")
+))
+BYTES_IN = register(Counter(
+    "split_pdf_http_request_bytes_total",
+    "Request body bytes received",
+    labels=("route",)
+))
+BYTES_OUT = register(Counter(
+    "split_pdf_http_response_bytes_total",
+    "Response body bytes sent",
+    labels=("route",)
+))
+PAGES = register(Counter(
+    "split_pdf_pages_total",
+    "Pages written into fragments"
+))
+FRAGMENTS = register(Counter(
+    "split_pdf_fragments_total",
+    "Fragments written"
+))
+ADMISSION_REJECTED = register(Counter(
+    "split_pdf_admission_rejected_total",
+    "Requests refused with 429 or 503, by reason: queue, memory or heavy_jobs",
+    labels=("reason",)
+))
+
+# Stage durations of the current request, for its Server-Timing header
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+def begin_request() -> Dict[str, float]:
+    """
+    Start collecting the current request's stage durations.
+    """
+    stages: Dict[str, float] = {}
+    _request_stages.set(stages)
+    return stages
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """
+    Time the enclosed block as one call of the named stage, adding it to
+    the stage histogram and to the current request's breakdown.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+def record_fragment(pages: int) -> None:
+    FRAGMENTS.inc()
+    PAGES.inc(pages)
+
+def server_timing(stages: Dict[str, float], total: float) -> str:
+    """
+    Server-Timing header value: each stage's summed duration so far,
+    then the total, in milliseconds.
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Page lookups that resolve only the page tree nodes leading to the pages
+asked for. PdfReader.pages flattens the whole tree on first use, which
+for a large book costs more than extracting a few pages from it; here
+the page count comes from the root's /Count and page n is found by
+descending the /Kids whose /Count spans it. As in the flattening,
+inheritable attributes (/Resources, /MediaBox, ...) of the nodes above
+a page are copied into it. Trees whose /Count entries do not add up
+fall back to PdfReader.pages.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+INHERITED_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# A page's object id and its dictionary
+Page = Tuple[int, DictionaryObject]
+
+class PageTree:
+    """
+    Page count and pages by 0-based index of one reader.
+    """
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self._pages: Dict[int, Page] = {}
+        self._flat:  Optional[List[DictionaryObject]] = None
+        self._leaf_nodes: Dict[int, bool] = {}
+        self.root  = _resolve(reader.trailer.get("/Root"))
+        self.root  = _resolve(self.root.get("/Pages")) if isinstance(self.root, DictionaryObject) else None
+        count      = _count(self.root) if isinstance(self.root, DictionaryObject) else None
+        if count is None:
+            self._flatten()
+        else:
+            self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def page(self, index: int) -> Page:
+        """
+        Object id and dictionary of the page at a 0-based index. Pages
+        held directly in /Kids, without an object of their own, get a
+        negative id.
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(f"Page index {index} out of range ({self.count} pages)")
+        found = self._pages.get(index)
+        if found is None:
+            if self._flat is None:
+                found = self._descend(index)
+                if found is None:
+                    self._flatten()
+            if self._flat is not None:
+                found = _page_id(index, self._flat[index]), self._flat[index]
+            self._pages[index] = found
+        return found
+
+    def page_ids(self) -> List[int]:
+        """
+        Ids of every page in order, in one walk over the tree.
+        """
+        if self._flat is None:
+            ids: List[int] = []
+            if self._walk(self.root, ids, set()) and len(ids) == self.count:
+                return ids
+            self._flatten()
+        return [_page_id(idx, page) for idx, page in enumerate(self._flat)]
+
+    def _descend(self, index: int) -> Optional[Page]:
+        """
+        Follow the /Count of each node's kids down to the page at index,
+        or return None if the tree does not add up.
+        """
+        node, target = self.root, index
+        inherited: Dict[str, object] = {}
+        for _ in range(self.count + 1):
+            inherited.update((key, node.raw_get(key)) for key in INHERITED_KEYS if key in node)
+            kids = _resolve(node.get("/Kids"))
+            if not isinstance(kids, ArrayObject):
+                return None
+
+            # Kids that are all pages: go straight to the one wanted.
+            if index < len(kids) and self._all_leaves(node, kids):
+                return self._leaf(kids[index], _resolve(kids[index]), target, inherited)
+
+            for ref in kids:
+                kid = _resolve(ref)
+                if not isinstance(kid, DictionaryObject):
+                    return None
+                if "/Kids" not in kid:
+                    if index == 0:
+                        return self._leaf(ref, kid, target, inherited)
+                    index -= 1
+                    continue
+                count = _count(kid)
+                if count is None:
+                    return None
+                if index < count:
+                    node = kid
+                    break
+                index -= count
+            else:
+                return None
+        return None
+
+    def _all_leaves(self, node: DictionaryObject, kids: ArrayObject) -> bool:
+        """
+        Whether every kid of node is a page rather than a /Pages node,
+        checked once per node. A matching /Count is not enough: a kid
+        with /Count 0 makes up for one with /Count 2.
+        """
+        found = self._leaf_nodes.get(id(node))
+        if found is None:
+            found = self._leaf_nodes[id(node)] = _count(node) == len(kids) and all(
+                isinstance(kid, DictionaryObject) and "/Kids" not in kid
+                for kid in map(_resolve, kids)
+            )
+        return found
+
+    def _leaf(self, ref: object, page: DictionaryObject, index: int, inherited: Dict[str, object]) -> Page:
+        for key, value in inherited.items():
+            if key not in page:
+                page[NameObject(key)] = value
+        page_id = ref.idnum if isinstance(ref, IndirectObject) else -(index + 1)
+        return page_id, page
+
+    def _walk(self, node: DictionaryObject, ids: List[int], seen: set) -> bool:
+        if id(node) in seen or len(ids) > self.count:
+            return False
+        seen.add(id(node))
+        kids = _resolve(node.get("/Kids"))
+        if not isinstance(kids, ArrayObject):
+            return False
+        for ref in kids:
+            kid = _resolve(ref)
+            if not isinstance(kid, DictionaryObject):
+                return False
+            if "/Kids" in kid:
+                if not self._walk(kid, ids, seen):
+                    return False
+            else:
+                ids.append(ref.idnum if isinstance(ref, IndirectObject) else -(len(ids) + 1))
+        return True
+
+    def _flatten(self) -> None:
+        self._flat  = list(self.reader.pages)
+        self.count  = len(self._flat)
+        self._pages = {}
+
+def _page_id(idx: int, page: DictionaryObject) -> int:
+    ref = page.indirect_reference
+    return ref.idnum if ref is not None else -(idx + 1)
+
+def _resolve(obj: object) -> object:
+    return obj.get_object() if isinstance(obj, IndirectObject) else obj
+
+def _count(node: DictionaryObject) -> Optional[int]:
+    try:
+        count = int(_resolve(node.get("/Count")))
+    except (TypeError, ValueError):
+        return None
+    return count if count >= 0 else None
@@ -1,28 +1,38 @@
 #!/usr/bin/env python3
 """
 Split a PDF into multiple parts based on CSV instructions,
-then ZIP and return the resulting fragments.
+then stream the resulting fragments as a ZIP.
 """
 
 import csv
-from io import StringIO, BytesIO
+import asyncio
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+from collections import deque
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import AsyncIterator, Container, Deque, Dict, Iterator, List, Optional, Set, TextIO, Tuple
 
 from fastapi import UploadFile
-from PyPDF2 import PdfReader, PdfWriter
 
 from .utils import (
-    load_pdf_reader,
-    read_bytes,
-    package_zip,
+    PdfSource,
+    spool_upload,
+    stream_zip,
+    check_compression,
     sanitize_filename,
     CSV_ENCODING,
-    CSV_ERRORS
+    CSV_ERRORS,
+    CSV_BATCH_ROWS
 )
-from .exceptions import ValidationError
+from .bookmarks import bookmark_ranges
+from .fragments import COMPRESS_CONTENT_STREAMS
+from .engine import get_engine, page_count, PDF_ENGINE
+from .exceptions import NotFoundError, ValidationError
+from .executor import JobSlot, acquire_slot, estimate_memory, JOB_PARALLELISM
+from .cache import result_key, open_cached, store_result
+from .metrics import timed_stage, record_fragment
 
-@dataclass
+@dataclass(slots=True)
 class SplitInstruction:
     """
     One row from CSV: whether to split, title, and page range.
@@ -32,91 +42,414 @@ class SplitInstruction:
     start_page:   int
     end_page:     int
 
-async def split_pdf_by_csv(pdf_file: UploadFile, csv_file: UploadFile) -> bytes:
+@dataclass
+class PageRangePdf:
+    """
+    One page range as a PDF: its strong ETag, and its bytes unless the
+    client already holds that ETag.
+    """
+    etag: str
+    data: Optional[bytes] = None
+
+@dataclass
+class SplitProgress:
+    """
+    Running totals of a split, updated as each fragment is written.
+    """
+    fragments_total: int = 0
+    fragments_done:  int = 0
+    pages_total:     int = 0
+    pages_done:      int = 0
+    from_cache:      bool = False
+
+async def split_pdf_by_csv(
+    pdf_file: UploadFile,
+    csv_file: UploadFile,
+    compression: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Spool the PDF upload and split it according to the CSV.
+    """
+    compression = check_compression(compression)
+    source      = await spool_upload(pdf_file)
+    return await split_source_by_csv(source, csv_file, compression)
+
+async def split_source_by_csv(
+    source: PdfSource,
+    csv_file: UploadFile,
+    compression: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Spool the CSV, then split the source by it.
+    Takes ownership of the source and closes it once served.
+    """
+    try:
+        csv_source = await spool_upload(csv_file, suffix=".csv")
+    except BaseException:
+        source.close()
+        raise
+    return await split_source(source, csv_source, compression)
+
+async def split_source(
+    source: PdfSource,
+    csv_source: PdfSource,
+    compression: Optional[str] = None,
+    slot: Optional[JobSlot] = None,
+    progress: Optional[SplitProgress] = None
+) -> AsyncIterator[bytes]:
+    """
+    Serve a cached result if there is one. Otherwise return the
+    fragments of split_fragments as a ZIP stream, updating progress
+    if given.
+    Takes ownership of both sources and the slot.
+    """
+    try:
+        compression = check_compression(compression)
+        key         = result_key(
+            "split", source.digest, csv_source.digest, compression, COMPRESS_CONTENT_STREAMS, PDF_ENGINE
+        )
+        cached      = _serve_cached(key, (source, csv_source), slot, progress)
+        if cached is not None:
+            return cached
+    except BaseException:
+        source.close()
+        csv_source.close()
+        if slot is not None:
+            slot.release()
+        raise
+
+    fragments = await split_fragments(source, csv_source, slot, progress)
+    return store_result(key, stream_zip(fragments, compression))
+
+async def split_fragments(
+    source: PdfSource,
+    csv_source: PdfSource,
+    slot: Optional[JobSlot] = None,
+    progress: Optional[SplitProgress] = None
+) -> AsyncIterator[Tuple[str, bytes]]:
     """
-    1. Load PDF reader.
-    2. Parse CSV into SplitInstruction list.
-    3. Validate each instruction.
-    4. Extract requested fragments.
-    5. ZIP fragments and return bytes.
+    Parse the first batch of CSV rows off the event loop, so that early
+    errors are raised here, and return the filename-->bytes fragments,
+    parsing the rest of the CSV as they are written.
+    Runs under the given job slot, or admits a new one.
+    Takes ownership of both sources and the slot.
     """
-    reader       = await load_pdf_reader(pdf_file)
-    instructions = await _parse_csv(csv_file)
+    try:
+        slot = slot or acquire_slot(estimate_memory(source.size))
+        slot.on_release(source.close)
+        slot.on_release(csv_source.close)
+        with timed_stage("parse"):
+            total_pages = await slot.run(page_count, source)
+        slot.charge(estimate_memory(source.size, total_pages))
+
+        # The generator closes its file once exhausted, failed or dropped.
+        rows  = _iter_plan(csv_source, total_pages)
+        with timed_stage("csv"):
+            batch = await asyncio.to_thread(_take, rows, CSV_BATCH_ROWS)
+    except BaseException:
+        source.close()
+        csv_source.close()
+        if slot is not None:
+            slot.release()
+        raise
+
+    return _iter_fragments(slot, source, _stream_plan(rows, batch, progress), progress)
+
+async def split_pdf_by_bookmarks(
+    pdf_file: UploadFile,
+    levels: Optional[str],
+    compression: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Spool the PDF upload and split it at its bookmarks of the given levels.
+    """
+    selected    = parse_levels(levels)
+    compression = check_compression(compression)
+    source      = await spool_upload(pdf_file)
+    return await split_source_by_bookmarks(source, selected, compression)
+
+async def split_source_by_bookmarks(
+    source: PdfSource,
+    levels: Set[int],
+    compression: Optional[str] = None,
+    slot: Optional[JobSlot] = None,
+    progress: Optional[SplitProgress] = None
+) -> AsyncIterator[bytes]:
+    """
+    Serve a cached result if there is one. Otherwise read the outline
+    off the event loop and return a ZIP stream of one fragment per
+    bookmark at the given levels, in outline order.
+    Takes ownership of the source and the slot.
+    """
+    try:
+        compression = check_compression(compression)
+        key         = result_key(
+            "split-bookmarks", source.digest, sorted(levels), compression, COMPRESS_CONTENT_STREAMS,
+            PDF_ENGINE
+        )
+        cached      = _serve_cached(key, (source,), slot, progress)
+        if cached is not None:
+            return cached
+
+        slot = slot or acquire_slot(estimate_memory(source.size))
+        slot.on_release(source.close)
+        with timed_stage("outline"):
+            ranges = await slot.run(bookmark_ranges, source, levels)
+        if not ranges:
+            raise NotFoundError(f"No bookmarks at level {', '.join(map(str, sorted(levels)))}")
+        slot.charge(estimate_memory(source.size, max(bm.end_page for bm in ranges)))
+    except BaseException:
+        source.close()
+        if slot is not None:
+            slot.release()
+        raise
+
+    used: Set[str] = set()
+    plan = [
+        (_unique_filename(bm.title, bm.start_page, bm.end_page, used),
+         SplitInstruction(True, bm.title, bm.start_page, bm.end_page))
+        for bm in ranges
+    ]
+
+    fragments = _iter_fragments(slot, source, _stream_plan(iter(()), plan, progress), progress)
+    return store_result(key, stream_zip(fragments, compression))
+
+async def split_pdf_range(
+    pdf_file: UploadFile,
+    start_page: int,
+    end_page: int,
+    cached_etags: Container[str] = ()
+) -> PageRangePdf:
+    """
+    Spool the PDF upload and write one page range of it as a PDF.
+    """
+    source = await spool_upload(pdf_file)
+    return await extract_source_range(source, start_page, end_page, cached_etags)
+
+async def extract_source_range(
+    source: PdfSource,
+    start_page: int,
+    end_page: int,
+    cached_etags: Container[str] = ()
+) -> PageRangePdf:
+    """
+    Write the 1-based inclusive page range as a PDF of its own, without
+    a CSV or ZIP. If its ETag is among cached_etags (or "*" is), the
+    PDF is not even opened.
+    Takes ownership of the source and closes it.
+    """
+    try:
+        result = PageRangePdf(range_etag(source.digest, start_page, end_page))
+        if result.etag in cached_etags or "*" in cached_etags:
+            return result
 
-    _validate(instructions, total_pages=len(reader.pages))
-    fragments = _extract_fragments(reader, instructions)
+        with acquire_slot(estimate_memory(source.size)) as slot:
+            with timed_stage("parse"):
+                total_pages = await slot.run(page_count, source)
+            _check_range(start_page, end_page, total_pages)
+            slot.charge(estimate_memory(source.size, total_pages))
+            result.data = await _write_fragment(slot, source, SplitInstruction(True, "", start_page, end_page))
+    finally:
+        source.close()
 
-    return package_zip(fragments)
+    record_fragment(end_page - start_page + 1)
+    return result
 
-async def _parse_csv(csv_file: UploadFile) -> List[SplitInstruction]:
+def range_etag(digest: str, start_page: int, end_page: int) -> str:
     """
-    Decode and parse CSV into SplitInstruction list.
+    Strong ETag of a page range's PDF: the same source, range and
+    writer settings always give the same bytes.
+    """
+    return '"%s"' % result_key("range", digest, start_page, end_page, COMPRESS_CONTENT_STREAMS, PDF_ENGINE)
+
+def parse_levels(levels: Optional[str]) -> Set[int]:
+    """
+    Parse a comma-separated list of bookmark depth levels, e.g. "1" or
+    "0,2", numbered as in bookmarks_level_<n>.csv.
+    """
+    parts = [part.strip() for part in (levels or "").split(",") if part.strip()]
+    if not parts:
+        raise ValidationError("No bookmark level given")
+    try:
+        selected = {int(part) for part in parts}
+    except ValueError:
+        raise ValidationError(f"Invalid bookmark levels: {levels!r}")
+    if min(selected) < 0:
+        raise ValidationError(f"Invalid bookmark levels: {levels!r}")
+    return selected
+
+def _serve_cached(
+    key: str,
+    sources: Tuple[PdfSource, ...],
+    slot: Optional[JobSlot],
+    progress: Optional[SplitProgress]
+) -> Optional[AsyncIterator[bytes]]:
+    """
+    The cached result for key, if any, releasing what the split would
+    have used.
+    """
+    cached = open_cached(key)
+    if cached is not None:
+        for source in sources:
+            source.close()
+        if slot is not None:
+            slot.release()
+        if progress is not None:
+            progress.from_cache = True
+    return cached
+
+def _open_csv(csv_source: PdfSource) -> TextIO:
+    """
+    Text stream over the CSV that decodes it incrementally.
+    """
+    raw = open(csv_source.path, "rb") if csv_source.path else BytesIO(csv_source.data or b"")
+    return TextIOWrapper(raw, encoding=CSV_ENCODING, errors=CSV_ERRORS, newline="")
+
+def _iter_plan(csv_source: PdfSource, total_pages: int) -> Iterator[Tuple[str, SplitInstruction]]:
+    """
+    Parse the CSV row by row, yielding each instruction flagged to
+    split, validated and named, in output order. Rows whose names give
+    a filename already used are suffixed _2, _3, ...
     Expected headers: split (y/n), name, from, to.
     """
-    raw  = await read_bytes(csv_file)
-    text = raw.decode(CSV_ENCODING, errors=CSV_ERRORS)
+    used: Set[str] = set()
+    with _open_csv(csv_source) as text:
+        rows = csv.DictReader(text)
+        while True:
+            try:
+                row = next(rows, None)
+            except csv.Error as e:
+                raise ValidationError(f"Invalid CSV format in row {rows.line_num}: {e}")
+            if row is None:
+                return
+
+            inst = _parse_row(row, rows.line_num)
+            if not inst.should_split:
+                continue
+            _validate(inst, total_pages, rows.line_num)
+
+            yield _unique_filename(inst.title, inst.start_page, inst.end_page, used), inst
+
+def _unique_filename(title: str, start: int, end: int, used: Set[str]) -> str:
+    """
+    Fragment filename for a title, suffixed with the first free number
+    from 2 on if another fragment already has it.
+    """
+    stem  = sanitize_filename(title, start, end)
+    fname = stem + ".pdf"
+    n     = 1
+    while fname in used:
+        n    += 1
+        fname = f"{stem}_{n}.pdf"
+    used.add(fname)
+    return fname
+
+def _parse_row(row: Dict[str, str], line: int) -> SplitInstruction:
+    """
+    Turn one CSV row into a SplitInstruction.
+    """
+    flag = (row.get("split") or "").strip().lower() == "y"
+    name = (row.get("name") or "").strip()
+    frm  = (row.get("from") or "").strip()
+    to   = (row.get("to") or "").strip()
+
     try:
-        rows = csv.DictReader(StringIO(text))
-    except Exception as e:
-        raise ValidationError(f"Invalid CSV format: {e}")
+        start = int(frm)
+        end   = int(to)
+    except ValueError:
+        raise ValidationError(f"Non-integer page range in row {line}: {row}")
+
+    return SplitInstruction(flag, name, start, end)
+
+def _validate(inst: SplitInstruction, total_pages: int, line: int) -> None:
+    """
+    Ensure a flagged instruction has a valid page range
+    within [1, total_pages] and start ≤ end.
+    """
+    _check_range(inst.start_page, inst.end_page, total_pages, f" in row {line}")
+
+def _check_range(start_page: int, end_page: int, total_pages: int, where: str = "") -> None:
+    if start_page < 1:
+        raise ValidationError(f"Start page {start_page} is below 1{where}")
+    if end_page < start_page:
+        raise ValidationError(f"End page {end_page} is before start page {start_page}{where}")
+    if end_page > total_pages:
+        raise ValidationError(f"End page {end_page} exceeds total page count ({total_pages}){where}")
+
+def _take(rows: Iterator[Tuple[str, SplitInstruction]], count: int) -> List[Tuple[str, SplitInstruction]]:
+    """
+    Parse up to count more plan entries.
+    """
+    return list(islice(rows, count))
 
-    instructions: List[SplitInstruction] = []
-    for row in rows:
-        flag = row.get("split", "").strip().lower() == "y"
-        name = row.get("name", "").strip()
-        frm  = row.get("from", "").strip()
-        to   = row.get("to", "").strip()
+async def _stream_plan(
+    rows: Iterator[Tuple[str, SplitInstruction]],
+    batch: List[Tuple[str, SplitInstruction]],
+    progress: Optional[SplitProgress] = None
+) -> AsyncIterator[Tuple[str, SplitInstruction]]:
+    """
+    Yield the parsed batch, then parse the rest of the CSV in further
+    batches off the event loop, adding each batch to the progress totals.
+    """
+    while batch:
+        if progress is not None:
+            progress.fragments_total += len(batch)
+            progress.pages_total     += sum(i.end_page - i.start_page + 1 for _, i in batch)
+        for item in batch:
+            yield item
+        with timed_stage("csv"):
+            batch = await asyncio.to_thread(_take, rows, CSV_BATCH_ROWS)
 
+async def _iter_fragments(
+    slot: JobSlot,
+    source: PdfSource,
+    plan: AsyncIterator[Tuple[str, SplitInstruction]],
+    progress: Optional[SplitProgress] = None
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    Write up to JOB_PARALLELISM fragments at once on the worker pool,
+    each worker opening the shared source itself, and yield
+    filename-->bytes in plan order. Releases the job slot when done
+    or abandoned.
+    """
+    pending: Deque[Tuple[str, SplitInstruction, "asyncio.Future[bytes]"]] = deque()
+    with slot:
         try:
-            start = int(frm)
-            end   = int(to)
-        except ValueError:
-            raise ValidationError(f"Non-integer page range in row: {row}")
+            async for fname, inst in plan:
+                pending.append((fname, inst, asyncio.ensure_future(_write_fragment(slot, source, inst))))
+                if len(pending) >= JOB_PARALLELISM:
+                    yield await _next_fragment(pending, progress)
+            while pending:
+                yield await _next_fragment(pending, progress)
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            await plan.aclose()
 
-        instructions.append(SplitInstruction(flag, name, start, end))
+async def _next_fragment(
+    pending: Deque[Tuple[str, SplitInstruction, "asyncio.Future[bytes]"]],
+    progress: Optional[SplitProgress]
+) -> Tuple[str, bytes]:
+    """
+    Wait for the oldest pending fragment and record it in progress.
+    """
+    fname, inst, future = pending.popleft()
+    data = await future
+    record_fragment(inst.end_page - inst.start_page + 1)
+    if progress is not None:
+        progress.fragments_done += 1
+        progress.pages_done     += inst.end_page - inst.start_page + 1
+    return fname, data
 
-    return instructions
+async def _write_fragment(slot: JobSlot, source: PdfSource, inst: SplitInstruction) -> bytes:
+    """
+    Write one fragment on the pool, timed from submission to completion.
+    """
+    with timed_stage("fragment"):
+        return await slot.run(_extract_fragment, source, inst.start_page, inst.end_page)
 
-def _validate(instructions: List[SplitInstruction], total_pages: int) -> None:
+def _extract_fragment(source: PdfSource, start_page: int, end_page: int) -> bytes:
     """
-    Ensure each flagged instruction has a valid page range
-    within [1, total_pages] and start ≤ end.
+    Extract the 1-based inclusive page range into a new PDF in memory.
     """
-    for inst in instructions:
-        if not inst.should_split:
-            continue
-        if inst.start_page < 1:
-            raise ValidationError(f"Start page {inst.start_page} is below 1")
-        if inst.end_page < inst.start_page:
-            raise ValidationError(
-                f"End page {inst.end_page} is before start page {inst.start_page}"
-            )
-        if inst.end_page > total_pages:
-            raise ValidationError(
-                f"End page {inst.end_page} exceeds total page count ({total_pages})"
-            )
-
-def _extract_fragments(
-    reader: PdfReader,
-    instructions: List[SplitInstruction]
-) -> Dict[str, bytes]:
-    """
-    For each instruction flagged to split, extract the page range,
-    write a new PDF in memory, and collect filename-->bytes.
-    """
-    fragments: Dict[str, bytes] = {}
-
-    for inst in instructions:
-        if not inst.should_split:
-            continue
-
-        writer = PdfWriter()
-        for idx in range(inst.start_page - 1, inst.end_page):
-            writer.add_page(reader.pages[idx])
-
-        fname = sanitize_filename(inst.title, inst.start_page, inst.end_page) + ".pdf"
-        buffer = BytesIO()
-        writer.write(buffer)
-        fragments[fname] = buffer.getvalue()
-
-    return fragments
+    return get_engine().write_range(source, start_page, end_page)
@@ -1,22 +1,34 @@
 #!/usr/bin/env python3
 """
-Common service utilities: PDF loading, byte reading, ZIP packaging,
-filename sanitization, and shared constants.
+Common service utilities: upload spooling, PDF loading,
+ZIP streaming, filename sanitization, and shared constants.
 """
 
+import os
+import mmap
+import time
+import zlib
+import asyncio
+import hashlib
 import zipfile
+import tempfile
+import threading
 from io import BytesIO
-from typing import Dict
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
 
 from fastapi import UploadFile
 from PyPDF2 import PdfReader
 from PyPDF2.errors import PdfReadError
 
 from .exceptions import ValidationError
+from .metrics import timed_stage
 
 # CSV decoding parameters
-CSV_ENCODING = "utf-8"
-CSV_ERRORS   = "ignore"
+CSV_ENCODING   = "utf-8"
+CSV_ERRORS     = "ignore"
+CSV_BATCH_ROWS = int(os.getenv("CSV_BATCH_ROWS", "1000"))
 
 # Filename sanitization
 FILENAME_WHITELIST         = set("abcdefghijklmnopqrstuvwxyz"
@@ -26,36 +38,273 @@ FILENAME_WHITELIST         = set("abcdefghijklmnopqrstuvwxyz"
 FALLBACK_FILENAME_PATTERN  = "part_{start}_{end}"
 FALLBACK_PAGE              = 1
 
-async def read_bytes(file: UploadFile) -> bytes:
+# Upload spooling: larger uploads go to a temporary file instead of memory
+SPOOL_MEMORY_LIMIT = int(os.getenv("SPOOL_MEMORY_LIMIT", str(1024 * 1024)))
+SPOOL_DIR          = os.getenv("SPOOL_DIR") or None
+READ_CHUNK_SIZE    = 1024 * 1024
+
+# Largest upload accepted per multipart field, in bytes (0: no limit):
+# PDFs, CSVs, and the plain form fields
+MAX_PDF_BYTES   = int(os.getenv("MAX_PDF_BYTES", str(512 * 1024 * 1024)))
+MAX_CSV_BYTES   = int(os.getenv("MAX_CSV_BYTES", str(16 * 1024 * 1024)))
+MAX_FIELD_BYTES = int(os.getenv("MAX_FIELD_BYTES", str(64 * 1024)))
+
+# Parsed readers of stored documents kept per worker thread
+READER_CACHE_SIZE = int(os.getenv("READER_CACHE_SIZE", "4"))
+READER_CACHE_TTL  = float(os.getenv("READER_CACHE_TTL", "600"))
+
+# ZIP entry compression: "auto" samples each entry, "store" never
+# compresses, "deflate" always does
+ZIP_COMPRESSION       = os.getenv("ZIP_COMPRESSION", "auto")
+COMPRESSION_POLICIES  = ("auto", "store", "deflate")
+COMPRESSION_SAMPLES   = 4
+COMPRESSION_SAMPLE    = 16 * 1024
+COMPRESSION_MIN_GAIN  = 0.10
+
+class PdfSource:
+    """
+    A PDF held in memory, in a temporary spool file, or in the document
+    store, with the SHA-256 of its bytes. Pickles cheaply: file-backed
+    sources travel as a path.
+    """
+    def __init__(
+        self,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None,
+        digest: str = "",
+        temporary: bool = False
+    ):
+        self.data      = data
+        self.path      = path
+        self.digest    = digest
+        self.temporary = temporary
+
+    @property
+    def size(self) -> int:
+        """
+        Size of the PDF in bytes.
+        """
+        if self.path is None:
+            return len(self.data or b"")
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def open_stream(self) -> BinaryIO:
+        """
+        Return a seekable, read-only stream over the PDF bytes.
+        Spooled files are memory-mapped rather than read in.
+        """
+        if self.path is None:
+            return BytesIO(self.data or b"")
+        with open(self.path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                return BytesIO(b"")
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        """
+        Remove the spooled file, if any. Stored documents are kept.
+        """
+        if self.temporary and self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+def upload_limit(field: str) -> int:
+    """
+    Largest upload accepted for a multipart field, 0 for no limit.
     """
-    Read all bytes from an UploadFile.
+    if field in ("pdf", "pdfs"):
+        return MAX_PDF_BYTES
+    if field in ("csvfile", "csvfiles"):
+        return MAX_CSV_BYTES
+    return MAX_FIELD_BYTES
+
+async def spool_upload(file: UploadFile, suffix: str = ".pdf") -> PdfSource:
+    """
+    Copy an UploadFile in fixed-size chunks, hashing it as it goes and
+    keeping it in memory only if it fits within SPOOL_MEMORY_LIMIT.
     """
-    return await file.read()
+    with timed_stage("upload"):
+        head   = await file.read(SPOOL_MEMORY_LIMIT + 1)
+        digest = hashlib.sha256(head)
+        if len(head) <= SPOOL_MEMORY_LIMIT:
+            return PdfSource(data=head, digest=digest.hexdigest())
+
+        fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=SPOOL_DIR)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(head)
+                del head
+                while chunk := await file.read(READ_CHUNK_SIZE):
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return PdfSource(path=path, digest=digest.hexdigest(), temporary=True)
 
-async def load_pdf_reader(pdf_file: UploadFile) -> PdfReader:
+_readers = threading.local()
+
+def load_pdf_reader(source: PdfSource) -> PdfReader:
+    """
+    Open a PdfSource with a PdfReader. Raises ValidationError if invalid.
+    Readers are reused by digest from a small per-thread LRU, since a
+    PdfReader must not be shared between threads, so that the fragments
+    of one upload or document do not each parse its xref again. Readers
+    of spooled uploads are dropped once the spool file is gone, i.e.
+    once the request that uploaded it is over.
     """
-    Load PDF bytes into a PdfReader. Raises ValidationError if invalid.
+    if not source.digest:
+        return _open_pdf_reader(source)
+
+    cache: "OrderedDict[str, Tuple[float, Optional[str], PdfReader]]" = getattr(_readers, "cache", None)
+    if cache is None:
+        cache = _readers.cache = OrderedDict()
+
+    now = time.monotonic()
+    for key in [
+        k for k, (opened, spool, _) in cache.items()
+        if now - opened > READER_CACHE_TTL or (spool is not None and not os.path.exists(spool))
+    ]:
+        del cache[key]
+
+    if source.digest in cache:
+        cache.move_to_end(source.digest)
+        return cache[source.digest][2]
+
+    reader = _open_pdf_reader(source)
+    cache[source.digest] = (now, source.path if source.temporary else None, reader)
+    while len(cache) > READER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return reader
+
+def _open_pdf_reader(source: PdfSource) -> PdfReader:
+    """
+    Open a fresh PdfReader over the source and reject encrypted files.
     """
-    data = await read_bytes(pdf_file)
     try:
-        reader = PdfReader(BytesIO(data))
+        reader = PdfReader(source.open_stream())
     except PdfReadError as exc:
         raise ValidationError(f"Invalid PDF file: {exc}")
     if getattr(reader, "is_encrypted", False):
         raise ValidationError(f"PDF is password-protected")
     return reader
 
-def package_zip(files: Dict[str, bytes]) -> bytes:
+class _ZipSink:
+    """
+    Write-only, unseekable buffer. Because it cannot seek, zipfile
+    writes each entry's sizes and CRC in a trailing data descriptor,
+    so finished entries can be sent on without rewriting headers.
+    """
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def iter_entries(files: Dict[str, bytes]) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    Adapt a mapping of filename-->bytes to the stream_zip entry source.
+    """
+    for filename, content in files.items():
+        yield filename, content
+
+def check_compression(policy: Optional[str]) -> str:
+    """
+    Resolve a requested compression policy, defaulting to ZIP_COMPRESSION.
+    Raises ValidationError on unknown values.
+    """
+    policy = (policy or ZIP_COMPRESSION).strip().lower()
+    if policy not in COMPRESSION_POLICIES:
+        raise ValidationError(
+            f"Unknown compression {policy!r}; expected one of {', '.join(COMPRESSION_POLICIES)}"
+        )
+    return policy
+
+def choose_compression(content: bytes, policy: str) -> int:
+    """
+    Pick the zipfile compression method for one entry. Under "auto",
+    deflate a few evenly spaced samples at the fastest level and only
+    compress the entry if they shrink by at least COMPRESSION_MIN_GAIN.
+    """
+    if policy == "store":
+        return zipfile.ZIP_STORED
+    if policy == "deflate":
+        return zipfile.ZIP_DEFLATED
+
+    window = COMPRESSION_SAMPLES * COMPRESSION_SAMPLE
+    if len(content) <= window:
+        sample = content
+    else:
+        step   = (len(content) - COMPRESSION_SAMPLE) // (COMPRESSION_SAMPLES - 1)
+        sample = b"".join(
+            content[i * step:i * step + COMPRESSION_SAMPLE]
+            for i in range(COMPRESSION_SAMPLES)
+        )
+    if not sample:
+        return zipfile.ZIP_STORED
+
+    packed = len(zlib.compress(sample, 1))
+    if packed <= len(sample) * (1 - COMPRESSION_MIN_GAIN):
+        return zipfile.ZIP_DEFLATED
+    return zipfile.ZIP_STORED
+
+async def stream_zip(
+    entries: AsyncIterator[Tuple[str, bytes]],
+    compression: str = "deflate"
+) -> AsyncIterator[bytes]:
+    """
+    Package (filename, bytes) entries into a ZIP archive, yielding the
+    archive bytes entry by entry as each one arrives. Each entry's
+    method is chosen by the given compression policy. Closing the
+    stream closes the entries.
+    """
+    sink = _ZipSink()
+    async with aclosing(entries):
+        with zipfile.ZipFile(sink, mode="w") as archive:
+            async for filename, content in entries:
+                with timed_stage("zip"):
+                    method = choose_compression(content, compression)
+                    if method == zipfile.ZIP_STORED:
+                        archive.writestr(filename, content, compress_type=method)
+                    else:
+                        # Compression is CPU-bound; keep it off the event loop.
+                        write = asyncio.ensure_future(asyncio.to_thread(
+                            archive.writestr, filename, content, compress_type=method
+                        ))
+                        try:
+                            await asyncio.shield(write)
+                        except asyncio.CancelledError:
+                            # The thread cannot be stopped: let it finish
+                            # the entry before the archive is closed.
+                            await _wait_through_cancellation(write)
+                            raise
+                yield sink.drain()
+    yield sink.drain()
+
+async def _wait_through_cancellation(future: "asyncio.Future") -> None:
     """
-    Package a mapping of filename-->bytes into a ZIP archive.
-    Returns the raw ZIP bytes.
+    Wait until future is done, even if cancelled again meanwhile.
     """
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
-        for filename, content in files.items():
-            archive.writestr(filename, content)
-    buffer.seek(0)
-    return buffer.read()
+    while not future.done():
+        try:
+            await asyncio.wait({future})
+        except asyncio.CancelledError:
+            pass
 
 def sanitize_filename(title: str, start: int, end: int) -> str:
     """
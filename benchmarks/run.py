@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+In-process benchmark suite for the split and bookmarks services.
+
+Every case runs in a fresh interpreter, so its peak RSS is its own, on
+synthetic PDFs shaped by the command-line parameters. Results are
+written as JSON; with --baseline, cases slower or larger than a
+previous run by more than --tolerance fail the run.
+
+    python benchmarks/run.py --pages 400 --fragments 40 --output results.json
+    python benchmarks/run.py --baseline results.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import platform
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR   = os.path.join(os.path.dirname(BENCH_DIR), "app")
+
+CASES = [
+    "bookmarks_zip",
+    "split_pdf_by_csv",
+    "stream_zip",
+    "write_fragment",
+    "http_bookmarks",
+    "http_split",
+]
+
+# Compared against the baseline: (result path, label)
+REGRESSION_METRICS = [
+    (("latency_ms", "p50"), "p50 latency"),
+    (("peak_rss_mb",),      "peak RSS"),
+]
+
+# One iteration: returns the pages and output bytes it produced
+Operation = Callable[[int], Awaitable[Tuple[int, int]]]
+
+def main() -> int:
+    args = parse_args()
+    if args.run_case:
+        json.dump(run_case(args.run_case, args), sys.stdout)
+        return 0
+
+    cases = args.cases.split(",") if args.cases else CASES
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        sys.exit(f"Unknown case(s): {', '.join(sorted(unknown))} (choose from {', '.join(CASES)})")
+
+    results = []
+    for case in cases:
+        result = run_case_process(case, args)
+        results.append(result)
+        print(summary_line(result), file=sys.stderr)
+
+    report = {"meta": run_metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the split and bookmarks services in-process.")
+    parser.add_argument("--cases", help=f"Comma-separated cases (default: all of {', '.join(CASES)})")
+    parser.add_argument("--pages", type=int, default=200, help="Pages per synthetic PDF")
+    parser.add_argument("--depth", type=int, default=3, help="Outline depth")
+    parser.add_argument("--width", type=int, default=5, help="Outline children per entry")
+    parser.add_argument("--fragments", type=int, default=20, help="Fragments per split CSV")
+    parser.add_argument("--resource-kb", type=int, default=16, help="Embedded font size per page, in KiB")
+    parser.add_argument("--shared-resources", action="store_true", help="One font shared by all pages")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed iterations per case")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="EXECUTOR_KIND for the cases (thread keeps all work in the measured process)")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative increase over the baseline (default 0.25)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.pages < 1 or args.fragments < 1 or args.iterations < 1:
+        parser.error("--pages, --fragments and --iterations must be at least 1")
+    return args
+
+def case_params(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "pages":            args.pages,
+        "depth":            args.depth,
+        "width":            args.width,
+        "fragments":        args.fragments,
+        "resource_kb":      args.resource_kb,
+        "shared_resources": args.shared_resources,
+        "executor":         args.executor,
+    }
+
+def run_metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "timestamp":  datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python":     platform.python_version(),
+        "platform":   platform.platform(),
+        "cpu_count":  os.cpu_count(),
+        "iterations": args.iterations,
+    }
+
+def run_case_process(case: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run one case in a child interpreter with the cache off and the
+    chosen executor, and return its result.
+    """
+    env = dict(os.environ)
+    env.update({"EXECUTOR_KIND": args.executor, "RESULT_CACHE_MAX_BYTES": "0"})
+    argv = [sys.executable, os.path.abspath(__file__), "--run-case", case]
+    for name, value in case_params(args).items():
+        if isinstance(value, bool):
+            argv += [f"--{name.replace('_', '-')}"] if value else []
+        else:
+            argv += [f"--{name.replace('_', '-')}", str(value)]
+    argv += ["--iterations", str(args.iterations)]
+    proc = subprocess.run(argv, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"Case {case} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout)
+
+# Measurement
+
+def run_case(case: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Build the case's inputs, then time each iteration and record the
+    process's peak RSS.
+    """
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    from services import executor
+
+    setup      = globals()[f"setup_{case}"]
+    operation, extra = setup(args)
+    start_rss  = peak_rss_mb()
+
+    async def timed() -> Tuple[List[float], int, int]:
+        latencies, pages, output = [], 0, 0
+        await operation(-1)                 # warm up imports and pools
+        for i in range(args.iterations):
+            t0 = time.perf_counter()
+            done_pages, done_bytes = await operation(i)
+            latencies.append(time.perf_counter() - t0)
+            pages  += done_pages
+            output += done_bytes
+        return latencies, pages, output
+
+    latencies, pages, output = asyncio.run(timed())
+    worker_rss = max(map(worker_peak_rss_mb, getattr(executor._pool, "_processes", None) or {}), default=0.0)
+    executor.shutdown_executor()
+
+    total = sum(latencies)
+    return {
+        "case":        case,
+        "params":      case_params(args),
+        "iterations":  len(latencies),
+        "latency_ms":  {
+            "mean": round(total / len(latencies) * 1000, 3),
+            "p50":  round(percentile(latencies, 50) * 1000, 3),
+            "p90":  round(percentile(latencies, 90) * 1000, 3),
+            "p99":  round(percentile(latencies, 99) * 1000, 3),
+            "max":  round(max(latencies) * 1000, 3),
+        },
+        "throughput":  {
+            "ops_per_s":       round(len(latencies) / total, 3),
+            "pages_per_s":     round(pages / total, 1),
+            "output_mb_per_s": round(output / total / 2**20, 3),
+        },
+        "start_rss_mb":       start_rss,
+        "peak_rss_mb":        peak_rss_mb(),
+        "peak_worker_rss_mb": worker_rss,
+        **extra,
+    }
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+def worker_peak_rss_mb(pid: int) -> float:
+    """
+    Peak RSS of a process pool worker (Linux only, else 0).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+async def drain(stream) -> int:
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+    return size
+
+def upload(data: bytes, filename: str):
+    import io
+    from fastapi import UploadFile
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+# Cases: each setup_<case> returns its operation and the extra result
+# fields, which the operation may fill in as it runs
+
+def setup_bookmarks_zip(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    from services.bookmarks import build_bookmarks_zip
+    from synthetic import synthetic_pdf, outline_size, with_nonce
+
+    pdf = synthetic_pdf(args.pages, args.depth, args.width, args.resource_kb, args.shared_resources)
+
+    async def operation(i: int) -> Tuple[int, int]:
+        stream = await build_bookmarks_zip(upload(with_nonce(pdf, i), "bench.pdf"))
+        return args.pages, await drain(stream)
+
+    return operation, {"input_bytes": len(pdf), "outline_entries": outline_size(args.depth, args.width)}
+
+def setup_split_pdf_by_csv(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    from services.split import split_pdf_by_csv
+    from synthetic import synthetic_pdf, split_csv, with_nonce
+
+    pdf = synthetic_pdf(args.pages, 0, 0, args.resource_kb, args.shared_resources)
+    csv = split_csv(args.pages, args.fragments)
+
+    async def operation(i: int) -> Tuple[int, int]:
+        stream = await split_pdf_by_csv(upload(with_nonce(pdf, i), "bench.pdf"), upload(csv, "bench.csv"))
+        return args.pages, await drain(stream)
+
+    return operation, {"input_bytes": len(pdf)}
+
+def setup_stream_zip(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    """
+    Packaging only: the fragments are written up front.
+    """
+    from services.fragments import write_fragment
+    from services.utils import PdfSource, stream_zip, iter_entries
+    from synthetic import synthetic_pdf, even_ranges
+
+    pdf    = synthetic_pdf(args.pages, 0, 0, args.resource_kb, args.shared_resources)
+    source = PdfSource(data=pdf)
+    files  = {
+        f"part_{n}.pdf": write_fragment(source, start + 1, end)
+        for n, (start, end) in enumerate(even_ranges(0, args.pages, args.fragments))
+    }
+
+    async def operation(i: int) -> Tuple[int, int]:
+        return args.pages, await drain(stream_zip(iter_entries(files), compression="auto"))
+
+    return operation, {"input_bytes": sum(map(len, files.values()))}
+
+def setup_write_fragment(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    """
+    write_fragment against the plain add_page writer for one page, a
+    tenth and all of the document, from a cold fragment cache. An
+    iteration writes every range both ways; the sizes and median write
+    times per range are added to the result.
+    """
+    import io
+    import hashlib
+    import PyPDF2
+    from services.fragments import write_fragment
+    from services.utils import PdfSource
+    from synthetic import synthetic_pdf, with_nonce
+
+    pdf    = synthetic_pdf(args.pages, 0, 0, args.resource_kb, args.shared_resources)
+    ranges = sorted({(1, 1), (1, max(1, args.pages // 10)), (1, args.pages)})
+    timings: Dict[Tuple[int, int], Dict[str, List[float]]] = {
+        r: {"ms": [], "plain_ms": []} for r in ranges
+    }
+    extra: Dict[str, Any] = {"input_bytes": len(pdf), "ranges": []}
+
+    def plain_fragment(data: bytes, start: int, end: int) -> bytes:
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        writer = PyPDF2.PdfWriter()
+        for idx in range(start - 1, end):
+            writer.add_page(reader.pages[idx])
+        buf = io.BytesIO()
+        writer.write(buf)
+        return buf.getvalue()
+
+    async def operation(i: int) -> Tuple[int, int]:
+        pages, output = 0, 0
+        for start, end in ranges:
+            data = with_nonce(pdf, i * len(ranges) + start + end)
+            t0   = time.perf_counter()
+            new  = write_fragment(PdfSource(data=data, digest=hashlib.sha256(data).hexdigest()), start, end)
+            t1   = time.perf_counter()
+            old  = plain_fragment(data, start, end)
+            t2   = time.perf_counter()
+            pages  += end - start + 1
+            output += len(new)
+            if i < 0:
+                continue
+            timing = timings[(start, end)]
+            timing["ms"].append((t1 - t0) * 1000)
+            timing["plain_ms"].append((t2 - t1) * 1000)
+            if len(extra["ranges"]) < len(ranges):
+                extra["ranges"].append({"pages": f"{start}-{end}", "bytes": len(new), "plain_bytes": len(old)})
+        if i >= 0:
+            for entry, (start, end) in zip(extra["ranges"], ranges):
+                entry["ms_p50"]       = round(percentile(timings[(start, end)]["ms"], 50), 3)
+                entry["plain_ms_p50"] = round(percentile(timings[(start, end)]["plain_ms"], 50), 3)
+        return pages, output
+
+    return operation, extra
+
+def setup_http_bookmarks(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    from synthetic import synthetic_pdf, with_nonce
+
+    pdf = synthetic_pdf(args.pages, args.depth, args.width, args.resource_kb, args.shared_resources)
+    app = load_app()
+
+    async def operation(i: int) -> Tuple[int, int]:
+        fields = [("pdf", "bench.pdf", with_nonce(pdf, i), "application/pdf")]
+        return args.pages, await asgi_post(app, "/api/bookmarks/zip", fields)
+
+    return operation, {"input_bytes": len(pdf)}
+
+def setup_http_split(args: argparse.Namespace) -> Tuple[Operation, Dict[str, Any]]:
+    from synthetic import synthetic_pdf, split_csv, with_nonce
+
+    pdf = synthetic_pdf(args.pages, 0, 0, args.resource_kb, args.shared_resources)
+    csv = split_csv(args.pages, args.fragments)
+    app = load_app()
+
+    async def operation(i: int) -> Tuple[int, int]:
+        fields = [
+            ("pdf", "bench.pdf", with_nonce(pdf, i), "application/pdf"),
+            ("csvfile", "bench.csv", csv, "text/csv"),
+        ]
+        return args.pages, await asgi_post(app, "/api/split", fields)
+
+    return operation, {"input_bytes": len(pdf)}
+
+# HTTP layer, driven over ASGI without a server or client library
+
+def load_app():
+    from main import app
+    return app
+
+async def asgi_post(app, path: str, fields: List[Tuple[str, Optional[str], bytes, str]]) -> int:
+    """
+    POST a multipart form to the app and return the response body size;
+    raises unless the status is 200.
+    """
+    boundary = "benchmark-boundary-7d1f"
+    parts    = []
+    for name, filename, content, content_type in fields:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+            f"Content-Type: {content_type}\r\n\r\n".encode() + content + b"\r\n"
+        )
+    body  = b"".join(parts) + f"--{boundary}--\r\n".encode()
+    scope = {
+        "type":         "http",
+        "asgi":         {"version": "3.0"},
+        "http_version": "1.1",
+        "method":       "POST",
+        "scheme":       "http",
+        "path":         path,
+        "raw_path":     path.encode(),
+        "root_path":    "",
+        "query_string": b"",
+        "headers":      [
+            (b"host", b"benchmark"),
+            (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client":       ("127.0.0.1", 0),
+        "server":       ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    received = False
+    status   = 0
+    size     = 0
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    if status != 200:
+        raise RuntimeError(f"POST {path} answered {status}")
+    return size
+
+# Reporting
+
+def summary_line(result: Dict[str, Any]) -> str:
+    latency    = result["latency_ms"]
+    throughput = result["throughput"]
+    return (
+        f"{result['case']:<18} p50 {latency['p50']:>9.1f} ms  p90 {latency['p90']:>9.1f} ms  "
+        f"{throughput['pages_per_s']:>9.1f} pages/s  peak RSS {result['peak_rss_mb']:>7.1f} MB"
+    )
+
+def find_regressions(baseline: Dict[str, Any], report: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Cases run with the same parameters whose compared metrics grew by
+    more than the tolerance.
+    """
+    earlier = {(r["case"], json.dumps(r["params"], sort_keys=True)): r for r in baseline["results"]}
+    found   = []
+    for result in report["results"]:
+        before = earlier.get((result["case"], json.dumps(result["params"], sort_keys=True)))
+        if before is None:
+            continue
+        for path, label in REGRESSION_METRICS:
+            old, new = before, result
+            for key in path:
+                old, new = old[key], new[key]
+            if old > 0 and new > old * (1 + tolerance):
+                found.append(f"{result['case']}: {label} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return found
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Synthetic benchmark inputs: PDFs of a given page count, outline shape
+and resource weight, and split CSVs with a given number of fragments.
+Generated from a fixed seed, so every run measures the same bytes.
+"""
+
+import io
+import random
+from typing import List, Optional, Tuple
+
+import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+SEED = 20240601
+
+def synthetic_pdf(
+    pages: int,
+    depth: int = 0,
+    width: int = 0,
+    resource_kb: int = 0,
+    shared_resources: bool = False
+) -> bytes:
+    """
+    PDF of `pages` pages with text content. Every page uses an embedded
+    font of `resource_kb` KiB, either one shared by all pages or a
+    different one per page. The outline is `depth` levels deep with
+    `width` children per entry, spread evenly over the pages.
+    """
+    rng       = random.Random(SEED)
+    writer    = PyPDF2.PdfWriter()
+    font_ref  = None
+    for i in range(pages):
+        writer.add_blank_page(width=612, height=792)
+        page = writer.pages[-1]
+
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 10 Tf 72 720 Td (Page %d) Tj ET\n" % (i + 1) * 40)
+        page[NameObject("/Contents")] = writer._add_object(content)
+
+        if resource_kb and (font_ref is None or not shared_resources):
+            font_file = DecodedStreamObject()
+            font_file.set_data(rng.randbytes(resource_kb * 1024))
+            descriptor = DictionaryObject({NameObject("/FontFile"): writer._add_object(font_file)})
+            font_ref = writer._add_object(DictionaryObject({
+                NameObject("/Type"):           NameObject("/Font"),
+                NameObject("/Subtype"):        NameObject("/Type1"),
+                NameObject("/BaseFont"):       NameObject("/Helvetica"),
+                NameObject("/FontDescriptor"): writer._add_object(descriptor),
+            }))
+        if font_ref is not None:
+            page[NameObject("/Resources")] = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})
+            })
+
+    _add_outline(writer, None, "", 0, pages, depth, width)
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+def _add_outline(
+    writer: PyPDF2.PdfWriter,
+    parent: Optional[object],
+    prefix: str,
+    first: int,
+    last: int,
+    depth: int,
+    width: int
+) -> None:
+    """
+    Add `width` entries splitting pages [first, last) evenly, each with
+    its own subtree `depth - 1` levels deep.
+    """
+    if depth <= 0 or width <= 0:
+        return
+    for i, (start, end) in enumerate(even_ranges(first, last, width)):
+        title = f"{prefix}{i + 1}"
+        item  = writer.add_outline_item(f"Section {title}", page_number=start, parent=parent)
+        _add_outline(writer, item, f"{title}.", start, end, depth - 1, width)
+
+def even_ranges(first: int, last: int, count: int) -> List[Tuple[int, int]]:
+    """
+    Split [first, last) into `count` contiguous, near-equal, non-empty
+    ranges (fewer if there are not enough pages).
+    """
+    count = max(1, min(count, last - first))
+    step  = (last - first) / count
+    return [(first + int(i * step), first + int((i + 1) * step)) for i in range(count)]
+
+def outline_size(depth: int, width: int) -> int:
+    """
+    Number of outline entries of a full tree (before page limits).
+    """
+    return sum(width ** level for level in range(1, depth + 1))
+
+def split_csv(pages: int, fragments: int) -> bytes:
+    """
+    CSV selecting `fragments` consecutive ranges that cover the document.
+    """
+    rows = ["split,name,from,to"]
+    for i, (start, end) in enumerate(even_ranges(0, pages, fragments)):
+        rows.append(f"y,Part {i + 1},{start + 1},{end}")
+    return ("\n".join(rows) + "\n").encode("utf-8")
+
+def with_nonce(data: bytes, nonce: int) -> bytes:
+    """
+    The same PDF with a trailing comment, so its digest differs and
+    result, reader and fragment caches start cold.
+    """
+    return data + b"%% nonce %d\n" % nonce
@@ -5,6 +5,8 @@
 # Upload a PDF (and optional CSV) to the split-pdf service running
 # in a container. Creates or reuses a per-PDF output directory
 # (named after the PDF, minus “.pdf”) and writes the resulting ZIP there.
+# The PDF is stored on the server as a document keyed by its SHA-256,
+# so exporting bookmarks and then splitting uploads it only once.
 
 set -euo pipefail
 IFS=$'\n\t'
@@ -18,13 +20,37 @@ readonly CONTAINER_PORT=8080
 usage() {
   cat <<EOF
 Usage: $SCRIPT_NAME <pdf-file> [<bookmarks-csv>]
+       $SCRIPT_NAME --level <n[,m...]> <pdf-file>
+       $SCRIPT_NAME --batch [--jobs <n>] [--level <n[,m...]> | --csv <name>]
+                   <pdf-file|directory>...
 
   <pdf-file>       Path to the PDF to process.
   <bookmarks-csv>  (Optional) CSV with headers: split,name,from,to.
-                   If provided, calls POST /api/split;
-                   otherwise POST /api/bookmarks/zip.
+                   If provided, calls POST /api/documents/<id>/split;
+                   otherwise GET /api/documents/<id>/bookmarks.
+  --level <n>      Split at the PDF's own bookmarks of depth level(s) n
+                   (as in bookmarks_level_<n>.csv), without a CSV:
+                   calls POST /api/documents/<id>/split/bookmarks.
 
-Output is saved to ./<pdf-basename>/bookmarks.zip or pdfs.zip
+  --batch          Process many PDFs (and the PDFs directly inside the
+                   given directories) in one run: <jobs> requests at a
+                   time over kept-alive connections. Without --level or
+                   --csv it exports bookmarks.
+  --jobs <n>       Parallel uploads and requests in batch mode (default 4).
+  --csv <name>     In batch mode, split each PDF by the CSV <name> in its
+                   output directory, e.g. bookmarks_level_1.csv.
+
+The PDF is uploaded to POST /api/documents only if the server does not
+already hold it.
+
+Output is saved to ./<pdf-basename>/bookmarks.zip or pdfs.zip. In batch
+mode, <zip>.sha256 and <zip>.source record the ZIP's checksum and the
+PDF and request it came from: a later batch run skips PDFs whose ZIP
+still matches both. Each PDF's outcome (done, skipped or failed) is
+written to ./split-pdf-bookmarks-summary.tsv.
+
+Set SPLIT_PDF_URL (e.g. http://localhost:8080) to use that server
+instead of looking up the container.
 
 Examples:
   # Export bookmarks
@@ -32,6 +58,12 @@ Examples:
 
   # Split based on CSV ranges
   $SCRIPT_NAME book.pdf ranges.csv
+
+  # Split into chapters and their sections in one go
+  $SCRIPT_NAME --level 0,1 book.pdf
+
+  # Split a whole library at level 0, 8 books at a time
+  $SCRIPT_NAME --batch --jobs 8 --level 0 ~/books
 EOF
 }
 
@@ -59,11 +91,310 @@ get_host_port() {
   echo "$port"
 }
 
+get_base_url() {
+  if [[ -n "${SPLIT_PDF_URL-}" ]]; then
+    echo "${SPLIT_PDF_URL%/}"
+    return
+  fi
+  local cid; cid=$(find_container)
+  local host_port; host_port=$(get_host_port "$cid")
+  echo "http://localhost:${host_port}"
+}
+
+ensure_document() {
+  local base_url=$1 pdf_file=$2 doc_id=$3
+  if curl -sf -o /dev/null "${base_url}/api/documents/${doc_id}"; then
+    log "Server already holds this PDF (document ${doc_id:0:12}...)"
+    return
+  fi
+  log "Uploading PDF..."
+  curl -sS --fail --show-error --progress-bar -X POST \
+       -F "pdf=@${pdf_file}" \
+       "${base_url}/api/documents" -o /dev/null
+}
+
+# Batch Mode
+
+# Quote a value for a curl config file.
+curl_quote() {
+  local value=${1//\\/\\\\}
+  printf '"%s"' "${value//\"/\\\"}"
+}
+
+# Append one transfer to a curl config file: URL, output file and any
+# further config lines. Each transfer reports
+# "<curl exit code>\t<HTTP status>\t<output file>".
+add_transfer() {
+  local config=$1 url=$2 output=$3
+  shift 3
+  {
+    [[ -s "$config" ]] && echo "next"
+    echo "url = $(curl_quote "$url")"
+    echo "output = $(curl_quote "$output")"
+    echo 'write-out = "%{exitcode}\t%{http_code}\t%{filename_effective}\n"'
+    echo "no-progress-meter"
+    local line
+    for line in "$@"; do echo "$line"; done
+  } >> "$config"
+}
+
+# Run the transfers of a curl config file, <jobs> at a time over
+# kept-alive connections.
+run_transfers() {
+  local config=$1 jobs=$2
+  [[ -s "$config" ]] || return 0
+  curl --parallel --parallel-max "$jobs" --no-progress-meter -K "$config" || true
+}
+
+# The server's error message from a failed response body, else the
+# HTTP status or curl exit code.
+failure_detail() {
+  local body=$1 exit_code=$2 http_code=$3 detail=""
+  if [[ "$exit_code" != 0 ]]; then
+    echo "curl exit code ${exit_code}"
+    return
+  fi
+  [[ -f "$body" ]] && detail=$(head -c 2000 "$body" | sed -n 's/.*"detail": *"\([^"]*\)".*/\1/p')
+  echo "${detail:-HTTP ${http_code}}"
+}
+
+# True if the ZIP exists, still has its recorded checksum and was made
+# from the given PDF and request.
+is_current() {
+  local out_file=$1 source=$2
+  [[ -f "$out_file" && -f "${out_file}.sha256" && -f "${out_file}.source" ]] || return 1
+  [[ "$(< "${out_file}.source")" == "$source" ]] || return 1
+  (cd "$(dirname "$out_file")" && sha256sum --status -c "$(basename "$out_file").sha256")
+}
+
+batch_main() {
+  # 1) Arg parsing
+  local jobs=4 levels="" csv_name=""
+  while [[ $# -gt 0 ]]; do
+    case "$1" in
+      --jobs|--level|--csv)
+        [[ $# -ge 2 ]] || { usage; exit 1; }
+        case "$1" in
+          --jobs)  jobs=$2 ;;
+          --level) levels=$2 ;;
+          --csv)   csv_name=$2 ;;
+        esac
+        shift 2
+        ;;
+      -*) usage; exit 1 ;;
+      *)  break ;;
+    esac
+  done
+  [[ $# -ge 1 ]] || { usage; exit 1; }
+  [[ "$jobs" =~ ^[1-9][0-9]*$ ]] || error "Invalid --jobs: '$jobs' (expected a positive number)"
+  if [[ -n "$levels" ]]; then
+    [[ "$levels" =~ ^[0-9]+(,[0-9]+)*$ ]] || error "Invalid --level: '$levels' (expected e.g. 0 or 0,1)"
+    [[ -z "$csv_name" ]] || error "Use either --level or --csv, not both"
+  fi
+
+  # 2) Collect & hash PDFs
+  local pdfs=() found=() arg pdf
+  local -A listed=()
+  for arg in "$@"; do
+    if [[ -d "$arg" ]]; then
+      found=()
+      while IFS= read -r -d '' pdf; do
+        found+=("$pdf")
+      done < <(find "$arg" -maxdepth 1 -type f -iname '*.pdf' -print0 | sort -z)
+    elif [[ -r "$arg" ]]; then
+      found=("$arg")
+    else
+      error "Cannot read PDF or directory: $arg"
+    fi
+    for pdf in ${found[@]+"${found[@]}"}; do
+      [[ -z "${listed[$pdf]-}" ]] || continue
+      listed[$pdf]=1
+      pdfs+=("$pdf")
+    done
+  done
+  [[ ${#pdfs[@]} -gt 0 ]] || error "No PDFs found"
+  log "Hashing ${#pdfs[@]} PDFs..."
+
+  local -A sha_of=()
+  local line
+  while IFS= read -r line; do
+    sha_of[${line#*  }]=${line%%  *}
+  done < <(printf '%s\0' "${pdfs[@]}" | xargs -0 -n 16 -P "$jobs" sha256sum)
+
+  # 3) Plan each PDF's request; skip outputs that are still current
+  local -a doc_ids=() out_files=() sources=() forms=() states=() details=()
+  local -A dir_owner=()
+  local i out_dir out_file csv_file request
+  for i in "${!pdfs[@]}"; do
+    pdf=${pdfs[$i]}
+    out_dir=$(basename "$pdf" .pdf)
+    doc_ids[$i]=${sha_of[$pdf]-}
+    out_files[$i]=""
+    sources[$i]=""
+    forms[$i]=""
+    states[$i]="pending"
+    details[$i]=""
+
+    if [[ -n "${dir_owner[$out_dir]-}" ]]; then
+      states[$i]="failed"
+      details[$i]="Output directory '${out_dir}' already used by ${dir_owner[$out_dir]}"
+      continue
+    fi
+    dir_owner[$out_dir]=$pdf
+    if [[ -z "${doc_ids[$i]}" ]]; then
+      states[$i]="failed"
+      details[$i]="Cannot read PDF: ${pdf}"
+      continue
+    fi
+
+    if [[ -n "$levels" ]]; then
+      out_file="${out_dir}/pdfs.zip"
+      request="levels=${levels}"
+      forms[$i]="form = $(curl_quote "levels=${levels}")"
+    elif [[ -n "$csv_name" ]]; then
+      out_file="${out_dir}/pdfs.zip"
+      csv_file="${out_dir}/${csv_name}"
+      if [[ ! -r "$csv_file" ]]; then
+        states[$i]="failed"
+        details[$i]="Cannot read CSV: ${csv_file}"
+        continue
+      fi
+      request="csv=$(sha256sum "$csv_file" | awk '{print $1}')"
+      forms[$i]="form = $(curl_quote "csvfile=@\"${csv_file}\"")"
+    else
+      out_file="${out_dir}/bookmarks.zip"
+      request="bookmarks"
+    fi
+    out_files[$i]=$out_file
+    sources[$i]="${doc_ids[$i]} ${request}"
+
+    if is_current "$out_file" "${sources[$i]}"; then
+      states[$i]="skipped"
+      details[$i]="Output matches its checksum"
+    else
+      mkdir -p "$out_dir"
+    fi
+  done
+
+  local pending=0
+  for i in "${!pdfs[@]}"; do
+    [[ "${states[$i]}" == "pending" ]] && pending=$((pending + 1))
+  done
+  log "${pending} of ${#pdfs[@]} PDFs to process"
+
+  if [[ $pending -gt 0 ]]; then
+    log "Locating running container..."
+    local base_url; base_url=$(get_base_url)
+    log "Server --> ${base_url}"
+    local tmp; tmp=$(mktemp -d)
+    trap "rm -rf -- '${tmp}'" EXIT
+
+    # 4) Upload the documents the server does not hold yet
+    local -A first_pdf=() held=() upload_error=()
+    local exit_code http_code output doc_id
+    : > "$tmp/lookups"
+    : > "$tmp/uploads"
+    for i in "${!pdfs[@]}"; do
+      doc_id=${doc_ids[$i]}
+      [[ "${states[$i]}" == "pending" && -z "${first_pdf[$doc_id]-}" ]] || continue
+      first_pdf[$doc_id]=${pdfs[$i]}
+      add_transfer "$tmp/lookups" "${base_url}/api/documents/${doc_id}" "$tmp/lookup.${doc_id}"
+    done
+    while IFS=$'\t' read -r exit_code http_code output; do
+      [[ "$exit_code" == 0 && "$http_code" == 200 ]] && held[${output##*.}]=1
+    done < <(run_transfers "$tmp/lookups" "$jobs")
+
+    for doc_id in "${!first_pdf[@]}"; do
+      [[ -z "${held[$doc_id]-}" ]] || continue
+      add_transfer "$tmp/uploads" "${base_url}/api/documents" "$tmp/upload.${doc_id}" \
+        "form = $(curl_quote "pdf=@\"${first_pdf[$doc_id]}\"")"
+    done
+    if [[ -s "$tmp/uploads" ]]; then
+      log "Uploading $(grep -c '^url' "$tmp/uploads") PDFs the server does not hold..."
+    fi
+    while IFS=$'\t' read -r exit_code http_code output; do
+      if [[ "$exit_code" != 0 || "$http_code" != 201 ]]; then
+        upload_error[${output##*.}]="Upload failed: $(failure_detail "$output" "$exit_code" "$http_code")"
+      fi
+    done < <(run_transfers "$tmp/uploads" "$jobs")
+
+    # 5) Request the ZIPs, writing each to <zip>.part until it is complete
+    local -A part_index=()
+    local endpoint
+    : > "$tmp/requests"
+    for i in "${!pdfs[@]}"; do
+      [[ "${states[$i]}" == "pending" ]] || continue
+      doc_id=${doc_ids[$i]}
+      if [[ -n "${upload_error[$doc_id]-}" ]]; then
+        states[$i]="failed"
+        details[$i]=${upload_error[$doc_id]}
+        continue
+      fi
+      if [[ -n "$levels" ]]; then
+        endpoint="/api/documents/${doc_id}/split/bookmarks"
+      elif [[ -n "$csv_name" ]]; then
+        endpoint="/api/documents/${doc_id}/split"
+      else
+        endpoint="/api/documents/${doc_id}/bookmarks"
+      fi
+      part_index[${out_files[$i]}.part]=$i
+      add_transfer "$tmp/requests" "${base_url}${endpoint}" "${out_files[$i]}.part" \
+        ${forms[$i]:+"${forms[$i]}"}
+    done
+    log "Sending requests, ${jobs} at a time..."
+    while IFS=$'\t' read -r exit_code http_code output; do
+      i=${part_index[$output]}
+      out_file=${out_files[$i]}
+      if [[ "$exit_code" == 0 && "$http_code" == 200 ]]; then
+        mv "$output" "$out_file"
+        (cd "$(dirname "$out_file")" && sha256sum "$(basename "$out_file")") > "${out_file}.sha256"
+        echo "${sources[$i]}" > "${out_file}.source"
+        states[$i]="done"
+        log "Saved output to '${out_file}'"
+      else
+        states[$i]="failed"
+        details[$i]=$(failure_detail "$output" "$exit_code" "$http_code")
+        rm -f "$output"
+        log "Failed: '${pdfs[$i]}': ${details[$i]}"
+      fi
+    done < <(run_transfers "$tmp/requests" "$jobs")
+  fi
+
+  # 6) Summary report
+  local summary="split-pdf-bookmarks-summary.tsv" done=0 skipped=0 failed=0
+  {
+    printf 'pdf\tstatus\toutput\tdetail\n'
+    for i in "${!pdfs[@]}"; do
+      case "${states[$i]}" in
+        done)    done=$((done + 1)) ;;
+        skipped) skipped=$((skipped + 1)) ;;
+        *)       failed=$((failed + 1)) ;;
+      esac
+      printf '%s\t%s\t%s\t%s\n' "${pdfs[$i]}" "${states[$i]}" "${out_files[$i]}" "${details[$i]}"
+    done
+  } > "$summary"
+  log "${done} done, ${skipped} skipped, ${failed} failed; report saved to '${summary}'"
+  [[ $failed -eq 0 ]]
+}
+
 # Main
 
 main() {
+  if [[ "${1-}" == "--batch" ]]; then
+    shift
+    batch_main "$@"
+    return
+  fi
+
   # 1) Arg parsing
-  if [[ $# -lt 1 || $# -gt 2 ]]; then
+  local levels=""
+  if [[ "${1-}" == "--level" ]]; then
+    [[ $# -eq 3 ]] || { usage; exit 1; }
+    levels="$2"
+    shift 2
+    [[ "$levels" =~ ^[0-9]+(,[0-9]+)*$ ]] || error "Invalid --level: '$levels' (expected e.g. 0 or 0,1)"
+  fi
+  if [[ $# -lt 1 || $# -gt 2 || ( -n "$levels" && $# -ne 1 ) ]]; then
     usage
     exit 1
   fi
@@ -81,36 +412,45 @@ main() {
     mkdir -p "$out_dir"
   fi
 
-  # 3) Choose endpoint & zip filename
-  if [[ -z "$csv_file" ]]; then
-    endpoint="/api/bookmarks/zip"
-    out_file="${out_dir}/bookmarks.zip"
-  else
-    endpoint="/api/split"
-    out_file="${out_dir}/pdfs.zip"
-  fi
-
-  # 4) Input validation
+  # 3) Input validation
   log "Verifying input files..."
   [[ -r "$pdf_file" ]] || error "Cannot read PDF: $pdf_file"
   if [[ -n "$csv_file" ]]; then
     [[ -r "$csv_file" ]] || error "Cannot read CSV: $csv_file"
   fi
 
+  # 4) Document id & endpoint & zip filename
+  local doc_id; doc_id=$(sha256sum "$pdf_file" | awk '{print $1}')
+  if [[ -n "$levels" ]]; then
+    endpoint="/api/documents/${doc_id}/split/bookmarks"
+    out_file="${out_dir}/pdfs.zip"
+  elif [[ -z "$csv_file" ]]; then
+    endpoint="/api/documents/${doc_id}/bookmarks"
+    out_file="${out_dir}/bookmarks.zip"
+  else
+    endpoint="/api/documents/${doc_id}/split"
+    out_file="${out_dir}/pdfs.zip"
+  fi
+
   # 5) Locate container & port
   log "Locating running container..."
-  local cid; cid=$(find_container)
-  local host_port; host_port=$(get_host_port "$cid")
-  log "Server endpoint --> http://localhost:${host_port}${endpoint}"
+  local base_url; base_url=$(get_base_url)
+  log "Server endpoint --> ${base_url}${endpoint}"
+
+  # 6) Make sure the server holds the PDF
+  ensure_document "$base_url" "$pdf_file" "$doc_id"
 
-  # 6) Dispatch POST request
+  # 7) Dispatch request
   log "Sending request..."
-  local curl_args=(-sS --fail --show-error --progress-bar -X POST)
-  curl_args+=("-F" "pdf=@${pdf_file}")
-  [[ -n "$csv_file" ]] && curl_args+=("-F" "csvfile=@${csv_file}")
+  local curl_args=(-sS --fail --show-error --progress-bar)
+  if [[ -n "$levels" ]]; then
+    curl_args+=(-X POST "-F" "levels=${levels}")
+  elif [[ -n "$csv_file" ]]; then
+    curl_args+=(-X POST "-F" "csvfile=@${csv_file}")
+  fi
 
   curl "${curl_args[@]}" \
-       "http://localhost:${host_port}${endpoint}" \
+       "${base_url}${endpoint}" \
        -o "${out_file}"
 
   log "Saved output to '${out_file}'"
@@ -2,15 +2,22 @@
 
 import os
 import io
+import sys
 import zipfile
 from typing import Dict
 import pytest
 import requests
 import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, NameObject
 
 # Base URL for the running service under test
 API_URL = os.getenv("API_URL", "http://split-pdf-bookmarks:8080")
 
+# In-process tests import the service modules the way the app does
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
 
 class APIClient:
     """
@@ -20,14 +27,20 @@ class APIClient:
     def __init__(self):
         self._sess = requests.Session()
 
+    def get(self, path: str, **kwargs):
+        return self._sess.get(f"{API_URL}{path}", **kwargs)
+
     def post(self, path: str, **kwargs):
         return self._sess.post(f"{API_URL}{path}", **kwargs)
 
+    def delete(self, path: str, **kwargs):
+        return self._sess.delete(f"{API_URL}{path}", **kwargs)
+
 
 @pytest.fixture(scope="session")
 def client() -> APIClient:
     """
-    Returns an APIClient capable of posting to our service.
+    Returns an APIClient capable of calling our service.
     """
     return APIClient()
 
@@ -95,6 +108,29 @@ def pdf_4pages() -> io.BytesIO:
     return buf
 
 
+@pytest.fixture
+def large_pdf_with_bookmarks() -> io.BytesIO:
+    """
+    3-page PDF padded to ~2 MB (larger than the server's in-memory
+    spool limit), with level-0 bookmarks "Start" and "End".
+    """
+    writer = PyPDF2.PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=72, height=72)
+
+    padding = DecodedStreamObject()
+    padding.set_data(b"%" + b"x" * (2 * 1024 * 1024) + b"\n")
+    writer.pages[0][NameObject("/Contents")] = writer._add_object(padding)
+
+    writer.add_outline_item("Start", page_number=0)
+    writer.add_outline_item("End", page_number=2)
+
+    buf = io.BytesIO()
+    writer.write(buf)
+    buf.seek(0)
+    return buf
+
+
 def extract_zip_contents(zip_bytes: bytes) -> Dict[str, bytes]:
     """
     Unpack a ZIP from bytes --> {filename: raw bytes}.
@@ -0,0 +1,95 @@
+# tests/test_assign_end_pages.py
+
+import random
+import time
+from typing import List, Tuple
+
+import pytest
+
+from services.bookmarks import Bookmark, _assign_end_pages
+
+
+def reference_end_pages(bookmarks: List[Bookmark], total_pages: int) -> List[int]:
+    """
+    The original quadratic scan: first later bookmark at the same or a
+    shallower level closes the current one.
+    """
+    ends = []
+    for idx, bm in enumerate(bookmarks):
+        end = total_pages
+        for next_bm in bookmarks[idx + 1:]:
+            if next_bm.level <= bm.level:
+                end = next_bm.start_page - 1
+                break
+        ends.append(end)
+    return ends
+
+
+def random_outline(n: int, max_depth: int, seed: int) -> List[Bookmark]:
+    """
+    Pre-order outline whose level changes by at most +1 per step.
+    """
+    rnd = random.Random(seed)
+    level, page, out = 0, 1, []
+    for i in range(n):
+        out.append(Bookmark(level, f"B{i}", page))
+        level = rnd.randint(0, min(level + 1, max_depth))
+        page += rnd.randint(0, 3)
+    return out
+
+
+def synthetic_outline(n: int, shape: str) -> Tuple[List[Bookmark], int]:
+    """
+    "wide": n siblings at level 0; "deep": a chain n levels deep.
+    """
+    if shape == "wide":
+        bms = [Bookmark(0, f"W{i}", i + 1) for i in range(n)]
+    else:
+        bms = [Bookmark(i, f"D{i}", i + 1) for i in range(n)]
+    return bms, n + 10
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_reference_on_random_outlines(seed):
+    """
+    Same end pages as the original algorithm, including equal start
+    pages and jumps back up several levels.
+    """
+    bms = random_outline(500, max_depth=6, seed=seed)
+    expected = reference_end_pages(bms, total_pages=2000)
+    _assign_end_pages(bms, total_pages=2000)
+    assert [bm.end_page for bm in bms] == expected
+
+
+def test_nested_example():
+    """
+    Chapter / section / chapter --> sections end before the next chapter.
+    """
+    bms = [
+        Bookmark(0, "Chapter 1", 1),
+        Bookmark(1, "Section 1.1", 2),
+        Bookmark(1, "Section 1.2", 3),
+        Bookmark(0, "Chapter 2", 3),
+    ]
+    _assign_end_pages(bms, total_pages=3)
+    assert [bm.end_page for bm in bms] == [2, 2, 2, 3]
+
+
+@pytest.mark.parametrize("shape", ["wide", "deep"])
+def test_scales_linearly(shape):
+    """
+    10x more entries should cost ~10x, not ~100x. Only the ratio of
+    best-of-five times is checked, with a loose bound, so that machine
+    speed and timer noise on shared CI do not matter.
+    """
+    def best_time(n: int) -> float:
+        best = float("inf")
+        for _ in range(5):
+            bms, total = synthetic_outline(n, shape)
+            start = time.perf_counter()
+            _assign_end_pages(bms, total_pages=total)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    small, large = best_time(2_000), best_time(20_000)
+    assert large < small * 40
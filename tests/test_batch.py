@@ -0,0 +1,72 @@
+# tests/test_batch.py
+
+import io
+import json
+import PyPDF2
+
+from .conftest import client, pdf_4pages, pdf_with_bookmarks, extract_zip_contents
+
+
+def split_batch(client, pairs):
+    """
+    POST /api/batch/split with (pdf name, pdf bytes, csv text) triples.
+    """
+    files = []
+    for name, pdf, csv in pairs:
+        files.append(("pdfs", (name, io.BytesIO(pdf), "application/pdf")))
+    for name, pdf, csv in pairs:
+        files.append(("csvfiles", (name[:-4] + ".csv", io.BytesIO(csv.encode()), "text/csv")))
+    return client.post("/api/batch/split", files=files)
+
+
+def test_batch_returns_directory_per_document(client, pdf_4pages, pdf_with_bookmarks):
+    """
+    Two books --> one ZIP with a directory each and a manifest.
+    """
+    resp = split_batch(client, [
+        ("first.pdf",  pdf_4pages.getvalue(),         "split,name,from,to\ny,A,1,2\ny,B,3,4\n"),
+        ("second.pdf", pdf_with_bookmarks.getvalue(), "split,name,from,to\ny,Chapter 2,3,3\n"),
+    ])
+    assert resp.status_code == 200
+    entries  = extract_zip_contents(resp.content)
+    manifest = json.loads(entries.pop("manifest.json"))
+
+    assert set(entries) == {"first/A.pdf", "first/B.pdf", "second/Chapter 2.pdf"}
+    assert len(PyPDF2.PdfReader(io.BytesIO(entries["first/B.pdf"])).pages) == 2
+    assert manifest["documents"] == 2 and manifest["done"] == 2
+    assert [(r["directory"], r["fragments"], r["pages"]) for r in manifest["results"]] == [
+        ("first", 2, 4), ("second", 1, 1)
+    ]
+
+
+def test_failed_document_does_not_stop_batch(client, pdf_4pages):
+    """
+    A bad CSV or PDF fails its own document only; same-named PDFs get
+    distinct directories.
+    """
+    pdf = pdf_4pages.getvalue()
+    resp = split_batch(client, [
+        ("book.pdf", pdf,            "split,name,from,to\ny,Too far,3,9\n"),
+        ("book.pdf", b"not a pdf",   "split,name,from,to\ny,A,1,1\n"),
+        ("book.pdf", pdf,            "split,name,from,to\ny,A,1,1\n"),
+    ])
+    assert resp.status_code == 200
+    entries  = extract_zip_contents(resp.content)
+    manifest = json.loads(entries.pop("manifest.json"))
+
+    assert set(entries) == {"book_3/A.pdf"}
+    states = [(r["directory"], r["state"]) for r in manifest["results"]]
+    assert states == [("book", "failed"), ("book_2", "failed"), ("book_3", "done")]
+    assert "exceeds total page count" in manifest["results"][0]["error"]
+    assert manifest["failed"] == 2
+
+
+def test_unpaired_uploads_return_400(client, pdf_4pages):
+    files = [
+        ("pdfs", ("a.pdf", io.BytesIO(pdf_4pages.getvalue()), "application/pdf")),
+        ("pdfs", ("b.pdf", io.BytesIO(pdf_4pages.getvalue()), "application/pdf")),
+        ("csvfiles", ("a.csv", io.BytesIO(b"split,name,from,to\n"), "text/csv")),
+    ]
+    resp = client.post("/api/batch/split", files=files)
+    assert resp.status_code == 400
+    assert "one CSV per PDF" in resp.json()["detail"]
@@ -0,0 +1,38 @@
+# tests/test_benchmarks.py
+
+import os
+import sys
+import json
+import subprocess
+
+RUN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "run.py")
+
+
+def test_benchmark_suite_runs_and_checks_baseline(tmp_path):
+    """
+    A tiny run of every case yields a result each; rerunning against it
+    with an impossible tolerance reports regressions.
+    """
+    params = ["--pages", "6", "--depth", "2", "--width", "2", "--fragments", "3",
+              "--resource-kb", "1", "--iterations", "2"]
+    output = tmp_path / "results.json"
+    subprocess.run([sys.executable, RUN_PY, *params, "--output", str(output)], check=True, capture_output=True)
+
+    report = json.loads(output.read_text())
+    by_case = {result["case"]: result for result in report["results"]}
+    assert set(by_case) == {
+        "bookmarks_zip", "split_pdf_by_csv", "stream_zip", "write_fragment", "http_bookmarks", "http_split"
+    }
+    for result in by_case.values():
+        assert result["iterations"] == 2
+        assert 0 < result["latency_ms"]["p50"] <= result["latency_ms"]["max"]
+        assert result["peak_rss_mb"] > 0
+    assert [r["pages"] for r in by_case["write_fragment"]["ranges"]] == ["1-1", "1-6"]
+
+    rerun = subprocess.run(
+        [sys.executable, RUN_PY, *params, "--cases", "stream_zip",
+         "--baseline", str(output), "--tolerance", "-1"],
+        capture_output=True, text=True
+    )
+    assert rerun.returncode == 1
+    assert "REGRESSION stream_zip: p50 latency" in rerun.stderr
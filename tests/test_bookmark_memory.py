@@ -0,0 +1,64 @@
+# tests/test_bookmark_memory.py
+
+import tracemalloc
+from dataclasses import dataclass
+
+from services.bookmarks import Bookmark
+from services.split import SplitInstruction
+
+COUNT = 20_000
+
+
+class PlainBookmark:
+    """
+    Bookmark as it was before slots: one __dict__ per instance.
+    """
+    def __init__(self, level: int, title: str, start_page: int, end_page: int = -1):
+        self.level      = level
+        self.title      = title.strip()
+        self.start_page = start_page
+        self.end_page   = end_page
+
+
+@dataclass
+class PlainSplitInstruction:
+    should_split: bool
+    title:        str
+    start_page:   int
+    end_page:     int
+
+
+def allocated(factory) -> int:
+    """
+    Bytes still allocated after building COUNT objects with `factory`,
+    titles excluded.
+    """
+    titles = [f"Chapter {i}" for i in range(COUNT)]
+    tracemalloc.start()
+    try:
+        before  = tracemalloc.get_traced_memory()[0]
+        objects = [factory(i % 8, title) for i, title in enumerate(titles)]
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+        del titles
+
+
+def test_bookmark_has_no_instance_dict():
+    assert not hasattr(Bookmark(0, "A", 1), "__dict__")
+    assert not hasattr(SplitInstruction(True, "A", 1, 1), "__dict__")
+
+
+def test_bookmark_memory_reduction():
+    """
+    Slotted bookmarks take at most three quarters of the plain ones' memory.
+    """
+    plain   = allocated(lambda level, title: PlainBookmark(level, title, 1, 2))
+    slotted = allocated(lambda level, title: Bookmark(level, title, 1, 2))
+    assert slotted <= 0.75 * plain
+
+
+def test_split_instruction_memory_reduction():
+    plain   = allocated(lambda level, title: PlainSplitInstruction(True, title, 1, 2))
+    slotted = allocated(lambda level, title: SplitInstruction(True, title, 1, 2))
+    assert slotted <= 0.75 * plain
@@ -1,9 +1,17 @@
 # tests/test_bookmarks_zip.py
 
 import io
+import zipfile
 import pytest
 
-from .conftest import client, pdf_with_bookmarks, pdf_without_bookmarks, encrypted_pdf, extract_zip_csvs
+from .conftest import (
+    client,
+    pdf_with_bookmarks,
+    pdf_without_bookmarks,
+    encrypted_pdf,
+    large_pdf_with_bookmarks,
+    extract_zip_csvs,
+)
 
 
 def test_successful_export_multilevel_bookmarks(client, pdf_with_bookmarks):
@@ -29,6 +37,33 @@ def test_successful_export_multilevel_bookmarks(client, pdf_with_bookmarks):
     assert "Section 1.2" in csvs["bookmarks_level_1.csv"]
 
 
+def test_csv_entries_are_deflated(client, pdf_with_bookmarks):
+    """
+    Bookmark CSVs compress well, so they are always deflated.
+    """
+    resp = client.post(
+        "/api/bookmarks/zip",
+        files={"pdf": ("with_bookmarks.pdf", pdf_with_bookmarks, "application/pdf")},
+    )
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert all(i.compress_type == zipfile.ZIP_DEFLATED for i in zf.infolist())
+
+
+def test_large_pdf_spooled_to_disk(client, large_pdf_with_bookmarks):
+    """
+    PDF above the in-memory spool limit --> bookmarks read from the spooled file.
+    """
+    resp = client.post(
+        "/api/bookmarks/zip",
+        files={"pdf": ("large.pdf", large_pdf_with_bookmarks, "application/pdf")},
+    )
+    assert resp.status_code == 200
+    csv = extract_zip_csvs(resp.content)["bookmarks_level_0.csv"]
+    assert '"n","Start",1,2' in csv
+    assert '"n","End",3,3' in csv
+
+
 def test_no_bookmarks_returns_404(client, pdf_without_bookmarks):
     """
     POST /api/bookmarks/zip with no bookmarks -->
@@ -0,0 +1,62 @@
+# tests/test_csv_plan.py
+
+import pytest
+
+from services.split import _iter_plan
+from services.utils import PdfSource
+from services.exceptions import ValidationError
+
+
+def csv_source(text: str, tmp_path=None) -> PdfSource:
+    data = text.encode("utf-8")
+    if tmp_path is None:
+        return PdfSource(data=data)
+    path = tmp_path / "plan.csv"
+    path.write_bytes(data)
+    return PdfSource(path=str(path))
+
+
+def test_rows_are_yielded_before_a_later_error(tmp_path):
+    """
+    Valid rows come out one by one; a bad row far down only fails
+    once parsing reaches it, naming its line.
+    """
+    rows = "".join(f"y,Part {i},1,1\n" for i in range(50_000))
+    plan = _iter_plan(csv_source(f"split,name,from,to\n{rows}y,Bad,x,1\n", tmp_path), 4)
+
+    first = next(plan)
+    assert first[0] == "Part 0.pdf"
+    assert first[1].start_page == 1
+
+    with pytest.raises(ValidationError, match="row 50002"):
+        for _ in plan:
+            pass
+
+
+def test_row_number_counts_csv_lines():
+    text = 'split,name,from,to\nn,skip,9,1\ny,"two\nlines",1,2\ny,Late,3,9\n'
+    with pytest.raises(ValidationError, match="exceeds total.*row 5"):
+        list(_iter_plan(csv_source(text), 4))
+
+
+def test_multibyte_titles_across_read_boundaries(tmp_path):
+    """
+    The incremental decoder keeps characters split between reads intact.
+    """
+    titles = [f"Kapitel {i} über été" for i in range(5_000)]
+    text   = "split,name,from,to\n" + "".join(f"y,{t},1,1\n" for t in titles)
+
+    plan = list(_iter_plan(csv_source(text, tmp_path), 1))
+    assert len(plan) == len(titles)
+    assert all(inst.title == title for (_, inst), title in zip(plan, titles))
+
+
+def test_rows_with_the_same_filename_are_suffixed():
+    text = "split,name,from,to\ny,Same,1,1\ny,Same_2,2,2\ny,Same,3,4\ny,Sa/me,4,4\n"
+    plan = [(fname, inst.start_page) for fname, inst in _iter_plan(csv_source(text), 4)]
+    assert plan == [("Same.pdf", 1), ("Same_2.pdf", 2), ("Same_3.pdf", 3), ("Sa_me.pdf", 4)]
+
+
+def test_short_rows_are_non_integer_errors():
+    with pytest.raises(ValidationError, match="Non-integer page range in row 2"):
+        list(_iter_plan(csv_source("split,name,from,to\ny,Short\n"), 4))
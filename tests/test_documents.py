@@ -0,0 +1,117 @@
+# tests/test_documents.py
+
+import io
+import os
+import asyncio
+import hashlib
+import PyPDF2
+import pytest
+
+from services import documents
+from services.cache import evict_directory
+from services.exceptions import NotFoundError
+
+from .conftest import client, pdf_with_bookmarks, extract_zip_contents, extract_zip_csvs
+
+
+def upload(client, pdf: io.BytesIO):
+    return client.post(
+        "/api/documents",
+        files={"pdf": ("book.pdf", pdf, "application/pdf")},
+    )
+
+
+def test_upload_returns_content_hash_id(client, pdf_with_bookmarks):
+    """
+    POST /api/documents --> 201 + id is the SHA-256 of the PDF bytes.
+    """
+    resp = upload(client, pdf_with_bookmarks)
+    assert resp.status_code == 201
+    body = resp.json()
+    assert body["id"] == hashlib.sha256(pdf_with_bookmarks.getvalue()).hexdigest()
+    assert body["pages"] == 3
+    assert body["size"] == len(pdf_with_bookmarks.getvalue())
+
+    resp = client.get(f"/api/documents/{body['id']}")
+    assert resp.status_code == 200
+    assert resp.json()["pages"] == 3
+
+
+def test_bookmarks_then_split_reuse_upload(client, pdf_with_bookmarks):
+    """
+    Upload once, then export bookmarks and split by document id.
+    """
+    doc_id = upload(client, pdf_with_bookmarks).json()["id"]
+
+    resp = client.get(f"/api/documents/{doc_id}/bookmarks")
+    assert resp.status_code == 200
+    csvs = extract_zip_csvs(resp.content)
+    assert '"n","Chapter 1",1,2' in csvs["bookmarks_level_0.csv"]
+
+    csv = csvs["bookmarks_level_0.csv"].replace('"n"', '"y"')
+    resp = client.post(
+        f"/api/documents/{doc_id}/split",
+        files={"csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv")},
+    )
+    assert resp.status_code == 200
+    frags = extract_zip_contents(resp.content)
+    pages = {n: len(PyPDF2.PdfReader(io.BytesIO(d)).pages) for n, d in frags.items()}
+    assert pages == {"Chapter 1.pdf": 2, "Chapter 2.pdf": 1}
+
+
+def test_unknown_document_returns_404(client):
+    """
+    Unknown or malformed ids --> 404 on every document endpoint.
+    """
+    for doc_id in ("0" * 64, "not-a-digest"):
+        assert client.get(f"/api/documents/{doc_id}").status_code == 404
+        assert client.get(f"/api/documents/{doc_id}/bookmarks").status_code == 404
+        resp = client.post(
+            f"/api/documents/{doc_id}/split",
+            files={"csvfile": ("r.csv", io.BytesIO(b"split,name,from,to\n"), "text/csv")},
+        )
+        assert resp.status_code == 404
+        assert resp.json()["detail"] == "Document not found"
+
+
+def test_invalid_pdf_upload_raises_400(client):
+    """
+    Non-PDF upload --> 400 + detail contains "invalid pdf file".
+    """
+    resp = upload(client, io.BytesIO(b"hello world"))
+    assert resp.status_code == 400
+    assert "invalid pdf file" in resp.json()["detail"].lower()
+
+
+def test_documents_in_use_are_not_evicted(tmp_path, monkeypatch):
+    """
+    Eviction passes over a document until every user has closed it.
+    """
+    monkeypatch.setattr(documents, "DOCUMENT_DIR", str(tmp_path))
+    used, idle = "a" * 64, "b" * 64
+    for doc_id in (used, idle):
+        (tmp_path / f"{doc_id}.pdf").write_bytes(b"%PDF")
+
+    first, second = documents.open_document(used), documents.open_document(used)
+    evict = lambda: evict_directory(str(tmp_path), ".pdf", 0, 3600, set(documents._in_use))
+    assert evict() == 1
+    assert not (tmp_path / f"{idle}.pdf").exists()
+
+    first.close()
+    first.close()
+    assert evict() == 0
+    second.close()
+    assert evict() == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_document_removed_while_described_is_not_found(tmp_path, monkeypatch):
+    """
+    A document removed by another process after the lookup --> 404,
+    not an OSError.
+    """
+    monkeypatch.setattr(documents, "DOCUMENT_DIR", str(tmp_path))
+    monkeypatch.setattr(documents, "touch_entry", lambda path, ttl: True)
+    with pytest.raises(NotFoundError):
+        asyncio.run(documents.describe_document("c" * 64))
+    assert documents._in_use == {}
@@ -0,0 +1,145 @@
+# tests/test_engines.py
+
+import io
+import hashlib
+
+import pytest
+import PyPDF2
+from PyPDF2.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+    TextStringObject
+)
+
+from services import engine as engine_module
+from services.engine import ENGINES, get_engine
+from services.bookmarks import _render_bookmark_csvs
+from services.utils import PdfSource
+
+from .test_pages import tree_pdf
+
+
+def retarget(item, key: str, value) -> None:
+    """
+    Replace an outline item's destination or action.
+    """
+    node = item.get_object()
+    for name in ("/Dest", "/A"):
+        node.pop(NameObject(name), None)
+    node[NameObject(key)] = value
+
+
+def outlined_pdf() -> bytes:
+    """
+    Eight pages with distinct text, sizes and rotations, and an outline
+    with nested items, a named destination and a URI action.
+    """
+    writer = PyPDF2.PdfWriter()
+    for i in range(8):
+        writer.add_blank_page(width=100 + 10 * i, height=200)
+        page = writer.pages[-1]
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 12 Tf 10 10 Td (Page %d) Tj ET" % (i + 1))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        if i % 3 == 2:
+            page[NameObject("/Rotate")] = NumberObject(90)
+
+    part = writer.add_outline_item("Part I", page_number=0)
+    chapter = writer.add_outline_item("Chapter 1", page_number=1, parent=part)
+    writer.add_outline_item("Section 1.1", page_number=2, parent=chapter)
+    writer.add_outline_item("Chapter 2", page_number=4, parent=part)
+    writer.add_named_destination("appendix", 6)
+    retarget(writer.add_outline_item("Appendix", page_number=6), "/Dest", TextStringObject("appendix"))
+    retarget(writer.add_outline_item("Website", page_number=0), "/A", DictionaryObject({
+        NameObject("/S"): NameObject("/URI"),
+        NameObject("/URI"): TextStringObject("https://example.com")
+    }))
+    writer.add_outline_item("Last page", page_number=7)
+
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+DOCUMENTS = {"outlined": outlined_pdf, "nested-tree": tree_pdf}
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def engine(request):
+    try:
+        return get_engine(request.param)
+    except RuntimeError as exc:
+        pytest.skip(str(exc))
+
+
+def source_of(data: bytes) -> PdfSource:
+    return PdfSource(data=data, digest=hashlib.sha256(data).hexdigest())
+
+
+def page_summary(data: bytes):
+    """
+    What a reader sees of each page: size, rotation, content and text.
+    """
+    summary = []
+    for page in PyPDF2.PdfReader(io.BytesIO(data)).pages:
+        contents = page.get_contents()
+        summary.append((
+            [float(x) for x in page.mediabox],
+            page.get("/Rotate", 0),
+            contents.get_data() if contents is not None else b"",
+            page.extract_text()
+        ))
+    return summary
+
+
+def test_outline_and_page_count_match_reference(engine):
+    """
+    Every engine reads the same outline entries, named and non-page
+    destinations included, and the same page counts.
+    """
+    reference = get_engine("pypdf2")
+    data      = outlined_pdf()
+
+    items = list(engine.outline(source_of(data)))
+    assert items == list(reference.outline(source_of(data)))
+    assert [(item.title, item.start_page) for item in items][-3:] == [
+        ("Appendix", 7), ("Website", 0), ("Last page", 8)
+    ]
+    for make in DOCUMENTS.values():
+        assert engine.page_count(source_of(make())) == reference.page_count(source_of(make()))
+
+
+def test_bookmark_csvs_match_reference(engine, monkeypatch):
+    """
+    The bookmark export renders byte-identical CSVs with every engine.
+    """
+    data = outlined_pdf()
+    monkeypatch.setattr(engine_module, "PDF_ENGINE", "pypdf2")
+    expected = _render_bookmark_csvs(source_of(data))
+    monkeypatch.setattr(engine_module, "PDF_ENGINE", engine.name)
+    assert _render_bookmark_csvs(source_of(data)) == expected
+
+
+@pytest.mark.parametrize("document", sorted(DOCUMENTS))
+def test_page_ranges_match_reference(engine, document):
+    """
+    Fragments written by every engine have the pages of the reference
+    fragments: same size, rotation, content stream and text.
+    """
+    reference = get_engine("pypdf2")
+    data      = DOCUMENTS[document]()
+    total     = reference.page_count(source_of(data))
+    for start, end in ((1, 1), (2, total - 1), (1, total)):
+        expected = page_summary(reference.write_range(source_of(data), start, end))
+        assert page_summary(engine.write_range(source_of(data), start, end)) == expected
+        assert len(expected) == end - start + 1
+
+
+def test_unknown_engine_is_rejected():
+    """
+    An unknown PDF_ENGINE fails when the engine is picked.
+    """
+    with pytest.raises(ValueError, match="Unknown PDF_ENGINE"):
+        get_engine("ghostscript")
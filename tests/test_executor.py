@@ -0,0 +1,163 @@
+# tests/test_executor.py
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import executor
+from services.exceptions import OverloadedError, MemoryBudgetError, TooManyJobsError, JobTimeoutError
+from routers.admission import AdmissionMiddleware
+from main import overloaded_handler, job_timeout_handler
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """
+    A small thread pool in place of the shared executor.
+    """
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(executor, "_pool", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_saturated_executor_answers_503(monkeypatch):
+    """
+    Every worker busy and the queue full --> OverloadedError, served
+    as 503 with Retry-After.
+    """
+    monkeypatch.setattr(executor, "EXECUTOR_WORKERS", 1)
+    monkeypatch.setattr(executor, "EXECUTOR_QUEUE_DEPTH", 1)
+    slots = [executor.acquire_slot() for _ in range(2 - executor.in_flight())]
+    try:
+        with pytest.raises(OverloadedError) as exc:
+            executor.acquire_slot()
+    finally:
+        for slot in slots:
+            slot.release()
+
+    resp = asyncio.run(overloaded_handler(None, exc.value))
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(executor.RETRY_AFTER_SECONDS)
+
+
+def test_timed_out_job_answers_504_and_stays_busy(monkeypatch, thread_pool):
+    """
+    A stage past the time limit --> JobTimeoutError, served as 504; the
+    job keeps its place until its worker is actually free again.
+    """
+    monkeypatch.setattr(executor, "EXECUTOR_JOB_TIMEOUT", 0.2)
+
+    async def scenario():
+        before = executor.in_flight()
+        slot   = executor.acquire_slot()
+        with pytest.raises(JobTimeoutError) as exc:
+            with slot:
+                await slot.run(time.sleep, 0.6)
+        assert executor.in_flight() == before + 1
+        await asyncio.sleep(0.8)
+        assert executor.in_flight() == before
+        return exc.value
+
+    resp = asyncio.run(job_timeout_handler(None, asyncio.run(scenario())))
+    assert resp.status_code == 504
+
+
+def test_time_limit_spans_the_whole_job(monkeypatch, thread_pool):
+    """
+    Stages that each fit the limit still time out once their total
+    exceeds it.
+    """
+    monkeypatch.setattr(executor, "EXECUTOR_JOB_TIMEOUT", 0.5)
+
+    async def scenario():
+        with executor.acquire_slot() as slot:
+            await slot.run(time.sleep, 0.3)
+            with pytest.raises(JobTimeoutError):
+                await slot.run(time.sleep, 0.3)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+
+
+def test_memory_budget_answers_503_but_admits_a_lone_job(monkeypatch):
+    """
+    Jobs are admitted while their estimates fit the budget; one that
+    would overrun it alongside others --> 503 with Retry-After, while
+    one too big for the budget is still admitted on its own.
+    """
+    monkeypatch.setattr(executor, "MEMORY_BUDGET_BYTES", 100)
+    monkeypatch.setattr(executor, "HEAVY_JOB_BYTES", 10 ** 9)
+    before = executor.memory_reserved()
+
+    with executor.acquire_slot(80) as slot:
+        assert executor.memory_reserved() == before + 80
+        with pytest.raises(MemoryBudgetError) as exc:
+            executor.acquire_slot(30)
+        with executor.acquire_slot(20):
+            with pytest.raises(MemoryBudgetError):
+                slot.charge(90)
+        assert executor.memory_reserved() == before + 80
+    assert executor.memory_reserved() == before
+
+    with executor.acquire_slot(500):
+        pass
+
+    resp = asyncio.run(overloaded_handler(None, exc.value))
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(executor.RETRY_AFTER_SECONDS)
+
+
+def test_heavy_job_cap_answers_429(monkeypatch):
+    """
+    With MAX_HEAVY_JOBS heavy jobs running, another one --> 429, also
+    when a light job grows heavy once its page count is known.
+    """
+    monkeypatch.setattr(executor, "MEMORY_BUDGET_BYTES", 10 ** 9)
+    monkeypatch.setattr(executor, "HEAVY_JOB_BYTES", 50)
+    monkeypatch.setattr(executor, "MAX_HEAVY_JOBS", 1)
+
+    with executor.acquire_slot(60):
+        assert executor.heavy_jobs() == 1
+        with pytest.raises(TooManyJobsError) as exc:
+            executor.acquire_slot(70)
+        with executor.acquire_slot(10) as light:
+            with pytest.raises(TooManyJobsError):
+                light.charge(50)
+            assert executor.heavy_jobs() == 1
+    assert executor.heavy_jobs() == 0
+
+    resp = asyncio.run(overloaded_handler(None, exc.value))
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == str(executor.RETRY_AFTER_SECONDS)
+
+
+def test_large_upload_is_refused_before_its_body_is_read(monkeypatch):
+    """
+    An upload whose declared size would not fit --> 503 from the
+    middleware, without the app or the body being touched.
+    """
+    monkeypatch.setattr(executor, "MEMORY_BUDGET_BYTES", 1000)
+    monkeypatch.setattr(executor, "MEMORY_PER_UPLOAD_BYTE", 1)
+
+    async def app(scope, receive, send):
+        raise AssertionError("request reached the app")
+
+    async def receive():
+        raise AssertionError("body was read")
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/split",
+        "headers": [(b"content-length", b"600")]
+    }
+    with executor.acquire_slot(500):
+        asyncio.run(AdmissionMiddleware(app)(scope, receive, send))
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", str(executor.RETRY_AFTER_SECONDS).encode()) in sent[0]["headers"]
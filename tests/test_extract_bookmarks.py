@@ -0,0 +1,163 @@
+# tests/test_extract_bookmarks.py
+
+import io
+import sys
+from typing import List
+
+import pytest
+import PyPDF2
+from PyPDF2.generic import Destination, DictionaryObject, NameObject, TextStringObject
+
+from services.bookmarks import _render_bookmark_csvs
+from services.engine import _build_page_index, _iter_bookmarks
+from services.utils import PdfSource
+
+
+def outline_pdf(pages: int, entries: int, depth: int) -> PyPDF2.PdfReader:
+    """
+    Reader over a synthetic PDF whose outline cycles through `depth`
+    nesting levels, with destinations spread across all pages.
+    """
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=72, height=72)
+
+    parents: List = []
+    for i in range(entries):
+        level = i % depth
+        parent = parents[level - 1] if level else None
+        item = writer.add_outline_item(f"B{i}", page_number=i * pages // entries, parent=parent)
+        parents = parents[:level] + [item]
+
+    return reopen(writer)
+
+
+def non_page_outline_pdf() -> PyPDF2.PdfReader:
+    """
+    Reader over a 6-page PDF whose outline mixes chapters with entries
+    that lead to no page: a URI action, no destination at all, and a
+    named destination that does not exist.
+    """
+    writer = PyPDF2.PdfWriter()
+    for _ in range(6):
+        writer.add_blank_page(width=72, height=72)
+
+    writer.add_outline_item("Ch1", page_number=0)
+    writer.add_outline_item("Ch2", page_number=2)
+    for title, entry in [
+        ("Website", {"/A": DictionaryObject({
+            NameObject("/S"):   NameObject("/URI"),
+            NameObject("/URI"): TextStringObject("https://example.org"),
+        })}),
+        ("No destination", {}),
+        ("Missing name", {"/Dest": TextStringObject("nowhere")}),
+    ]:
+        node = writer.add_outline_item(title, page_number=0).get_object()
+        del node[NameObject("/A")]
+        for key, value in entry.items():
+            node[NameObject(key)] = value
+    writer.add_outline_item("Ch3", page_number=4)
+    return reopen(writer)
+
+
+def reopen(writer: PyPDF2.PdfWriter) -> PyPDF2.PdfReader:
+    buf = io.BytesIO()
+    writer.write(buf)
+    buf.seek(0)
+    return PyPDF2.PdfReader(buf)
+
+
+def chain_pdf(depth: int) -> PyPDF2.PdfWriter:
+    """
+    Writer whose outline is a single chain nested `depth` levels deep.
+    """
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    # Added flat and relinked: nesting through the writer recurses itself.
+    items = [writer.add_outline_item(f"D{i}", page_number=0) for i in range(depth)]
+    for item, child in zip(items, items[1:]):
+        node = item.get_object()
+        del node[NameObject("/Next")]
+        node[NameObject("/First")] = child
+    return writer
+
+
+def walk(outline, level=0):
+    for entry in outline:
+        if isinstance(entry, list):
+            yield from walk(entry, level + 1)
+        elif isinstance(entry, Destination):
+            yield level, entry
+
+
+@pytest.mark.parametrize("make_reader", [
+    lambda: outline_pdf(pages=300, entries=600, depth=4),
+    non_page_outline_pdf,
+], ids=["nested", "non-page"])
+def test_pages_match_reader_lookup(make_reader):
+    """
+    Page numbers and levels equal get_destination_page_number + 1,
+    including 0 for entries that lead to no page.
+    """
+    reader = make_reader()
+    expected = [
+        (level, entry.title, reader.get_destination_page_number(entry) + 1)
+        for level, entry in walk(reader.outline)
+    ]
+
+    flat = list(_iter_bookmarks(reader, _build_page_index(reader)))
+    assert [(bm.level, bm.title, bm.start_page) for bm in flat] == expected
+
+
+def test_no_per_bookmark_page_tree_lookup(monkeypatch):
+    """
+    Extraction resolves pages from the prebuilt index only.
+    """
+    reader = outline_pdf(pages=50, entries=120, depth=3)
+    page_index = _build_page_index(reader)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("per-bookmark page lookup")
+
+    monkeypatch.setattr(reader, "get_destination_page_number", fail)
+    assert len(list(_iter_bookmarks(reader, page_index))) == 120
+
+
+def test_nesting_deeper_than_recursion_limit():
+    """
+    An outline nested past the recursion limit is walked without error.
+    """
+    depth  = sys.getrecursionlimit() + 500
+    reader = reopen(chain_pdf(depth))
+
+    levels = [bm.level for bm in _iter_bookmarks(reader, _build_page_index(reader))]
+    assert levels == list(range(depth))
+
+
+def test_cyclic_outline_links_terminate():
+    """
+    /Next and /First links pointing back into the outline are skipped.
+    """
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=72, height=72)
+    first  = writer.add_outline_item("A", page_number=0)
+    second = writer.add_outline_item("B", page_number=0)
+    child  = writer.add_outline_item("C", page_number=0, parent=second)
+    second.get_object()[NameObject("/Next")] = first
+    child.get_object()[NameObject("/First")] = second
+    reader = reopen(writer)
+
+    titles = [(bm.level, bm.title) for bm in _iter_bookmarks(reader, _build_page_index(reader))]
+    assert titles == [(0, "A"), (0, "B"), (1, "C")]
+
+
+def test_deep_outline_renders_one_csv_per_level():
+    """
+    The whole pipeline streams a deep chain into one CSV per level.
+    """
+    buf = io.BytesIO()
+    chain_pdf(50).write(buf)
+
+    csv_files = _render_bookmark_csvs(PdfSource(data=buf.getvalue()))
+    assert len(csv_files) == 50
+    assert csv_files["bookmarks_level_49.csv"].decode().splitlines()[1] == '"n","D49",1,1'
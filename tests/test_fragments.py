@@ -0,0 +1,205 @@
+# tests/test_fragments.py
+
+import io
+import os
+import hashlib
+
+import PyPDF2
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NullObject,
+    NumberObject
+)
+
+from services.fragments import write_fragment, fragment_cache_stats
+from services.utils import PdfSource, load_pdf_reader
+
+FONT_SIZE = 100_000
+
+
+def font_heavy_pdf(pages: int, shared_font: bool) -> bytes:
+    """
+    PDF whose pages each use an embedded font: one font object shared by
+    all pages, or an identical copy per page as in merged documents.
+    Page 1 links to the last page.
+    """
+    writer    = PyPDF2.PdfWriter()
+    font_data = os.urandom(FONT_SIZE)
+    font_ref  = None
+    for i in range(pages):
+        writer.add_blank_page(width=200, height=200)
+        page = writer.pages[-1]
+
+        content = DecodedStreamObject()
+        content.set_data(b"BT /F1 12 Tf 10 10 Td (Page %d) Tj ET\n" % i * 50)
+        page[NameObject("/Contents")] = writer._add_object(content)
+
+        if font_ref is None or not shared_font:
+            font_file = DecodedStreamObject()
+            font_file.set_data(font_data)
+            descriptor = DictionaryObject({NameObject("/FontFile"): writer._add_object(font_file)})
+            font_ref = writer._add_object(DictionaryObject({
+                NameObject("/Type"):           NameObject("/Font"),
+                NameObject("/Subtype"):        NameObject("/Type1"),
+                NameObject("/BaseFont"):       NameObject("/Helvetica"),
+                NameObject("/FontDescriptor"): writer._add_object(descriptor),
+            }))
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref})
+        })
+
+    link = DictionaryObject({
+        NameObject("/Type"):    NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Link"),
+        NameObject("/Rect"):    ArrayObject([NumberObject(0)] * 4),
+        NameObject("/Dest"):    ArrayObject([writer.pages[-1].indirect_reference, NameObject("/Fit")]),
+    })
+    writer.pages[0][NameObject("/Annots")] = ArrayObject([writer._add_object(link)])
+
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def plain_fragment(reader: PyPDF2.PdfReader, start: int, end: int) -> bytes:
+    """
+    The previous writer path: add_page for each page of the range.
+    """
+    writer = PyPDF2.PdfWriter()
+    for idx in range(start - 1, end):
+        writer.add_page(reader.pages[idx])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def reader_of(data: bytes) -> PyPDF2.PdfReader:
+    return PyPDF2.PdfReader(io.BytesIO(data))
+
+
+def source_of(data: bytes) -> PdfSource:
+    return PdfSource(data=data, digest=hashlib.sha256(data).hexdigest())
+
+
+def test_identical_fonts_written_once():
+    """
+    Ten pages, each with its own copy of the same font --> one copy.
+    """
+    source = font_heavy_pdf(pages=20, shared_font=False)
+    data   = write_fragment(source_of(source), 5, 14)
+
+    assert len(data) < 1.5 * FONT_SIZE
+    assert len(reader_of(data).pages) == 10
+
+
+def test_link_to_page_outside_range_not_copied():
+    """
+    Page 1 links to page 20; a one-page fragment must not carry page 20
+    or its font, and the link target becomes null.
+    """
+    source = font_heavy_pdf(pages=20, shared_font=False)
+    data   = write_fragment(source_of(source), 1, 1)
+    assert len(data) < 1.5 * FONT_SIZE
+
+    link = reader_of(data).pages[0]["/Annots"][0].get_object()
+    assert isinstance(link["/Dest"][0].get_object(), NullObject)
+
+
+def test_link_inside_range_points_at_fragment_page():
+    source = font_heavy_pdf(pages=5, shared_font=True)
+    reader = reader_of(write_fragment(source_of(source), 1, 5))
+
+    link = reader.pages[0]["/Annots"][0].get_object()
+    assert link["/Dest"][0].idnum == reader.pages[4].indirect_reference.idnum
+
+
+def test_content_streams_compressed_on_request():
+    source = font_heavy_pdf(pages=4, shared_font=True)
+    plain  = write_fragment(source_of(source), 1, 4, compress_streams=False)
+    packed = write_fragment(source_of(source), 1, 4, compress_streams=True)
+
+    assert len(packed) < len(plain)
+    for a, b in zip(reader_of(plain).pages, reader_of(packed).pages):
+        assert b["/Contents"].get_object()["/Filter"] == "/FlateDecode"
+        assert a.get_contents().get_data() == b.get_contents().get_data()
+
+
+def test_fragments_no_larger_than_plain_writer():
+    """
+    Output is never larger than with the plain add_page path (uncached:
+    the source has no digest). Sizes and write times of both are
+    reported by the write_fragment case of benchmarks/run.py.
+    """
+    source = font_heavy_pdf(pages=40, shared_font=False)
+    for start, end in [(1, 1), (1, 10), (1, 40)]:
+        old = plain_fragment(reader_of(source), start, end)
+        new = write_fragment(PdfSource(data=source), start, end)
+        assert len(new) <= len(old)
+        assert len(reader_of(new).pages) == end - start + 1
+
+
+def test_overlapping_ranges_serialize_each_object_once():
+    """
+    A chapter plus its sections: every page and object is serialized
+    once, later fragments only link what is already there.
+    """
+    source  = source_of(font_heavy_pdf(pages=30, shared_font=True))
+    ranges  = [(1, 30), (1, 10), (11, 20), (21, 30), (1, 5), (6, 10)]
+    before  = fragment_cache_stats()
+
+    fragments = [write_fragment(source, start, end) for start, end in ranges]
+    after     = fragment_cache_stats()
+
+    # 30 pages and their content streams, the link on page 1, one font
+    # with its descriptor and file
+    assert after["serialized"] - before["serialized"] == 30 + 30 + 1 + 3
+    for (start, end), data in zip(ranges, fragments):
+        pages = reader_of(data).pages
+        assert len(pages) == end - start + 1
+        assert f"Page {start - 1}" in pages[0].extract_text()
+
+
+def test_nested_split_serializes_only_the_largest_range():
+    """
+    Chapters, then their halves, then their tenths: after the whole
+    book, the nested levels serialize nothing new and reuse every page.
+    """
+    source = source_of(font_heavy_pdf(pages=60, shared_font=False))
+    nested = [[(1, 30), (31, 60)], [(i, i + 5) for i in range(1, 60, 6)]]
+
+    before = fragment_cache_stats()
+    write_fragment(source, 1, 60)
+    largest = fragment_cache_stats()
+    for level in nested:
+        for start, end in level:
+            assert len(reader_of(write_fragment(source, start, end)).pages) == end - start + 1
+    after = fragment_cache_stats()
+
+    # each page with its content stream, font and descriptor, one shared
+    # copy of the identical font files, and the link on page 1
+    assert largest["serialized"] - before["serialized"] == 60 * 4 + 2
+    assert after["serialized"] == largest["serialized"]
+    assert after["reused"] - largest["reused"] >= 2 * 60 * 4
+
+
+def test_spooled_upload_reader_is_reused_until_closed(tmp_path):
+    """
+    The fragments of one spooled upload share a parsed reader; once
+    the upload's request closes it, its reader is dropped.
+    """
+    data = font_heavy_pdf(3, shared_font=True)
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(data)
+    source = PdfSource(path=str(path), digest=hashlib.sha256(data).hexdigest(), temporary=True)
+
+    reader = load_pdf_reader(source)
+    assert load_pdf_reader(source) is reader
+    source.close()
+    assert not path.exists()
+
+    other = tmp_path / "again.pdf"
+    other.write_bytes(data)
+    assert load_pdf_reader(PdfSource(path=str(other), digest=source.digest, temporary=True)) is not reader
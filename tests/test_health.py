@@ -0,0 +1,12 @@
+# tests/test_health.py
+
+from .conftest import client
+
+
+def test_health_ok(client):
+    """
+    GET /health --> 200 OK + status "ok".
+    """
+    resp = client.get("/health")
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "ok"
@@ -0,0 +1,146 @@
+# tests/test_jobs.py
+
+import io
+import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import PyPDF2
+from fastapi import UploadFile
+
+from services import cache, executor, jobs, split
+from .conftest import client, pdf_4pages, extract_zip_contents
+
+
+def submit(client, pdf: io.BytesIO, csv: str):
+    files = {
+        "pdf": ("doc.pdf", pdf, "application/pdf"),
+        "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+    }
+    return client.post("/api/jobs/split", files=files)
+
+
+def wait_finished(client, job_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["state"] not in ("queued", "running", "cancelling"):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish: {status}")
+
+
+def test_job_runs_and_result_downloads(client, pdf_4pages):
+    """
+    Submit --> 202 + id; poll until done; result is the fragments ZIP.
+    """
+    # A unique trailing row keeps the result cache out of the way.
+    csv = f"split,name,from,to\ny,Part A,1,2\ny,Part B,3,4\nn,{uuid.uuid4().hex},1,1\n"
+    resp = submit(client, pdf_4pages, csv)
+    assert resp.status_code == 202
+    job_id = resp.json()["id"]
+
+    status = wait_finished(client, job_id)
+    assert status["state"] == "done"
+    assert not status["from_cache"]
+    assert status["fragments_done"] == status["fragments_total"] == 2
+    assert status["pages_done"] == status["pages_total"] == 4
+
+    resp = client.get(f"/api/jobs/{job_id}/result")
+    assert resp.status_code == 200
+    assert "application/zip" in resp.headers["content-type"]
+    frags = extract_zip_contents(resp.content)
+    assert sorted(frags) == ["Part A.pdf", "Part B.pdf"]
+    for data in frags.values():
+        assert len(PyPDF2.PdfReader(io.BytesIO(data)).pages) == 2
+
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 200
+    assert client.get(f"/api/jobs/{job_id}").status_code == 404
+
+
+def test_invalid_csv_job_fails_with_reason(client, pdf_4pages):
+    """
+    Out-of-range CSV --> job ends "failed" with the validation message,
+    and its result is not available (409).
+    """
+    job_id = submit(client, pdf_4pages, "split,name,from,to\ny,T3,1,5\n").json()["id"]
+
+    status = wait_finished(client, job_id)
+    assert status["state"] == "failed"
+    assert "exceeds total" in status["error"].lower()
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+
+
+def test_unknown_job_returns_404(client):
+    """
+    Unknown or malformed job ids --> 404.
+    """
+    for job_id in ("0" * 32, "../etc"):
+        assert client.get(f"/api/jobs/{job_id}").status_code == 404
+        assert client.get(f"/api/jobs/{job_id}/result").status_code == 404
+        assert client.delete(f"/api/jobs/{job_id}").status_code == 404
+
+
+@pytest.fixture
+def local_jobs(monkeypatch, tmp_path):
+    """
+    In-process job runner: one runner, one pool thread, jobs kept in
+    tmp_path, no result cache, and fragments that take a while.
+    """
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(executor, "_pool", pool)
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "JOBS_WORKERS", 1)
+    monkeypatch.setattr(cache, "RESULT_CACHE_MAX_BYTES", 0)
+
+    extract = split._extract_fragment
+    def slow_extract(*args):
+        time.sleep(0.05)
+        return extract(*args)
+    monkeypatch.setattr(split, "_extract_fragment", slow_extract)
+
+    yield tmp_path
+    pool.shutdown(wait=True)
+
+
+def test_cancel_queued_and_running_jobs(local_jobs, pdf_4pages):
+    """
+    DELETE on a running and on a queued job --> both end "cancelled",
+    leaving only their status files: no partial result, no marker.
+    """
+    pdf = pdf_4pages.getvalue()
+    csv = "split,name,from,to\n" + "".join(f"y,Part {i},1,4\n" for i in range(100))
+
+    def uploads():
+        return (UploadFile(io.BytesIO(pdf), filename="doc.pdf"),
+                UploadFile(io.BytesIO(csv.encode()), filename="ranges.csv"))
+
+    async def wait_for(job_id, states):
+        for _ in range(500):
+            status = jobs.get_job(job_id)
+            if status.state in states:
+                return status
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"job {job_id} stuck in {status.state}")
+
+    async def scenario():
+        jobs.start_job_runners()
+        try:
+            running = await jobs.submit_split_job(*uploads())
+            queued  = await jobs.submit_split_job(*uploads())
+            await wait_for(running.id, ("running",))
+            assert jobs.get_job(queued.id).state == "queued"
+
+            assert jobs.cancel_job(queued.id).state == "cancelling"
+            assert jobs.cancel_job(running.id).state == "cancelling"
+            for job_id in (queued.id, running.id):
+                assert (await wait_for(job_id, ("cancelled",))).state == "cancelled"
+            return running.id, queued.id
+        finally:
+            await jobs.stop_job_runners()
+
+    running_id, queued_id = asyncio.run(scenario())
+    assert sorted(os.listdir(local_jobs)) == sorted([f"{running_id}.json", f"{queued_id}.json"])
@@ -0,0 +1,71 @@
+# tests/test_metrics.py
+
+import re
+import uuid
+
+from services.metrics import Counter, Histogram
+
+from .conftest import client, pdf_4pages
+
+
+def sample(text: str, series: str) -> float:
+    """
+    Value of one series in a Prometheus text exposition, 0 if absent.
+    """
+    match = re.search(rf"^{re.escape(series)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("t_seconds", "Test", labels=("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        hist.observe(value, stage='a"b')
+    text = "\n".join(hist.render())
+
+    assert sample(text, 't_seconds_bucket{stage="a\\"b",le="0.1"}') == 1
+    assert sample(text, 't_seconds_bucket{stage="a\\"b",le="1"}') == 3
+    assert sample(text, 't_seconds_bucket{stage="a\\"b",le="+Inf"}') == 4
+    assert sample(text, 't_seconds_count{stage="a\\"b"}') == 4
+    assert sample(text, 't_seconds_sum{stage="a\\"b"}') == 4.25
+
+
+def test_counter_renders_each_series():
+    counter = Counter("t_total", "Test", labels=("route",))
+    counter.inc(route="/a")
+    counter.inc(2, route="/a")
+    counter.inc(route="/b")
+    text = "\n".join(counter.render())
+
+    assert "# TYPE t_total counter" in text
+    assert sample(text, 't_total{route="/a"}') == 3
+    assert sample(text, 't_total{route="/b"}') == 1
+
+
+def test_split_reports_stages_and_counts(client, pdf_4pages):
+    """
+    A split answers with a Server-Timing breakdown, and /metrics counts
+    its fragments, pages and request under the route template.
+    """
+    before = client.get("/metrics").text
+    # A unique name keeps the result cache from answering
+    csv = f"split,name,from,to\ny,{uuid.uuid4().hex},1,3\ny,B,4,4\n"
+    resp = client.post(
+        "/api/split",
+        files={"pdf": ("a.pdf", pdf_4pages, "application/pdf"), "csvfile": ("a.csv", csv, "text/csv")}
+    )
+    assert resp.status_code == 200
+    timing = dict(
+        entry.strip().split(";dur=") for entry in resp.headers["Server-Timing"].split(",")
+    )
+    assert {"upload", "parse", "csv", "total"} <= set(timing)
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    after = metrics.text
+    assert sample(after, "split_pdf_fragments_total") - sample(before, "split_pdf_fragments_total") == 2
+    assert sample(after, "split_pdf_pages_total") - sample(before, "split_pdf_pages_total") == 4
+    series = 'split_pdf_http_requests_total{method="POST",route="/api/split",status="200"}'
+    assert sample(after, series) - sample(before, series) == 1
+    assert sample(after, 'split_pdf_stage_duration_seconds_count{stage="fragment"}') >= 2
+    assert "split_pdf_jobs_in_flight" in after
+    assert "split_pdf_result_cache_hits_total" in after
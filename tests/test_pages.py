@@ -0,0 +1,140 @@
+# tests/test_pages.py
+
+import io
+import hashlib
+
+import PyPDF2
+from PyPDF2.generic import NullObject
+
+from services.pages import PageTree
+from services.fragments import write_fragment
+from services.engine import page_count
+from services.utils import PdfSource
+
+
+def tree_pdf(root_count: int = 6) -> bytes:
+    """
+    Six pages under nested /Pages nodes: the root sets a /MediaBox and
+    /Resources, one branch a /Rotate, and page 3 its own /MediaBox.
+    Page 1 links to page 6.
+    """
+    objects = {
+        1:  b"<< /Type /Catalog /Pages 2 0 R >>",
+        2:  b"<< /Type /Pages /Kids [ 3 0 R 4 0 R ] /Count %d"
+            b" /MediaBox [ 0 0 100 200 ] /Resources 12 0 R >>" % root_count,
+        3:  b"<< /Type /Pages /Parent 2 0 R /Kids [ 5 0 R 6 0 R ] /Count 2 >>",
+        4:  b"<< /Type /Pages /Parent 2 0 R /Kids [ 7 0 R 8 0 R 11 0 R ] /Count 4 /Rotate 90 >>",
+        5:  b"<< /Type /Page /Parent 3 0 R /Contents 13 0 R"
+            b" /Annots [ << /Type /Annot /Subtype /Link /Rect [ 0 0 1 1 ] /Dest [ 11 0 R /Fit ] >> ] >>",
+        6:  b"<< /Type /Page /Parent 3 0 R /Contents 13 0 R >>",
+        7:  b"<< /Type /Pages /Parent 4 0 R /Kids [ 9 0 R 10 0 R ] /Count 2 >>",
+        8:  b"<< /Type /Page /Parent 4 0 R /Contents 13 0 R >>",
+        9:  b"<< /Type /Page /Parent 7 0 R /Contents 13 0 R /MediaBox [ 0 0 50 50 ] >>",
+        10: b"<< /Type /Page /Parent 7 0 R /Contents 13 0 R >>",
+        11: b"<< /Type /Page /Parent 4 0 R /Contents 13 0 R >>",
+        12: b"<< /Font << >> >>",
+        13: b"<< /Length 0 >>\nstream\n\nendstream",
+    }
+    return write_pdf(objects)
+
+
+def empty_node_pdf() -> bytes:
+    """
+    Three pages, 100, 200 and 300 wide, after an empty /Pages node: the
+    root's /Count equals its number of kids without them all being pages.
+    """
+    return write_pdf({
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [ 3 0 R 4 0 R 5 0 R ] /Count 3 >>",
+        3: b"<< /Type /Pages /Parent 2 0 R /Kids [ ] /Count 0 >>",
+        4: b"<< /Type /Page /Parent 2 0 R /MediaBox [ 0 0 100 100 ] >>",
+        5: b"<< /Type /Pages /Parent 2 0 R /Kids [ 6 0 R 7 0 R ] /Count 2 >>",
+        6: b"<< /Type /Page /Parent 5 0 R /MediaBox [ 0 0 200 100 ] >>",
+        7: b"<< /Type /Page /Parent 5 0 R /MediaBox [ 0 0 300 100 ] >>",
+    })
+
+
+def write_pdf(objects) -> bytes:
+    """
+    A PDF of the given numbered objects, object 1 being the catalog.
+    """
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in sorted(objects.items()):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+    out.writelines(b"%010d 00000 n \n" % offset for offset in offsets)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+    return out.getvalue()
+
+
+def flattened(data: bytes):
+    return list(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+def test_pages_match_flattened_tree():
+    """
+    Each page looked up on its own has the id and inherited attributes
+    PdfReader.pages gives it, without the tree being flattened.
+    """
+    data     = tree_pdf()
+    expected = flattened(data)
+    reader   = PyPDF2.PdfReader(io.BytesIO(data))
+    tree     = PageTree(reader)
+
+    assert len(tree) == len(expected) == 6
+    for idx in reversed(range(6)):
+        page_id, page = tree.page(idx)
+        assert page_id == expected[idx].indirect_reference.idnum
+        assert list(page["/MediaBox"]) == list(expected[idx]["/MediaBox"])
+        assert page.get("/Rotate") == expected[idx].get("/Rotate")
+        assert page["/Resources"] == expected[idx]["/Resources"]
+    assert tree.page_ids() == [page.indirect_reference.idnum for page in expected]
+    assert reader.flattened_pages is None
+
+
+def test_count_matching_kids_with_empty_node():
+    """
+    An empty /Pages node among the kids does not shift the pages after it.
+    """
+    data   = empty_node_pdf()
+    tree   = PageTree(PyPDF2.PdfReader(io.BytesIO(data)))
+    widths = [float(tree.page(idx)[1]["/MediaBox"][2]) for idx in range(len(tree))]
+    assert widths == [float(page.mediabox.width) for page in flattened(data)] == [100, 200, 300]
+
+    source   = PdfSource(data=data, digest=hashlib.sha256(data).hexdigest())
+    fragment = PyPDF2.PdfReader(io.BytesIO(write_fragment(source, 2, 2)))
+    assert [float(page.mediabox.width) for page in fragment.pages] == [200]
+
+
+def test_wrong_root_count_falls_back_to_flattening():
+    """
+    A root /Count that its kids do not add up to is dropped for the
+    count PdfReader.pages finds.
+    """
+    data = tree_pdf(root_count=9)
+    tree = PageTree(PyPDF2.PdfReader(io.BytesIO(data)))
+    assert tree.page_ids() == [page.indirect_reference.idnum for page in flattened(data)]
+    assert len(tree) == 6
+
+
+def test_fragment_of_nested_tree():
+    """
+    A fragment of a nested tree keeps the pages' inherited attributes,
+    and a link to a page outside it becomes null.
+    """
+    data   = tree_pdf()
+    source = PdfSource(data=data, digest=hashlib.sha256(data).hexdigest())
+    assert page_count(source) == 6
+
+    fragment = PyPDF2.PdfReader(io.BytesIO(write_fragment(source, 1, 4)))
+    pages    = fragment.pages
+    assert len(pages) == 4
+    assert [float(x) for x in pages[0].mediabox] == [0, 0, 100, 200]
+    assert [float(x) for x in pages[2].mediabox] == [0, 0, 50, 50]
+    assert pages[2]["/Rotate"] == 90
+    assert "/Font" in pages[1]["/Resources"]
+    assert isinstance(pages[0]["/Annots"][0].get_object()["/Dest"][0], NullObject)
@@ -0,0 +1,82 @@
+# tests/test_range.py
+
+import io
+import PyPDF2
+
+from .conftest import client, pdf_4pages, pdf_with_bookmarks
+
+
+def post_range(client, pdf: io.BytesIO, start, end, **headers):
+    return client.post(
+        "/api/split/range",
+        files={"pdf": ("book.pdf", pdf.getvalue(), "application/pdf")},
+        data={"from": str(start), "to": str(end)},
+        headers=headers
+    )
+
+
+def test_range_returns_pdf_with_etag(client, pdf_4pages):
+    """
+    POST /api/split/range --> the pages as a raw PDF, with a strong
+    ETag that depends on the range.
+    """
+    resp = post_range(client, pdf_4pages, 2, 3)
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"] == "application/pdf"
+    assert int(resp.headers["Content-Length"]) == len(resp.content)
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert len(PyPDF2.PdfReader(io.BytesIO(resp.content)).pages) == 2
+
+    etag = resp.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert post_range(client, pdf_4pages, 2, 3).headers["ETag"] == etag
+    assert post_range(client, pdf_4pages, 2, 4).headers["ETag"] != etag
+
+
+def test_range_outside_document_returns_400(client, pdf_4pages):
+    """
+    Pages beyond the end, or a range that runs backwards --> 400.
+    """
+    resp = post_range(client, pdf_4pages, 3, 5)
+    assert resp.status_code == 400
+    assert "exceeds total page count (4)" in resp.json()["detail"]
+    assert post_range(client, pdf_4pages, 3, 2).status_code == 400
+
+
+def test_document_range_revalidates_and_resumes(client, pdf_with_bookmarks):
+    """
+    GET /api/documents/{id}/range honours If-None-Match and byte ranges.
+    """
+    doc_id = client.post(
+        "/api/documents", files={"pdf": ("book.pdf", pdf_with_bookmarks, "application/pdf")}
+    ).json()["id"]
+    url = f"/api/documents/{doc_id}/range?from=1&to=2"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    etag, body = full.headers["ETag"], full.content
+    assert len(PyPDF2.PdfReader(io.BytesIO(body)).pages) == 2
+
+    resp = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    assert resp.content == b""
+
+    resp = client.get(url, headers={"Range": "bytes=10-19"})
+    assert resp.status_code == 206
+    assert resp.content == body[10:20]
+    assert resp.headers["Content-Range"] == f"bytes 10-19/{len(body)}"
+
+    resp = client.get(url, headers={"Range": "bytes=-5", "If-Range": etag})
+    assert resp.status_code == 206
+    assert resp.content == body[-5:]
+
+    resp = client.get(url, headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.content == body
+
+    resp = client.get(url, headers={"Range": f"bytes={len(body)}-"})
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == f"bytes */{len(body)}"
+
+    assert client.get(f"/api/documents/{'0' * 64}/range?from=1&to=1").status_code == 404
@@ -0,0 +1,122 @@
+# tests/test_split_by_bookmarks.py
+
+import io
+import hashlib
+import PyPDF2
+from PyPDF2.generic import DictionaryObject, NameObject, TextStringObject
+
+from .conftest import client, pdf_with_bookmarks, pdf_without_bookmarks, extract_zip_contents
+
+
+def split_by_levels(client, pdf: io.BytesIO, levels: str):
+    return client.post(
+        "/api/split/bookmarks",
+        files={"pdf": ("book.pdf", pdf, "application/pdf")},
+        data={"levels": levels},
+    )
+
+
+def page_counts(zip_bytes: bytes):
+    frags = extract_zip_contents(zip_bytes)
+    return {n: len(PyPDF2.PdfReader(io.BytesIO(d)).pages) for n, d in frags.items()}
+
+
+def test_split_at_top_level_bookmarks(client, pdf_with_bookmarks):
+    """
+    levels=0 --> one fragment per chapter, no CSV needed.
+    """
+    resp = split_by_levels(client, pdf_with_bookmarks, "0")
+    assert resp.status_code == 200
+    assert page_counts(resp.content) == {"Chapter 1.pdf": 2, "Chapter 2.pdf": 1}
+
+
+def test_split_at_several_levels(client, pdf_with_bookmarks):
+    """
+    levels=0,1 --> chapters and sections; Section 1.2 shares its start
+    page with Chapter 2 and keeps that single page.
+    """
+    resp = split_by_levels(client, pdf_with_bookmarks, "1, 0")
+    assert resp.status_code == 200
+    assert page_counts(resp.content) == {
+        "Chapter 1.pdf": 2,
+        "Section 1.1.pdf": 1,
+        "Section 1.2.pdf": 1,
+        "Chapter 2.pdf": 1,
+    }
+
+
+def test_bookmarks_without_a_page_are_skipped(client):
+    """
+    A URI bookmark between two chapters yields no fragment and does not
+    cut short the chapter before it.
+    """
+    writer = PyPDF2.PdfWriter()
+    for _ in range(6):
+        writer.add_blank_page(width=72, height=72)
+    writer.add_outline_item("Ch1", page_number=0)
+    writer.add_outline_item("Ch2", page_number=2)
+    link = writer.add_outline_item("Website", page_number=0).get_object()
+    link[NameObject("/A")] = DictionaryObject({
+        NameObject("/S"):   NameObject("/URI"),
+        NameObject("/URI"): TextStringObject("https://example.org"),
+    })
+    writer.add_outline_item("Ch3", page_number=4)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    pdf.seek(0)
+
+    resp = split_by_levels(client, pdf, "0")
+    assert resp.status_code == 200
+    assert page_counts(resp.content) == {"Ch1.pdf": 2, "Ch2.pdf": 2, "Ch3.pdf": 2}
+
+
+def test_invalid_levels_return_400(client, pdf_with_bookmarks):
+    for levels in ("", "one", "-1"):
+        pdf_with_bookmarks.seek(0)
+        assert split_by_levels(client, pdf_with_bookmarks, levels).status_code in (400, 422)
+
+
+def test_missing_bookmarks_return_404(client, pdf_with_bookmarks, pdf_without_bookmarks):
+    """
+    No outline at all, or none at the requested level --> 404.
+    """
+    assert split_by_levels(client, pdf_without_bookmarks, "0").status_code == 404
+
+    resp = split_by_levels(client, pdf_with_bookmarks, "5")
+    assert resp.status_code == 404
+    assert "level 5" in resp.json()["detail"]
+
+
+def test_split_stored_document_by_level(client, pdf_with_bookmarks):
+    """
+    Upload once, then split by level using the document id.
+    """
+    doc_id = hashlib.sha256(pdf_with_bookmarks.getvalue()).hexdigest()
+    client.post("/api/documents", files={"pdf": ("book.pdf", pdf_with_bookmarks, "application/pdf")})
+
+    resp = client.post(f"/api/documents/{doc_id}/split/bookmarks", data={"levels": "1"})
+    assert resp.status_code == 200
+    assert page_counts(resp.content) == {"Section 1.1.pdf": 1, "Section 1.2.pdf": 1}
+
+    resp = client.post(f"/api/documents/{'0' * 64}/split/bookmarks", data={"levels": "1"})
+    assert resp.status_code == 404
+
+
+def test_bookmarks_with_the_same_title_are_numbered(client):
+    """
+    Every chapter titled "Exercises" gets a fragment of its own.
+    """
+    writer = PyPDF2.PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(width=72, height=72)
+    for page, title in enumerate(["Exercises", "Intro", "Exercises", "Exercises"]):
+        writer.add_outline_item(title, page_number=page)
+    buf = io.BytesIO()
+    writer.write(buf)
+    buf.seek(0)
+
+    resp = split_by_levels(client, buf, "0")
+    assert resp.status_code == 200
+    assert page_counts(resp.content) == {
+        "Exercises.pdf": 1, "Intro.pdf": 1, "Exercises_2.pdf": 1, "Exercises_3.pdf": 1
+    }
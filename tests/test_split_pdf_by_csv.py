@@ -1,10 +1,13 @@
 # tests/test_split_pdf_by_csv.py
 
 import io
+import time
+import uuid
+import zipfile
 import pytest
 import PyPDF2
 
-from .conftest import client, pdf_4pages, extract_zip_contents
+from .conftest import client, pdf_4pages, large_pdf_with_bookmarks, extract_zip_contents
 
 
 class TestSplitEndpoint:
@@ -40,6 +43,97 @@ class TestSplitEndpoint:
             reader = PyPDF2.PdfReader(io.BytesIO(data))
             assert len(reader.pages) == 2
 
+    def test_zip_is_streamed_with_data_descriptors(self, client, pdf_4pages):
+        """
+        Entries are written without seeking back: each one carries a
+        data descriptor (general purpose flag bit 3).
+        """
+        csv = "split,name,from,to\ny,One,1,1\ny,Two,2,4\n"
+        files = {
+            "pdf": ("doc.pdf", pdf_4pages, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files)
+        assert resp.status_code == 200
+
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            infos = zf.infolist()
+            assert [i.filename for i in infos] == ["One.pdf", "Two.pdf"]
+            assert all(i.flag_bits & 0x08 for i in infos)
+
+    def test_abandoned_stream_releases_its_slot(self, client, large_pdf_with_bookmarks):
+        """
+        Client hangs up after the first chunk --> the job's slot (and its
+        spooled upload) is released right away, not on garbage collection.
+        """
+        rows = "".join(f"y,Part {i},1,1\n" for i in range(200))
+        csv  = f"split,name,from,to\n{rows}n,{uuid.uuid4().hex},1,1\n"
+        files = {
+            "pdf": ("large.pdf", large_pdf_with_bookmarks, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files, data={"compression": "store"}, stream=True)
+        assert resp.status_code == 200
+        next(resp.iter_content(64 * 1024))
+        resp.close()
+
+        deadline = time.monotonic() + 10
+        while client.get("/health").json()["jobs_in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert client.get("/health").json()["jobs_in_flight"] == 0
+
+    def test_many_fragments_keep_csv_order(self, client, pdf_4pages):
+        """
+        Fragments built in parallel still come back in CSV row order.
+        """
+        rows = [f"y,Frag {i:02d},{i % 4 + 1},4" for i in range(24)]
+        csv = "split,name,from,to\n" + "\n".join(rows) + "\n"
+        files = {
+            "pdf": ("doc.pdf", pdf_4pages, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files)
+        assert resp.status_code == 200
+
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            names = [i.filename for i in zf.infolist()]
+            assert names == [f"Frag {i:02d}.pdf" for i in range(24)]
+            for i, name in enumerate(names):
+                reader = PyPDF2.PdfReader(io.BytesIO(zf.read(name)))
+                assert len(reader.pages) == 4 - i % 4
+
+    @pytest.mark.parametrize(
+        "policy, method",
+        [("store", zipfile.ZIP_STORED), ("deflate", zipfile.ZIP_DEFLATED)],
+    )
+    def test_compression_policy_applies_to_entries(self, client, pdf_4pages, policy, method):
+        """
+        compression=store|deflate --> every fragment uses that ZIP method.
+        """
+        csv = "split,name,from,to\ny,One,1,2\ny,Two,3,4\n"
+        files = {
+            "pdf": ("doc.pdf", pdf_4pages, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files, data={"compression": policy})
+        assert resp.status_code == 200
+
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            assert [i.compress_type for i in zf.infolist()] == [method, method]
+            assert zf.testzip() is None
+
+    def test_unknown_compression_raises_400(self, client, pdf_4pages):
+        """
+        Unsupported compression value --> 400 naming the allowed values.
+        """
+        files = {
+            "pdf": ("doc.pdf", pdf_4pages, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(b"split,name,from,to\ny,A,1,1\n"), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files, data={"compression": "bzip2"})
+        assert resp.status_code == 400
+        assert "unknown compression" in resp.json()["detail"].lower()
+
     @pytest.mark.parametrize(
         "csv_body, expected_substr",
         [
@@ -51,7 +145,8 @@ class TestSplitEndpoint:
     )
     def test_invalid_csv_or_ranges(self, client, pdf_4pages, csv_body, expected_substr):
         """
-        Bad CSV or OOB ranges --> 400 + detail explains the error.
+        Bad CSV or OOB ranges --> 400 + detail explains the error
+        and names the offending row.
         """
         files = {
             "pdf": ("doc.pdf", pdf_4pages, "application/pdf"),
@@ -60,6 +155,7 @@ class TestSplitEndpoint:
         resp = client.post(self.endpoint, files=files)
         assert resp.status_code == 400
         assert expected_substr in resp.json()["detail"].lower()
+        assert "row 2" in resp.json()["detail"]
 
     def test_all_n_flags_yields_empty_zip(self, client, pdf_4pages):
         """
@@ -295,3 +391,42 @@ class TestSplitEndpoint:
         reader = PyPDF2.PdfReader(io.BytesIO(next(iter(frags.values()))))
         assert len(reader.pages) == 2
 
+    def test_large_pdf_spooled_to_disk(self, client, large_pdf_with_bookmarks):
+        """
+        PDF above the in-memory spool limit --> split from the spooled file.
+        """
+        csv = "split,name,from,to\ny,Head,1,2\ny,Tail,3,3\n"
+        files = {
+            "pdf": ("large.pdf", large_pdf_with_bookmarks, "application/pdf"),
+            "csvfile": ("ranges.csv", io.BytesIO(csv.encode()), "text/csv"),
+        }
+        resp = client.post(self.endpoint, files=files)
+        assert resp.status_code == 200
+        frags = extract_zip_contents(resp.content)
+        pages = {n: len(PyPDF2.PdfReader(io.BytesIO(d)).pages) for n, d in frags.items()}
+        assert pages == {"Head.pdf": 2, "Tail.pdf": 1}
+
+    def test_repeated_request_served_from_cache(self, client, pdf_4pages):
+        """
+        Same PDF + CSV twice --> identical ZIP, second one a cache hit.
+        """
+        if not client.get("/health").json()["cache"]["enabled"]:
+            pytest.skip("result cache disabled on the server")
+
+        csv = f"split,name,from,to\ny,Cached {uuid.uuid4().hex},1,3\n".encode()
+        pdf = pdf_4pages.getvalue()
+
+        def post():
+            files = {
+                "pdf": ("doc.pdf", io.BytesIO(pdf), "application/pdf"),
+                "csvfile": ("ranges.csv", io.BytesIO(csv), "text/csv"),
+            }
+            return client.post(self.endpoint, files=files)
+
+        first = post()
+        hits  = client.get("/health").json()["cache"]["hits"]
+        second = post()
+
+        assert first.status_code == second.status_code == 200
+        assert second.content == first.content
+        assert client.get("/health").json()["cache"]["hits"] == hits + 1
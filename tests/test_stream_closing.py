@@ -0,0 +1,112 @@
+# tests/test_stream_closing.py
+
+import time
+import asyncio
+import zipfile
+
+import pytest
+
+from routers.utils import create_zip_response
+from services.utils import stream_zip
+from services import cache
+
+
+class Entries:
+    """
+    Async generator of ZIP entries that records whether it was closed.
+    """
+    def __init__(self, count: int = 100):
+        self.closed = False
+        self.gen    = self._run(count)
+
+    async def _run(self, count: int):
+        try:
+            for i in range(count):
+                yield f"part_{i}.pdf", b"%PDF" * 1000
+        finally:
+            self.closed = True
+
+
+def test_closing_zip_stream_closes_its_entries():
+    """
+    Closing the ZIP stream part-way closes the entry generator at once.
+    """
+    async def scenario():
+        entries = Entries()
+        stream  = stream_zip(entries.gen, compression="store")
+        await stream.__anext__()
+        await stream.aclose()
+        return entries.closed
+
+    assert asyncio.run(scenario())
+
+
+def test_closing_cached_stream_closes_its_source(monkeypatch, tmp_path):
+    """
+    Closing the caching pass-through part-way closes the ZIP stream it
+    copies and publishes no cache entry.
+    """
+    monkeypatch.setattr(cache, "RESULT_CACHE_DIR", str(tmp_path))
+
+    async def scenario():
+        entries = Entries()
+        stream  = cache.store_result("abandoned", stream_zip(entries.gen, compression="store"))
+        await stream.__anext__()
+        await stream.aclose()
+        return entries.closed
+
+    assert asyncio.run(scenario())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_response_closes_body_on_disconnect():
+    """
+    The client goes away mid-stream --> the response closes its body
+    iterator instead of leaving it suspended until garbage collection.
+    """
+    async def scenario():
+        entries  = Entries()
+        response = create_zip_response(stream_zip(entries.gen, compression="store"), "x.zip")
+        sent     = []
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) > 2:
+                raise OSError("client disconnected")
+
+        with pytest.raises(OSError):
+            await response.stream_response(send)
+        return entries.closed
+
+    assert asyncio.run(scenario())
+
+
+def test_cancelled_deflate_write_finishes_before_archive_closes(monkeypatch):
+    """
+    A client leaving while an entry is deflated on a worker thread
+    cancels the stream; the entry is finished before the archive is
+    closed, not written into a closed one.
+    """
+    writes = []
+    writestr = zipfile.ZipFile.writestr
+
+    def slow_writestr(archive, *args, **kwargs):
+        time.sleep(0.2)
+        writes.append(archive.fp is not None)
+        return writestr(archive, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile.ZipFile, "writestr", slow_writestr)
+
+    async def scenario():
+        entries = Entries()
+        stream  = stream_zip(entries.gen, compression="deflate")
+        task    = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await stream.aclose()
+        return entries.closed
+
+    assert asyncio.run(scenario())
+    assert writes == [True]
@@ -0,0 +1,137 @@
+# tests/test_uploads.py
+
+import io
+import json
+import asyncio
+import hashlib
+
+import pytest
+import requests
+
+import main
+from services import utils, engine
+from services.engine import page_count, outline
+from services.exceptions import ValidationError
+from services.utils import PdfSource
+from routers.uploads import _PartSizes
+
+from .conftest import pdf_4pages, pdf_with_bookmarks
+
+
+def multipart(**files):
+    """
+    Body and Content-Type of a multipart upload, as a client sends it.
+    """
+    prepared = requests.Request("POST", "http://test/", files=files).prepare()
+    return prepared.body, prepared.headers["Content-Type"]
+
+
+def post_in_chunks(path: str, body: bytes, content_type: str, chunk_size: int = 4096):
+    """
+    POST body to the app in-process, chunk by chunk. Returns the status,
+    the JSON detail and how many bytes of the body the app read.
+    """
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    read, sent = [], []
+
+    async def receive():
+        chunk = chunks[len(read)]
+        read.append(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": len(read) < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode())
+        ],
+        "client": ("127.0.0.1", 1), "server": ("test", 80)
+    }
+    asyncio.run(main.app(scope, receive, send))
+    detail = json.loads(b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body"))
+    return sent[0]["status"], detail["detail"], sum(map(len, read))
+
+
+def test_oversized_pdf_is_refused_while_streaming(monkeypatch):
+    """
+    A PDF past MAX_PDF_BYTES --> 413 as soon as the limit is crossed,
+    with most of the body never read.
+    """
+    monkeypatch.setattr(utils, "MAX_PDF_BYTES", 10_000)
+    body, content_type = multipart(pdf=("book.pdf", b"x" * 200_000, "application/pdf"))
+
+    status, detail, read = post_in_chunks("/api/bookmarks/zip", body, content_type)
+    assert status == 413
+    assert detail == "Field 'pdf' exceeds the upload limit of 10000 bytes"
+    assert read <= 10_000 + 2 * 4096
+
+
+def test_oversized_csv_is_refused(monkeypatch):
+    """
+    The CSV has a limit of its own, independent of the PDF's.
+    """
+    monkeypatch.setattr(utils, "MAX_CSV_BYTES", 100)
+    body, content_type = multipart(
+        pdf=("book.pdf", b"%PDF" + b"x" * 5000, "application/pdf"),
+        csvfile=("ranges.csv", b"y,chapter,1,2\n" * 20, "text/csv")
+    )
+    status, detail, _ = post_in_chunks("/api/split", body, content_type, chunk_size=512)
+    assert status == 413
+    assert "'csvfile'" in detail
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_part_sizes_are_counted_across_chunks(monkeypatch, chunk_size):
+    """
+    Each field is held to exactly its own limit, however the body is
+    cut into chunks, delimiters split between them included.
+    """
+    pdf = b"%PDF-1.4\r\n" + b"\r\n--" * 50 + b"z" * 300
+    csv = b"y,one,1,1\n" * 10
+    body, content_type = multipart(
+        pdf=("book.pdf", pdf, "application/pdf"),
+        csvfile=("ranges.csv", csv, "text/csv"),
+        levels=(None, b"0,1")
+    )
+    boundary = content_type.split("boundary=")[1].encode()
+
+    def feed(**limits):
+        for name, value in limits.items():
+            monkeypatch.setattr(utils, name, value)
+        parts = _PartSizes(boundary)
+        for i in range(0, len(body), chunk_size):
+            error = parts.feed(body[i:i + chunk_size])
+            if error is not None:
+                return error
+        return None
+
+    assert feed(MAX_PDF_BYTES=len(pdf), MAX_CSV_BYTES=len(csv), MAX_FIELD_BYTES=3) is None
+    assert "'pdf'" in feed(MAX_PDF_BYTES=len(pdf) - 1)
+    assert "'csvfile'" in feed(MAX_PDF_BYTES=0, MAX_CSV_BYTES=len(csv) - 1)
+    assert "'levels'" in feed(MAX_CSV_BYTES=0, MAX_FIELD_BYTES=2)
+
+
+def test_page_and_outline_limits(monkeypatch, pdf_4pages, pdf_with_bookmarks):
+    """
+    Documents with more pages or outline entries than allowed are
+    refused as invalid input.
+    """
+    def source_of(pdf: io.BytesIO) -> PdfSource:
+        data = pdf.getvalue()
+        return PdfSource(data=data, digest=hashlib.sha256(data).hexdigest())
+
+    monkeypatch.setattr(engine, "MAX_PAGES", 4)
+    assert page_count(source_of(pdf_4pages)) == 4
+    monkeypatch.setattr(engine, "MAX_PAGES", 3)
+    with pytest.raises(ValidationError, match="4 pages, more than the limit of 3"):
+        page_count(source_of(pdf_4pages))
+
+    monkeypatch.setattr(engine, "MAX_OUTLINE_ITEMS", 4)
+    assert len(list(outline(source_of(pdf_with_bookmarks)))) == 4
+    monkeypatch.setattr(engine, "MAX_OUTLINE_ITEMS", 3)
+    with pytest.raises(ValidationError, match="more than the limit of 3 entries"):
+        list(outline(source_of(pdf_with_bookmarks)))